@@ -2,9 +2,10 @@
 import argparse
 
 import pandas as pd
+from features_utils import read_features, write_features
 
 # only import these functions when using import *
-__all__ = ["aggregate_features"]
+__all__ = ["join_features", "apply_features_override", "aggregate_features"]
 
 
 # parse command line arguments
@@ -30,6 +31,84 @@ def parse_args():
     return args
 
 
+def join_features(dfs: list, sources=None) -> pd.DataFrame:
+    """
+    Joins features dataframes on their 'protid' column, in a single pass.
+
+    Each dataframe is indexed by protid (keeping the first row of each protid),
+    and the dataframes are concatenated column-wise on the union of their protids
+    (sorted, as in an outer merge), with missing values for the protids that
+    a dataframe does not include.
+
+    Args:
+        dfs (list): the features dataframes, each with a 'protid' column.
+        sources (list): optional names of the dataframes (e.g. their paths)
+            to use in the error messages.
+    Returns:
+        a pandas.DataFrame of the joined features.
+    Raises:
+        ValueError: if a dataframe has no 'protid' column, or if a feature column
+            is in more than one dataframe (these conflicts are detected before joining).
+    """
+    if sources is None:
+        sources = [f"features dataframe {ind}" for ind in range(len(dfs))]
+
+    column_sources = {}
+    for source, df in zip(sources, dfs):
+        if "protid" not in df.columns:
+            raise ValueError(f"The features in {source} have no 'protid' column.")
+        for column in df.columns.drop("protid"):
+            if column in column_sources:
+                raise ValueError(
+                    f"The column '{column}' is in both {column_sources[column]} and {source}."
+                )
+            column_sources[column] = source
+
+    indexed_dfs = [df.drop_duplicates("protid").set_index("protid") for df in dfs]
+    agg_df = pd.concat(indexed_dfs, axis=1, join="outer", sort=True)
+    return agg_df.rename_axis("protid").reset_index()
+
+
+def apply_features_override(
+    agg_df: pd.DataFrame, features_override_df: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Applies the entries of a features override file to the aggregated features.
+
+    The override values are written to the matching protids in a single indexed update
+    (missing override values leave the aggregated values unchanged, and override columns
+    that are not in the aggregated features are ignored). The override entries whose protids
+    are not in the aggregated features are appended as new rows, with missing values
+    for the columns that they do not provide. If a protid appears more than once
+    in the override file, its first entry is used.
+
+    Args:
+        agg_df (pandas.DataFrame): the aggregated features.
+        features_override_df (pandas.DataFrame): the override entries, with a 'protid' column.
+    Returns:
+        a new pandas.DataFrame of the aggregated features with the overrides applied.
+    """
+    override_columns = [
+        column
+        for column in features_override_df.columns
+        if column != "protid" and column in agg_df.columns
+    ]
+    override_df = features_override_df.drop_duplicates("protid").set_index("protid")[
+        override_columns
+    ]
+
+    # the override values may not be among the categories of the categorical columns,
+    # or may not have the same type as the aggregated values
+    agg_df = agg_df.astype({column: object for column in override_columns}).set_index("protid")
+    agg_df.update(override_df)
+
+    new_rows_df = override_df[~override_df.index.isin(agg_df.index)]
+    if not new_rows_df.empty:
+        agg_df = pd.concat([agg_df, new_rows_df.astype(object)])
+
+    return agg_df.rename_axis("protid").reset_index()
+
+
 def aggregate_features(
     input_files: list, output_file=None, features_override_file=None
 ) -> pd.DataFrame:
@@ -41,7 +120,9 @@ def aggregate_features(
     the measures for each `protid` such as Length, LeidenCluster, etc.
 
     Returns a matrix where each of the columns is derived from the original features file
-    and each row is a protein.
+    and each row is a protein (see `join_features`). The aggregated features are also written
+    to a typed Parquet file next to the output file, which is faster to load for plotting
+    (see `features_utils.write_features`).
 
     Args:
         input_files (list): list of filepaths to aggregate.
@@ -51,54 +132,24 @@ def aggregate_features(
             for specific proteins in the dataset.
             The remaining columns can be columns of any of the features files.
             After aggregation, the values of those specific cells will be updated
-            to reflect the override file.
+            to reflect the override file (see `apply_features_override`).
     Returns:
         a pandas.DataFrame containing the aggregated features.
     """
 
-    # Read in list of dataframes
-    dfs = [pd.read_csv(file, sep="\t") for file in input_files]
-
-    # Create dummy dataframe for aggregation
-    agg_df = pd.DataFrame()
-
-    # Read the dataframes, merging them on protid
-    for i, df in enumerate(dfs):
-        if i == 0:
-            agg_df = df
-        else:
-            agg_df = agg_df.merge(df, on="protid", how="outer")
+    # Read the features files, joining them on protid
+    # (the lineages are kept as strings, because they are written to the output file as strings)
+    dfs = [read_features(file, parse_lineage_column=False) for file in input_files]
+    agg_df = join_features(dfs, sources=input_files)
 
     # If there's a features override file, use it
     if features_override_file is not None:
-        # Read the file
         features_override_df = pd.read_csv(features_override_file, sep="\t")
-
-        # Iterate over protids
-        for entry in features_override_df["protid"].values:
-            # Identify the row in the features override file where this protid is found
-            entry_row = features_override_df[features_override_df["protid"] == entry]
-
-            # If there isn't already a row for the data, append it
-            if entry not in agg_df["protid"].values:
-                # This should add np.nan for non-existing columns
-                agg_df = agg_df.add(entry_row)
-            # Otherwise, fill in the data at specific cells needed to be replaced
-            else:
-                # for each column in the override
-                for col in [i for i in entry_row.columns if i != "protid"]:
-                    # if the column doesn't exist, ignore it
-                    if col not in agg_df.columns:
-                        continue
-
-                    # otherwise, replace the value at that position
-                    agg_df.loc[agg_df["protid"] == entry, col] = entry_row[col].values[0]
-
-    agg_df.drop_duplicates(inplace=True)
+        agg_df = apply_features_override(agg_df, features_override_df)
 
     # Save to an output file if a path is provided
     if output_file is not None:
-        agg_df.to_csv(output_file, sep="\t", index=None)
+        write_features(agg_df, output_file)
 
     return agg_df
 
@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 import argparse
-import re
 
 import constants
+import foldseek_utils
 import pandas as pd
 
 # only import these functions when using import *
@@ -39,40 +39,17 @@ def aggregate_foldseek_fident(input_files: list, output_file: str, protid: str)
         protid (str): protid associated with the input files.
     """
 
-    # Create a collector dataframe
-    dummy_df = pd.DataFrame()
+    # read all of the results files, keeping only hits to AlphaFold models
+    results_df = foldseek_utils.read_m8_files(input_files)
 
-    # open each .m8 file and append it to the collector, if it's not empty
-    for f in input_files:
-        temp_df = pd.read_csv(f, sep="\t", names=constants.FOLDSEEK_COLUMN_NAMES)
-
-        if len(temp_df) == 0:
-            continue
-
-        dummy_df = pd.concat([dummy_df, temp_df])
-
-    if dummy_df.empty:
+    if results_df.empty:
         # Generate an empty output with a minimal header to prevent downstream failures.
         pd.DataFrame(columns=constants.FOLDSEEK_OUT_COLUMN_NAMES).to_csv(
             output_file, index=None, sep="\t"
         )
-        return dummy_df
-
-    # tidy up index and any duplicates
-    dummy_df.reset_index(inplace=True, drop=True)
-    dummy_df.drop_duplicates(inplace=True)
-
-    # extract the model ID from the results file
-    dummy_df["modelid"] = dummy_df["target"].str.split(" ", expand=True)[0]
-    dummy_df = dummy_df[dummy_df["modelid"].str.contains("-F1-model_v4")]
-
-    # get the uniprot ID out from that target
-    dummy_df["protid"] = dummy_df["modelid"].apply(
-        lambda x: re.findall("AF-(.*)-F1-model_v4", x)[0]
-    )
+        return results_df
 
-    # collect only the relevant columns
-    results_df = dummy_df[constants.FOLDSEEK_OUT_COLUMN_NAMES]
+    # remove any duplicate entries
     results_df = results_df.drop_duplicates()
 
     # rescale fraction identity from percentile to actual fraction
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import argparse
 
+from hit_funnel import aggregate_id_lists, write_id_list
+
 # only import these functions when using import *
 __all__ = ["aggregate_lists"]
 
@@ -29,26 +31,14 @@ def parse_args():
 def aggregate_lists(input_files: list, output_file: str):
     """
     Takes in a list of input .txt files containing accessions and combines them,
-    removing duplicates.
+    removing duplicates. The accessions are kept in the order in which they are first seen
+    (see `hit_funnel.aggregate_id_lists`).
 
     Args:
         input_files (list): list of string paths of input files.
         output_file (str): path of destination file.
     """
-    # empty set to collect ids and prevent collisions
-    id_set = set()
-
-    # iterate through files
-    for file in input_files:
-        # get file contents
-        with open(file) as f:
-            ids = f.read().splitlines()
-            # add ids to set, which is non-redundant
-            id_set.update(ids)
-
-    # save unique entries to a new .txt file
-    with open(output_file, "w+") as f:
-        f.writelines(id + "\n" for id in id_set)
+    write_id_list(aggregate_id_lists(input_files), output_file)
 
 
 # run this if called from the interpreter
@@ -1,5 +1,13 @@
 #!/usr/bin/env python
+import asyncio
+import atexit
+import json
 import os
+import re
+import sys
+import threading
+import time
+from urllib.parse import urlparse
 
 from bioservices import UniProt
 from requests import Session
@@ -7,10 +15,85 @@ from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 from tests import artifact_generation_utils, mocks
 
-__all__ = ["session_with_retry", "DefaultExpBackoffRetry", "UniProtWithExpBackoff"]
+__all__ = [
+    "session_with_retry",
+    "make_session",
+    "get_rate_limiter",
+    "get_request_metrics",
+    "TokenBucket",
+    "AdaptiveRateLimiter",
+    "RequestMetrics",
+    "RequestTracer",
+    "path_template",
+    "set_host_overrides",
+    "poll_with_backoff",
+    "poll_with_backoff_async",
+    "DefaultExpBackoffRetry",
+    "UniProtWithExpBackoff",
+]
 
 USER_AGENT_HEADER = {"User-Agent": "ProteinCartography/0.4 (Arcadia Science) python-requests/2.0.1"}
 
+# the chunk size to use when streaming large downloads
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# the number of connections to each host that are kept alive for reuse;
+# hosts that are queried from many threads at once need larger pools
+# (otherwise urllib3 discards the extra connections with a "connection pool is full" warning)
+DEFAULT_POOL_SIZE = 10
+HOST_POOL_SIZES = {
+    "alphafold.ebi.ac.uk": 32,
+    "rest.uniprot.org": 16,
+    "search.foldseek.com": 16,
+}
+
+UNIPROT_HOST = "rest.uniprot.org"
+
+# the maximum number of requests per second to each host, shared by all of the threads
+# in the process (requests to other hosts are not rate-limited);
+# the rate is lowered when the host throttles the requests, then ramps back up to this maximum
+# (see `AdaptiveRateLimiter`)
+HOST_RATE_LIMITS = {
+    "alphafold.ebi.ac.uk": 100,
+    "rest.uniprot.org": 10,
+}
+
+# the status codes of the responses from hosts that are throttling the requests
+THROTTLE_STATUS_CODES = (429, 503)
+
+# the parameters of the additive-increase/multiplicative-decrease control of the rate limits:
+# the rate is multiplied by `RATE_DECREASE_FACTOR` after each throttled request (down to
+# `MIN_RATE_LIMIT` requests per second), and is increased by `RATE_INCREASE_FRACTION`
+# of the maximum rate after each successful request
+RATE_DECREASE_FACTOR = 0.5
+RATE_INCREASE_FRACTION = 0.01
+MIN_RATE_LIMIT = 0.5
+
+# the maximum number of seconds for which to pause all requests to a host
+# when a throttled response includes a 'Retry-After' header
+MAX_RETRY_AFTER = 120
+
+# the upper bounds (in seconds) of the buckets of the request latency histograms
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# If this env variable is set, the request metrics are appended (as a JSON line) to the file
+# at this path when the process exits.
+REQUEST_METRICS_FILE_ENV_VAR = "PROTEINCARTOGRAPHY_REQUEST_METRICS_FILE"
+
+# If this env variable is set, every request is traced (as a JSON line) to a file in the directory
+# at this path (one file per process); see `summarize_request_traces.py`.
+REQUEST_TRACE_DIR_ENV_VAR = "PROTEINCARTOGRAPHY_REQUEST_TRACE_DIR"
+
+# If this env variable is set, the requests to the hosts that it lists are sent to other servers
+# instead. It is a JSON object that maps hostnames to base URLs (e.g. '{"rest.uniprot.org":
+# "http://127.0.0.1:8000/rest.uniprot.org"}'); it is used to send the pipeline's requests
+# to a local stand-in server (see `tests/standin_server.py`) to benchmark the network layer.
+HOST_OVERRIDES_ENV_VAR = "PROTEINCARTOGRAPHY_HOST_OVERRIDES"
+
+# the segments of URL paths that are replaced by a placeholder in the traces
+# (these are IDs, like accessions and job IDs: at least 6 characters, including a digit)
+ID_PATH_SEGMENT_REGEX = re.compile(r"^(?=.*\d)[^/]{6,}$")
+
 # If necessary, mock the web API responses returned by the `request` method of `requests.Session`
 # Note: the env variable below is set by the `set_env_variables` pytest fixture during test setup;
 # it should be used only during testing and *not* in production.
@@ -27,37 +110,447 @@ if os.environ.get("PROTEINCARTOGRAPHY_SHOULD_LOG_API_REQUESTS") == "true":
     HTTPAdapter = artifact_generation_utils.HTTPAdapterWithLogging  # noqa F811
 
 
-def session_with_retry():
+class TokenBucket:
+    """
+    A thread-safe token-bucket rate limiter. Tokens are added at `rate` tokens per second,
+    up to `capacity` tokens, and each call to `acquire` consumes one token
+    (waiting until one is available). It can also be used as a context manager.
+
+    Args:
+        rate (float): the number of tokens added per second.
+        capacity (float): the maximum number of tokens (i.e. the largest burst of requests).
+            If None, the capacity is equal to the rate.
+    """
+
+    def __init__(self, rate: float, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    A `TokenBucket` whose rate is controlled by the feedback from the host
+    (additive increase, multiplicative decrease): the rate is cut when the host throttles
+    a request, and all requests are paused for the time given in the 'Retry-After' header;
+    the rate then ramps back up with each successful request, up to `max_rate`.
+
+    It is shared by all of the threads (and, through `asyncio.to_thread`, the coroutines)
+    that make requests to the host. When it is used as a context manager, a request
+    that does not raise an exception counts as successful.
+
+    Args:
+        max_rate (float): the maximum (and initial) number of requests per second.
+        min_rate (float): the minimum number of requests per second.
+    """
+
+    def __init__(self, max_rate: float, min_rate=MIN_RATE_LIMIT):
+        super().__init__(max_rate)
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+
+    def throttle(self, retry_after=None):
+        """
+        Lowers the rate after a throttled request, and if `retry_after` is given,
+        pauses all requests for that number of seconds.
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE_FACTOR)
+            if retry_after:
+                # the tokens are only added again once the pause is over
+                # (see `TokenBucket.acquire`)
+                pause_end = time.monotonic() + min(retry_after, MAX_RETRY_AFTER)
+                self._tokens = 0
+                self._updated_at = max(self._updated_at, pause_end)
+
+    def succeed(self):
+        """
+        Raises the rate after a successful request.
+        """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_INCREASE_FRACTION)
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.succeed()
+        return False
+
+
+class RequestMetrics:
+    """
+    Thread-safe counts, per host, of the requests made by the process: the number of requests,
+    retries and failed requests, the number of bytes received, and a histogram of the latencies
+    (the time until the response headers were received).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def record(self, host: str, latency: float, num_bytes: int, num_retries: int, failed: bool):
+        with self._lock:
+            metrics = self._hosts.setdefault(
+                host,
+                {
+                    "requests": 0,
+                    "retries": 0,
+                    "failures": 0,
+                    "bytes": 0,
+                    "latency_seconds_total": 0.0,
+                    "latency_histogram": [0] * (len(LATENCY_BUCKETS) + 1),
+                },
+            )
+            metrics["requests"] += 1
+            metrics["retries"] += num_retries
+            metrics["failures"] += int(failed)
+            metrics["bytes"] += num_bytes
+            metrics["latency_seconds_total"] += latency
+            bucket = next(
+                (ind for ind, bound in enumerate(LATENCY_BUCKETS) if latency <= bound),
+                len(LATENCY_BUCKETS),
+            )
+            metrics["latency_histogram"][bucket] += 1
+
+    def as_dict(self) -> dict:
+        """
+        Returns the metrics for each host, with the histogram buckets labeled by their upper bounds
+        """
+        labels = [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        with self._lock:
+            return {
+                host: {
+                    **metrics,
+                    "latency_histogram": dict(zip(labels, metrics["latency_histogram"])),
+                }
+                for host, metrics in self._hosts.items()
+            }
+
+    def write(self, output_file: str):
+        """
+        Appends the metrics to a JSON-lines file, with the name of the script and the process ID
+        (so that the file can be shared by all of the processes run by the pipeline).
+        """
+        record = {
+            "script": os.path.basename(sys.argv[0]),
+            "pid": os.getpid(),
+            "hosts": self.as_dict(),
+        }
+        with open(output_file, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+def path_template(path: str) -> str:
+    """
+    Replaces the IDs in a URL path with a placeholder, so that the requests to the same endpoint
+    can be grouped (e.g. '/idmapping/status/3b1e5a8f' becomes '/idmapping/status/{id}').
+    """
+    return "/".join(
+        "{id}" if ID_PATH_SEGMENT_REGEX.match(segment) else segment for segment in path.split("/")
+    )
+
+
+class RequestTracer:
+    """
+    Thread-safe writer of a JSON-lines trace of every request made by the process.
+    The trace is written to a file named by the script and the process ID
+    in `trace_dirpath`, so that the directory can be shared by all of the processes.
+
+    Args:
+        trace_dirpath (str): path to the directory in which to write the trace.
+    """
+
+    def __init__(self, trace_dirpath: str):
+        os.makedirs(trace_dirpath, exist_ok=True)
+        script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+        self.trace_filepath = os.path.join(trace_dirpath, f"{script_name}.{os.getpid()}.jsonl")
+        self._lock = threading.Lock()
+
+    def trace(self, **record):
+        line = json.dumps({"time": time.time(), **record}) + "\n"
+        with self._lock, open(self.trace_filepath, "a") as file:
+            file.write(line)
+
+
+_request_metrics = RequestMetrics()
+_request_tracer = (
+    RequestTracer(os.environ[REQUEST_TRACE_DIR_ENV_VAR])
+    if os.environ.get(REQUEST_TRACE_DIR_ENV_VAR)
+    else None
+)
+_host_overrides = json.loads(os.environ.get(HOST_OVERRIDES_ENV_VAR) or "{}")
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_request_metrics() -> RequestMetrics:
+    """
+    Returns the metrics of the requests made by the process using the sessions from `make_session`.
     """
-    This will return a requests Session with `DefaultExpBackoffRetry` set for the retry strategy,
-    giving back a session with exponential backoff.
+    return _request_metrics
+
+
+def set_host_overrides(host_overrides: dict):
+    """
+    Sets the base URLs to which to send the requests to each host, in place of the host itself
+    (see `HOST_OVERRIDES_ENV_VAR`). The original host is still used for the rate limits,
+    metrics and traces.
+    """
+    global _host_overrides
+    _host_overrides = dict(host_overrides)
+
+
+def get_rate_limiter(host: str):
+    """
+    Returns the process-wide `AdaptiveRateLimiter` for the given host,
+    or None if requests to the host are not rate-limited (see `HOST_RATE_LIMITS`).
+    """
+    if host not in HOST_RATE_LIMITS:
+        return None
+
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = AdaptiveRateLimiter(HOST_RATE_LIMITS[host])
+        return _rate_limiters[host]
+
+
+class HTTPAdapterWithMetrics(HTTPAdapter):
+    """
+    This class extends `HTTPAdapter` (or `HTTPAdapterWithLogging`, if API requests are being logged)
+    to send the requests to overridden hosts to their stand-ins (see `set_host_overrides`),
+    to wait for the rate limiter of the host before sending each request
+    (and to raise its rate after each request that is not throttled),
+    to record the metrics of each request in the process-wide `RequestMetrics`,
+    and (if tracing is enabled) to write a trace of each request.
+    """
+
+    def send(self, request, **kwargs):
+        url = urlparse(request.url)
+        host = url.hostname or ""
+
+        if host in _host_overrides:
+            origin = f"{url.scheme}://{url.netloc}"
+            request.url = _host_overrides[host].rstrip("/") + request.url[len(origin) :]
+
+        queue_start_time = time.monotonic()
+        rate_limiter = get_rate_limiter(host)
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        start_time = time.monotonic()
+        response = None
+        try:
+            response = super().send(request, **kwargs)
+        finally:
+            latency = time.monotonic() - start_time
+            num_bytes = num_retries = 0
+            if response is not None:
+                retries = getattr(response.raw, "retries", None)
+                num_retries = len(retries.history) if retries is not None else 0
+                if kwargs.get("stream"):
+                    num_bytes = int(response.headers.get("Content-Length", 0))
+                else:
+                    num_bytes = len(response.content)
+
+            failed = response is None or response.status_code >= 400
+            if (
+                rate_limiter is not None
+                and response is not None
+                and response.status_code not in THROTTLE_STATUS_CODES
+            ):
+                rate_limiter.succeed()
+
+            _request_metrics.record(host, latency, num_bytes, num_retries, failed=failed)
+
+            if _request_tracer is not None:
+                _request_tracer.trace(
+                    method=request.method,
+                    host=host,
+                    path=path_template(url.path),
+                    status=response.status_code if response is not None else None,
+                    retries=num_retries,
+                    bytes=num_bytes,
+                    queue_wait=start_time - queue_start_time,
+                    latency=latency,
+                )
+
+        return response
+
+
+def make_session():
+    """
+    Returns a new requests Session with `DefaultExpBackoffRetry` set for the retry strategy,
+    with a connection pool of `HOST_POOL_SIZES` connections for each of the hosts listed there
+    (and `DEFAULT_POOL_SIZE` connections for all other hosts).
     """
     session = Session()
-    retry = DefaultExpBackoffRetry()
     session.headers.update(USER_AGENT_HEADER)
-    adapter = HTTPAdapter(max_retries=retry)
+
+    adapter = HTTPAdapterWithMetrics(
+        max_retries=DefaultExpBackoffRetry(),
+        pool_connections=DEFAULT_POOL_SIZE,
+        pool_maxsize=DEFAULT_POOL_SIZE,
+    )
     session.mount("http://", adapter)
     session.mount("https://", adapter)
+
+    # note: requests uses the adapter with the longest matching prefix
+    # (the retries of the requests to each of these hosts lower the rate of its rate limiter
+    # when they are throttled)
+    for host, pool_size in HOST_POOL_SIZES.items():
+        host_adapter = HTTPAdapterWithMetrics(
+            max_retries=DefaultExpBackoffRetry(rate_limiter=get_rate_limiter(host)),
+            pool_connections=1,
+            pool_maxsize=pool_size,
+        )
+        session.mount(f"https://{host}", host_adapter)
+        session.mount(f"http://{host}", host_adapter)
+
     return session
 
 
+def session_with_retry():
+    """
+    This will return the process-wide requests Session (see `make_session`), which has
+    `DefaultExpBackoffRetry` set for the retry strategy, giving back a session with exponential
+    backoff. Because the session is shared, its connections are kept alive and reused
+    by all of the callers (and threads) in the process.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
+
+def _write_request_metrics():
+    output_file = os.environ.get(REQUEST_METRICS_FILE_ENV_VAR)
+    if output_file and _request_metrics.as_dict():
+        _request_metrics.write(output_file)
+
+
+atexit.register(_write_request_metrics)
+
+
+def poll_with_backoff(
+    get_status,
+    is_done,
+    initial_interval=1,
+    max_interval=30,
+    backoff_factor=2,
+    timeout=None,
+):
+    """
+    Repeatedly calls `get_status` until `is_done` returns True for the returned status.
+    The first poll is made immediately; the wait between subsequent polls starts at
+    `initial_interval` seconds and is multiplied by `backoff_factor` after each poll,
+    up to `max_interval` seconds. There is no wait after the final poll.
+
+    Args:
+        get_status (callable): function with no arguments that returns the current status.
+        is_done (callable): function that takes a status and returns whether polling should stop.
+        initial_interval (float): seconds to wait after the first poll.
+        max_interval (float): maximum number of seconds to wait between polls.
+        backoff_factor (float): factor by which to increase the wait after each poll.
+        timeout (float): maximum number of seconds to poll for. If None, polls indefinitely.
+
+    Returns:
+        the final status.
+
+    Raises:
+        TimeoutError: if the status is not done after `timeout` seconds.
+    """
+    start_time = time.monotonic()
+    interval = initial_interval
+    while True:
+        status = get_status()
+        if is_done(status):
+            return status
+
+        elapsed = time.monotonic() - start_time
+        if timeout is not None and elapsed + interval > timeout:
+            raise TimeoutError(f"Polling did not complete after {elapsed:.0f} seconds.")
+
+        time.sleep(interval)
+        interval = min(interval * backoff_factor, max_interval)
+
+
+async def poll_with_backoff_async(
+    get_status,
+    is_done,
+    initial_interval=1,
+    max_interval=30,
+    backoff_factor=2,
+    timeout=None,
+):
+    """
+    The asynchronous counterpart of `poll_with_backoff`,
+    for polling many jobs concurrently from a single event loop.
+
+    Args:
+        get_status (callable): coroutine function with no arguments that returns the current status.
+        (see `poll_with_backoff` for the other arguments)
+    """
+    start_time = time.monotonic()
+    interval = initial_interval
+    while True:
+        status = await get_status()
+        if is_done(status):
+            return status
+
+        elapsed = time.monotonic() - start_time
+        if timeout is not None and elapsed + interval > timeout:
+            raise TimeoutError(f"Polling did not complete after {elapsed:.0f} seconds.")
+
+        await asyncio.sleep(interval)
+        interval = min(interval * backoff_factor, max_interval)
+
+
 class DefaultExpBackoffRetry(Retry):
     """
     This class extends urllib3's `Retry` class. It sets defaults that seem to work well for the API
     calls used by the pipeline. This will give requests with the following waits: [4, 8, 16, 32, 64]
-    seconds between attempts of a failing request.
+    seconds between attempts of a failing request, unless the response includes
+    a 'Retry-After' header (as throttled responses usually do), in which case that wait is used.
+
+    If a rate limiter is provided, it is throttled each time that a request is throttled
+    (see `THROTTLE_STATUS_CODES`), so that all of the requests to the host are slowed down.
 
     Note that if you provide an argument by position and there is a kwds value,
     either by user of default, an error will be raised by Python.
     """
 
-    def __init__(self, *args, **kwds):
+    def __init__(self, *args, rate_limiter=None, **kwds):
         defaults = {
             "total": 5,
             "read": 5,
             "connect": 5,
             "backoff_factor": 2,
-            "status_forcelist": (500, 502, 503, 504),
+            "status_forcelist": (429, 500, 502, 503, 504),
             "allowed_methods": frozenset({"GET", "PUT", "POST"}),
         }
 
@@ -66,14 +559,31 @@ class DefaultExpBackoffRetry(Retry):
             kwds.setdefault(key, value)
 
         super().__init__(*args, **kwds)
+        self.rate_limiter = rate_limiter
+
+    def new(self, **kwds):
+        # urllib3 creates a new `Retry` object for each attempt
+        kwds.setdefault("rate_limiter", self.rate_limiter)
+        return super().new(**kwds)
+
+    def increment(self, *args, response=None, **kwds):
+        if (
+            self.rate_limiter is not None
+            and response is not None
+            and response.status in THROTTLE_STATUS_CODES
+        ):
+            self.rate_limiter.throttle(self.get_retry_after(response))
+        return super().increment(*args, response=response, **kwds)
 
 
 class UniProtWithExpBackoff(UniProt):
     """
     Specialize the UniProt class to set the MAX_RETRIES to be a DefaultExpBackoffRetry
-    object.
+    object, which throttles the shared rate limiter for UniProt when the requests are throttled.
     """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.services.settings.MAX_RETRIES = DefaultExpBackoffRetry()
+        self.services.settings.MAX_RETRIES = DefaultExpBackoffRetry(
+            rate_limiter=get_rate_limiter(UNIPROT_HOST)
+        )
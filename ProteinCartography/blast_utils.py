@@ -1,4 +1,202 @@
+import csv
+import os
 import subprocess
+from pathlib import Path
+
+# only import these functions when using import *
+__all__ = [
+    "concatenate_queries",
+    "read_query_seqids",
+    "read_query_sequences",
+    "run_blast",
+    "split_results_by_query",
+]
+
+# the backends used to run the BLAST search
+# 'remote' uses `blastp -remote` against the NCBI servers
+# 'local' uses a pre-built protein database on the local filesystem
+REMOTE_BACKEND = "remote"
+LOCAL_BACKEND = "local"
+
+# the aligners that can be used with the local backend
+# (the remote backend only supports blastp)
+BLASTP_ALIGNER = "blastp"
+DIAMOND_ALIGNER = "diamond"
+
+# the database searched by the remote backend
+REMOTE_DATABASE = "nr"
+
+# the BLAST output fields that DIAMOND does not support, and the DIAMOND field used in their place
+# (the accessions and GIs are parsed from the sseqid, see `_parse_sseqid`)
+DIAMOND_FIELD_SUBSTITUTIONS = {
+    "sacc": "sseqid",
+    "saccver": "sseqid",
+    "sgi": "sseqid",
+}
+
+# the taxonomy output fields, which DIAMOND only supports if the database was built
+# with `diamond makedb --taxonmap --taxonnodes --taxonnames`; these fields are not requested
+# from DIAMOND, and are filled with the values blastp reports for sequences without taxonomy
+DIAMOND_TAXONOMY_FIELDS = {
+    "staxid": "0",
+    "staxids": "0",
+    "sscinames": "N/A",
+    "scomnames": "N/A",
+    "sblastnames": "N/A",
+    "sskingdoms": "N/A",
+}
+
+
+def _parse_outfmt(outfmt: str):
+    """
+    Split an outfmt string (e.g. '6 qseqid sseqid ...') into the format code and the list of fields
+    """
+    fmt, *fields = outfmt.split()
+    return fmt, fields
+
+
+def _diamond_fields(fields: list):
+    """
+    Map a list of BLAST output fields to the (deduplicated) list of DIAMOND output fields
+    """
+    return list(
+        dict.fromkeys(
+            DIAMOND_FIELD_SUBSTITUTIONS.get(field, field)
+            for field in fields
+            if field not in DIAMOND_TAXONOMY_FIELDS
+        )
+    )
+
+
+def _parse_sseqid(sseqid: str):
+    """
+    Parse the accession (with its version, if any) and the GI of a subject from its sequence ID,
+    the way blastp does for databases built with `makeblastdb -parse_seqids`.
+
+    The sequence ID is either a bare accession (e.g. 'XP_052610122.1') or a FASTA-style ID
+    with database tags (e.g. 'sp|P60709|ACTB_HUMAN', 'ref|XP_052610122.1|'
+    or 'gi|1234|ref|XP_052610122.1|'), in which case the accession is the first ID
+    that follows a tag other than 'gi'. The GI is '0' if the sequence ID does not include one.
+
+    Returns:
+        a tuple of the accession without its version, the accession and the GI.
+    """
+    tokens = sseqid.split("|")
+    gi = "0"
+    accver = sseqid
+    if len(tokens) > 1:
+        accver = ""
+        for tag, value in zip(tokens[::2], tokens[1::2]):
+            if tag == "gi":
+                gi = value
+            elif not accver:
+                accver = value
+        accver = accver or sseqid
+
+    acc, _, version = accver.rpartition(".")
+    if not acc or not version.isdigit():
+        acc = accver
+    return acc, accver, gi
+
+
+def _blastp_args(
+    query: str,
+    out: str,
+    max_target_seqs: int,
+    outfmt: str,
+    word_size: int,
+    evalue: float,
+    backend: str,
+    db: str,
+    num_threads: int,
+):
+    """
+    Construct the list of arguments for `blastp`
+    """
+    args = [
+        "blastp",
+        "-db",
+        db,
+        "-query",
+        query,
+        "-out",
+        out,
+        "-max_target_seqs",
+        str(max_target_seqs),
+        "-outfmt",
+        outfmt,
+        "-word_size",
+        str(word_size),
+        "-evalue",
+        str(evalue),
+    ]
+
+    # note: blastp does not allow `-num_threads` with `-remote`
+    if backend == REMOTE_BACKEND:
+        args.append("-remote")
+    else:
+        args.extend(["-num_threads", str(num_threads)])
+
+    return args
+
+
+def _diamond_args(
+    query: str,
+    out: str,
+    max_target_seqs: int,
+    outfmt: str,
+    evalue: float,
+    db: str,
+    num_threads: int,
+):
+    """
+    Construct the list of arguments for `diamond blastp`
+
+    Note: DIAMOND does not use a word size, so the `word_size` argument is ignored.
+    The taxonomy fields are not requested (see `DIAMOND_TAXONOMY_FIELDS`), so any DIAMOND database
+    can be used, and the subject IDs are parsed as blastp does (see `_parse_sseqid`).
+    """
+    fmt, fields = _parse_outfmt(outfmt)
+    return [
+        "diamond",
+        "blastp",
+        "--db",
+        db,
+        "--query",
+        query,
+        "--out",
+        out,
+        "--max-target-seqs",
+        str(max_target_seqs),
+        "--outfmt",
+        fmt,
+        *_diamond_fields(fields),
+        "--evalue",
+        str(evalue),
+        "--threads",
+        str(num_threads),
+        "--sensitive",
+    ]
+
+
+def _convert_diamond_output(out: str, outfmt: str):
+    """
+    Rewrite the tabular output of `diamond blastp` in place so that it has
+    the same columns as the output of `blastp` for the given outfmt.
+    """
+    _, fields = _parse_outfmt(outfmt)
+    diamond_fields = _diamond_fields(fields)
+
+    temp_out = f"{out}.{os.getpid()}.temp"
+    with open(out, newline="") as infile, open(temp_out, "w", newline="") as outfile:
+        reader = csv.reader(infile, delimiter="\t")
+        writer = csv.writer(outfile, delimiter="\t", lineterminator="\n")
+        for row in reader:
+            values = DIAMOND_TAXONOMY_FIELDS | dict(zip(diamond_fields, row))
+            sacc, saccver, sgi = _parse_sseqid(values.get("sseqid", ""))
+            values.update({"sacc": sacc, "saccver": saccver, "sgi": sgi})
+            writer.writerow([values.get(field, "N/A") for field in fields])
+    os.replace(temp_out, out)
 
 
 def run_blast(
@@ -8,9 +206,14 @@ def run_blast(
     outfmt: str,
     word_size: int,
     evalue: float,
+    backend: str = REMOTE_BACKEND,
+    db: str = REMOTE_DATABASE,
+    num_threads: int = 1,
+    aligner: str = BLASTP_ALIGNER,
 ):
     """
-    Call `blastp` against the remote server
+    Call `blastp` against the remote server, or `blastp` or `diamond blastp`
+    against a local database
 
     Note: the argument names used here correspond exactly to (a subset of the) blastp CLI arguments
 
@@ -22,32 +225,146 @@ def run_blast(
         out (str): path of destination blastresults.tsv file.
         max_target_seqs (int): maximum number of hits to return
         outfmt (str): passed to blastp '-outfmt'
-        word_size (str): passed to blastp '-word_size'
+        word_size (str): passed to blastp '-word_size' (ignored by DIAMOND)
         evalue (str): passed to blastp '-evalue'
+        backend (str): either 'remote' or 'local'.
+        db (str): the name of the remote database, or the path to the local database.
+        num_threads (int): the number of threads to use (only used by the local backend).
+        aligner (str): either 'blastp' or 'diamond' (DIAMOND requires the local backend).
+    Returns:
+        the `subprocess.CompletedProcess` of the call to the aligner.
+    """
+    if backend not in (REMOTE_BACKEND, LOCAL_BACKEND):
+        raise ValueError(f"Unknown BLAST backend '{backend}'")
+
+    if aligner == BLASTP_ALIGNER:
+        args = _blastp_args(
+            query, out, max_target_seqs, outfmt, word_size, evalue, backend, db, num_threads
+        )
+    elif aligner == DIAMOND_ALIGNER:
+        if backend != LOCAL_BACKEND:
+            raise ValueError("DIAMOND can only be used with the local BLAST backend")
+        args = _diamond_args(query, out, max_target_seqs, outfmt, evalue, db, num_threads)
+    else:
+        raise ValueError(f"Unknown BLAST aligner '{aligner}'")
+
+    result = subprocess.run(args, capture_output=True)
+
+    if aligner == DIAMOND_ALIGNER and result.returncode == 0:
+        _convert_diamond_output(out, outfmt)
+
+    return result
+
+
+def _read_fasta_records(query_file: str):
+    """
+    Read a FASTA file into a list of (defline, sequence lines) tuples
+    (the defline excludes the leading '>')
+    """
+    records = []
+    with open(query_file) as file:
+        for line in file:
+            line = line.rstrip("\n")
+            if line.startswith(">"):
+                records.append((line[1:], []))
+            elif line.strip() and records:
+                records[-1][1].append(line)
+    return records
+
+
+def read_query_sequences(query_file: str) -> str:
+    """
+    Returns the normalized sequence(s) in a FASTA file (uppercase, without whitespace,
+    one line per record), ignoring the deflines, for use in cache keys
+    """
+    return "\n".join(
+        "".join(lines).replace(" ", "").upper() for _, lines in _read_fasta_records(query_file)
+    )
+
+
+def read_query_seqids(query_file: str) -> list:
+    """
+    Returns the sequence IDs (the first word of the deflines) of the records in a FASTA file,
+    which are the qseqids that the aligner reports for these records
+    """
+    records = _read_fasta_records(query_file)
+    return [defline.split()[0] if defline.strip() else "" for defline, _ in records]
+
+
+def concatenate_queries(query_files: list, output_file: str) -> dict:
     """
-    database = "nr"
-    result = subprocess.run(
-        " ".join(
+    Concatenate the input FASTA files into a single multi-query FASTA file,
+    so that all of the queries can be searched with a single call to the aligner.
+
+    The deflines are left unchanged, so that the qseqids in the results are the same as they would
+    be if each query were searched separately, unless the sequence IDs (the first word of the
+    deflines) are missing or not unique; in that case, they are replaced by the query filenames.
+
+    Args:
+        query_files (list): paths of the input peptide FASTA files.
+        output_file (str): path of the multi-query FASTA file to write.
+    Returns:
+        a dict mapping each of the qseqids by which the aligner may identify a query
+        to the index of the query file from which it came.
+    """
+    records_per_file = [_read_fasta_records(query_file) for query_file in query_files]
+
+    seqids = [
+        defline.split()[0]
+        for records in records_per_file
+        for defline, _ in records
+        if defline.strip()
+    ]
+    num_records = sum(len(records) for records in records_per_file)
+    if len(set(seqids)) < num_records:
+        records_per_file = [
             [
-                "blastp",
-                "-remote",
-                "-db",
-                database,
-                "-query",
-                query,
-                "-out",
-                out,
-                "-max_target_seqs",
-                str(max_target_seqs),
-                "-outfmt",
-                f"'{outfmt}'",
-                "-word_size",
-                str(word_size),
-                "-evalue",
-                str(evalue),
+                (f"{Path(query_file).stem}_{ind}" if ind else Path(query_file).stem, lines)
+                for ind, (_, lines) in enumerate(records)
             ]
-        ),
-        capture_output=True,
-        shell=True,
-    )
-    return result
+            for query_file, records in zip(query_files, records_per_file)
+        ]
+
+    query_aliases = {}
+    query_number = 0
+    with open(output_file, "w") as file:
+        for file_ind, records in enumerate(records_per_file):
+            for defline, lines in records:
+                query_number += 1
+                seqid = defline.split()[0]
+
+                # blastp reports unparseable query IDs as 'Query_<n>',
+                # and may prefix local IDs with 'lcl|'
+                for alias in [seqid, f"lcl|{seqid}", f"Query_{query_number}"]:
+                    query_aliases[alias] = file_ind
+
+                file.write(f">{defline}\n")
+                file.writelines(f"{line}\n" for line in lines)
+
+    return query_aliases
+
+
+def split_results_by_query(results_file: str, out_files: list, query_aliases: dict):
+    """
+    Demultiplex the tabular results of a multi-query search into one results file per query file,
+    using the qseqid in the first column of each row.
+
+    Args:
+        results_file (str): path of the blastresults.tsv file for the multi-query search.
+        out_files (list): paths of the per-query blastresults.tsv files to write,
+            in the same order as the query files passed to `concatenate_queries`.
+        query_aliases (dict): the mapping returned by `concatenate_queries`.
+    """
+    out_handles = [open(out_file, "w") for out_file in out_files]
+    try:
+        with open(results_file) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                qseqid = line.split("\t", 1)[0]
+                if qseqid not in query_aliases:
+                    raise ValueError(f"Unexpected qseqid '{qseqid}' in {results_file}")
+                out_handles[query_aliases[qseqid]].write(line)
+    finally:
+        for handle in out_handles:
+            handle.close()
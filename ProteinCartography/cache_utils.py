@@ -0,0 +1,175 @@
+import hashlib
+import os
+import shutil
+import time
+from pathlib import Path
+
+# only import these functions when using import *
+__all__ = ["ResultCache", "hash_file", "hash_string", "make_result_cache"]
+
+# the size of the blocks in which files are read when hashing them
+HASH_BLOCK_SIZE = 1024 * 1024
+
+SECONDS_PER_DAY = 60 * 60 * 24
+BYTES_PER_GB = 1000**3
+
+
+def hash_file(filepath: str) -> str:
+    """
+    Returns the sha256 hex digest of the contents of a file.
+    """
+    sha256 = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def hash_string(string: str) -> str:
+    """
+    Returns the sha256 hex digest of a string.
+    """
+    return hashlib.sha256(string.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    A persistent on-disk cache of result files, keyed by the hash of the parameters
+    that determine the result (e.g. the hash of the query structure, the databases, the mode, etc).
+
+    Each entry is a single file in `cache_dir`. Entries older than `ttl_seconds` are treated as
+    missing, and the least-recently-used entries are evicted whenever the total size of the cache
+    exceeds `max_size_bytes`.
+
+    Args:
+        cache_dir (str): path to the directory in which to store the cached files.
+        suffix (str): suffix appended to the names of the cached files (e.g. '.tar.gz').
+        ttl_seconds (float): maximum age of a cached entry. If None, entries never expire.
+        max_size_bytes (int): maximum total size of the cache. If None, the size is unbounded.
+    """
+
+    def __init__(self, cache_dir: str, suffix="", ttl_seconds=None, max_size_bytes=None):
+        self.cache_dir = Path(cache_dir)
+        self.suffix = suffix
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """
+        Construct a cache key from an arbitrary number of parameters.
+        Lists and tuples are joined so that they can be passed directly.
+        """
+        normalized_parts = [
+            ",".join(str(item) for item in part) if isinstance(part, (list, tuple)) else str(part)
+            for part in parts
+        ]
+        return hash_string("\t".join(normalized_parts))
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.suffix}"
+
+    def _is_expired(self, path: Path) -> bool:
+        if self.ttl_seconds is None:
+            return False
+        # note: the mtime of an entry is the time at which it was added to the cache
+        return time.time() - path.stat().st_mtime > self.ttl_seconds
+
+    def get(self, key: str):
+        """
+        Returns the path to the cached file for the given key, or None if there is no valid entry.
+        """
+        path = self._entry_path(key)
+        if not path.is_file():
+            return None
+
+        if self._is_expired(path):
+            path.unlink(missing_ok=True)
+            return None
+
+        # explicitly record the access time, for least-recently-used eviction
+        # (the mtime is left unchanged, because it is used to determine expiration)
+        os.utime(path, (time.time(), path.stat().st_mtime))
+        return path
+
+    def fetch(self, key: str, output_file: str) -> bool:
+        """
+        Copies the cached file for the given key to `output_file`, if there is a valid entry.
+
+        Returns:
+            True if there was a cache hit, False otherwise.
+        """
+        path = self.get(key)
+        if path is None:
+            return False
+
+        output_dirpath = os.path.dirname(output_file)
+        if output_dirpath:
+            os.makedirs(output_dirpath, exist_ok=True)
+        shutil.copyfile(path, output_file)
+        return True
+
+    def put(self, key: str, input_file: str):
+        """
+        Adds a copy of `input_file` to the cache under the given key,
+        then evicts old entries if the cache is too large.
+
+        The file is first copied to a temporary path and then moved into place,
+        so that concurrent readers never see a partially-written entry.
+        """
+        path = self._entry_path(key)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.temp")
+        shutil.copyfile(input_file, temp_path)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Removes expired entries, then removes the least-recently-used entries
+        until the total size of the cache is at most `max_size_bytes`.
+        """
+        entries = []
+        for path in self.cache_dir.glob(f"*{self.suffix}"):
+            if not path.is_file() or path.name.endswith(".temp"):
+                continue
+            if self._is_expired(path):
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            entries.append((stat.st_atime, stat.st_size, path))
+
+        if self.max_size_bytes is None:
+            return
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+
+def make_result_cache(cache_dir, subdir: str, suffix="", ttl_days=None, max_size_gb=None):
+    """
+    Convenience function to construct a `ResultCache` from the pipeline's cache settings.
+
+    Args:
+        cache_dir (str): path to the root cache directory. If empty or None, caching is disabled.
+        subdir (str): name of the subdirectory of `cache_dir` used for this kind of result.
+        suffix (str): suffix appended to the names of the cached files.
+        ttl_days (float): maximum age of a cached entry in days. If None or 0, entries never expire.
+        max_size_gb (float): maximum size of the cache subdirectory in GB.
+            If None or 0, the size is unbounded.
+    Returns:
+        a `ResultCache`, or None if caching is disabled.
+    """
+    if not cache_dir:
+        return None
+
+    return ResultCache(
+        Path(cache_dir) / subdir,
+        suffix=suffix,
+        ttl_seconds=ttl_days * SECONDS_PER_DAY if ttl_days else None,
+        max_size_bytes=int(max_size_gb * BYTES_PER_GB) if max_size_gb else None,
+    )
@@ -119,3 +119,70 @@ def _get_features_override_file(config):
     if not features_override_file.is_file():
         features_override_file = ""
     return features_override_file
+
+
+def _get_foldseek_local_databases(config):
+    """
+    When using the local Foldseek backend, returns the list of 'name=path' strings
+    that specify the local database to search for each of the configured Foldseek databases;
+    when using the web backend, returns an empty list
+    """
+    if config.get("foldseek_backend", "web") != "local":
+        return []
+
+    local_databases = config.get("foldseek_local_databases") or {}
+    missing_databases = [db for db in config["foldseek_databases"] if db not in local_databases]
+    if missing_databases:
+        raise ProteinCartographyInputError(
+            "When using the local Foldseek backend, a path must be provided in "
+            "`foldseek_local_databases` for each database in `foldseek_databases`. "
+            f"Missing paths for: {missing_databases}"
+        )
+
+    return [
+        f"{db}={pathlib.Path(local_databases[db]).expanduser()}"
+        for db in config["foldseek_databases"]
+    ]
+
+
+def _get_blast_database(config):
+    """
+    Returns the BLAST database to search: the name of the remote database when using the remote
+    backend, or the path to the pre-built local database when using the local backend
+    """
+    backend = config.get("blast_backend", "remote")
+    aligner = config.get("blast_aligner", "blastp")
+
+    if backend == "remote":
+        if aligner != "blastp":
+            raise ProteinCartographyInputError(
+                "Only the 'blastp' aligner can be used with the remote BLAST backend."
+            )
+        return "nr"
+
+    local_database = config.get("blast_local_database")
+    if not local_database:
+        raise ProteinCartographyInputError(
+            "When using the local BLAST backend, the path to a pre-built protein database "
+            "must be provided in `blast_local_database`."
+        )
+    return str(pathlib.Path(local_database).expanduser())
+
+
+# the formats of the optional separate file of UniProt sequences
+# (an empty string means that the sequences are kept in the features file)
+UNIPROT_SEQUENCES_FORMATS = ("", "fasta", "parquet")
+
+
+def _get_uniprot_sequences_format(config):
+    """
+    Returns the format of the optional separate file of UniProt sequences,
+    or an empty string if the sequences are kept in the features file
+    """
+    sequences_format = config.get("uniprot_sequences_format") or ""
+    if sequences_format not in UNIPROT_SEQUENCES_FORMATS:
+        raise ProteinCartographyInputError(
+            f"Invalid `uniprot_sequences_format` '{sequences_format}'; "
+            "it must be 'fasta', 'parquet' or an empty string."
+        )
+    return sequences_format
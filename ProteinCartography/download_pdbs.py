@@ -6,7 +6,6 @@ from pathlib import Path
 import api_utils
 import fetch_accession
 import tqdm
-from ratelimiter import RateLimiter
 
 
 def parse_args():
@@ -53,13 +52,16 @@ def download_pdbs(input_file: str, output_dir: str, maximum=None):
     if maximum is not None:
         accessions = accessions[:maximum]
 
+    # note: the shared session limits the rate of requests to AlphaFold, and lowers it
+    # if AlphaFold throttles the requests (see `api_utils.AdaptiveRateLimiter`),
+    # and its connection pool to AlphaFold is large enough for all of the threads
+    # (see `api_utils.HOST_POOL_SIZES`)
     session = api_utils.session_with_retry()
-    rate_limiter = RateLimiter(max_calls=100, period=1)
     with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
         futures_to_accessions = {}
         for accession in accessions:
             future = executor.submit(
-                rate_limiter(fetch_accession.fetch_pdb),
+                fetch_accession.fetch_pdb,
                 accession=accession,
                 output_dir=output_dir,
                 session=session,
@@ -3,6 +3,9 @@ import argparse
 import os
 import sys
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_utils
 
 # depends on api_utils.py
 from api_utils import session_with_retry
@@ -18,11 +21,37 @@ from requests.packages.urllib3.exceptions import InsecureRequestWarning
 # ```
 
 # only import these functions when using import *
-__all__ = ["post_esmfold_apiquery", "esmfold_apiquery"]
+__all__ = [
+    "post_esmfold_apiquery",
+    "read_fasta_records",
+    "make_predictor",
+    "esmfold_batch",
+    "esmfold_apiquery",
+]
 
 # set acceptable fasta format suffixes
 FASTA_FORMATS = ["fa", "fna", "fasta", "faa", "ffa"]
 
+# the public ESMFold API
+ESMFOLD_API = "https://api.esmatlas.com/foldSequence/v1/pdb/"
+
+# the ESMFold API only accepts proteins up to this length
+MAX_REMOTE_SEQUENCE_LENGTH = 400
+
+# the predictor backends:
+# "remote" posts each sequence to the public ESMFold API,
+# "local" posts each sequence to a local server with the same API (e.g. a stand-in for testing),
+# and "precomputed" reads PDB files from a directory (named by record ID or by sequence hash)
+REMOTE_PREDICTOR = "remote"
+LOCAL_PREDICTOR = "local"
+PRECOMPUTED_PREDICTOR = "precomputed"
+PREDICTORS = [REMOTE_PREDICTOR, LOCAL_PREDICTOR, PRECOMPUTED_PREDICTOR]
+
+DEFAULT_LOCAL_ENDPOINT = "http://localhost:8000/foldSequence/v1/pdb/"
+
+# the maximum number of structures to predict concurrently
+DEFAULT_MAX_CONCURRENT_PREDICTIONS = 4
+
 
 # parse command line arguments
 def parse_args():
@@ -31,34 +60,96 @@ def parse_args():
     parser.add_argument(
         "-i",
         "--input",
+        nargs="+",
         required=True,
         help=(
-            "Name of input file. Must be a single-entry peptide FASTA file "
-            "(ends with .fa, .fna, .fasta)."
+            "Name of input file(s). Must be peptide FASTA files (ends with .fa, .fna, .fasta). "
+            "Files with more than one entry require --output-dir."
         ),
     )
     parser.add_argument(
         "-o",
         "--output",
-        help='Name of output file. If not provided, replaces ".fasta" from input with ".pdb".',
+        nargs="+",
+        help=(
+            "Name of output file(s), one per single-entry input file. "
+            'If not provided, replaces ".fasta" from input with ".pdb".'
+        ),
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="Directory in which to write one PDB file per entry, named by the entry ID.",
+    )
+    parser.add_argument(
+        "-p",
+        "--predictor",
+        default=REMOTE_PREDICTOR,
+        choices=PREDICTORS,
+        help=(
+            f"'{REMOTE_PREDICTOR}' to use the ESMFold API, "
+            f"'{LOCAL_PREDICTOR}' to use a local server with the same API (see --endpoint), "
+            f"or '{PRECOMPUTED_PREDICTOR}' to read PDB files from a directory "
+            "(see --precomputed-dir)."
+        ),
+    )
+    parser.add_argument(
+        "--endpoint",
+        default=DEFAULT_LOCAL_ENDPOINT,
+        help="URL of the local server used by the local predictor.",
+    )
+    # note: this CLI option requires `nargs="?"` because it is passed without a value
+    # by the `make_pdb` rules when the precomputed predictor is not used
+    parser.add_argument(
+        "--precomputed-dir",
+        nargs="?",
+        help=(
+            "Directory of PDB files used by the precomputed predictor, named either by entry ID "
+            "or by the sha256 hash of the sequence (e.g. '<id>.pdb' or '<hash>.pdb')."
+        ),
+    )
+    parser.add_argument(
+        "--max-concurrent-predictions",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_PREDICTIONS,
+        help="Maximum number of structures to predict concurrently.",
+    )
+    # note: this CLI option requires `nargs="?"` because it is passed without a value
+    # by the `make_pdb` rules when caching is disabled
+    parser.add_argument(
+        "--cache-dir",
+        nargs="?",
+        help="Directory in which to cache the structures. If not provided, caching is disabled.",
+    )
+    parser.add_argument(
+        "--cache-ttl-days",
+        type=float,
+        help="Maximum age of cached structures in days. If not provided, they never expire.",
+    )
+    parser.add_argument(
+        "--cache-max-size-gb",
+        type=float,
+        help="Maximum size of the structure cache in GB. If not provided, the size is unbounded.",
     )
     args = parser.parse_args()
     return args
 
 
-def post_esmfold_apiquery(fasta: str):
+def post_esmfold_apiquery(fasta: str, endpoint=ESMFOLD_API, session=None):
     """
     Posts a query to the ESMfold API.
 
     Args:
         fasta (str): string of valid amino acids for query.
+        endpoint (str): URL of the API (the public ESMFold API or a local server with the same API).
+        session (requests.Session): optional session to use (e.g. to share one between threads).
     """
+    if session is None:
+        session = session_with_retry()
+
     # Here we're making the request with verify=False to disable SSL
     # This may be a security concern, but is (hopefully)
     # temporary until the ESM Atlas SSL certificates are fixed
-    result = session_with_retry().post(
-        "https://api.esmatlas.com/foldSequence/v1/pdb/", data=fasta, verify=False
-    )
+    result = session.post(endpoint, data=fasta, verify=endpoint != ESMFOLD_API)
     if result.status_code == 200:
         return result.text
     else:
@@ -66,58 +157,221 @@ def post_esmfold_apiquery(fasta: str):
         return None
 
 
-def esmfold_apiquery(input_file: str, output_file=None):
+def _check_fasta_file(input_file: str):
     """
-    Takes an input peptide FASTA file with one entry
-    and submits it for folding using the ESMfold API.
-    Creates a PDB file with the resulting output.
-
-    Args:
-        input_file (str): path to input FASTA file
-            (must end with .fa, .fna, or .fasta; not case-sensitive).
-        output_file (str): path to the destination PDB file.
+    Check that the input file has a FASTA suffix and exists
     """
-    # Check to make sure input file has a correct FASTA suffix
     if not any([fmt in input_file.rsplit(".", 1)[1].lower() for fmt in FASTA_FORMATS]):
         sys.exit(f"Input expects a FASTA file ({FASTA_FORMATS})")
 
-    # Makes sure that the input file exists
     if not os.path.exists(input_file):
         sys.exit(f"File {input_file} not found.")
 
-    # if output file is not provided, generate a name for output file
-    if output_file is None:
-        output_filepath = input_file.replace(input_file.rsplit(".", 1)[1], "pdb")
+
+def read_fasta_records(input_files: list, output_files=None, output_dir=None) -> list:
+    """
+    Reads the entries of one or more FASTA files and assigns an output PDB file to each entry.
+
+    Args:
+        input_files (list): paths to the input FASTA files.
+        output_files (list): paths to the output PDB files, one per input file
+            (this requires each input file to contain a single entry).
+        output_dir (str): directory in which to write one PDB file per entry,
+            named by the entry ID. If neither this nor `output_files` is provided,
+            each output file is named by replacing the suffix of the (single-entry) input file.
+    Returns:
+        a list of (entry ID, sequence, output file) tuples.
+    """
+    if output_files is not None and len(output_files) != len(input_files):
+        sys.exit("The number of output files must match the number of input files.")
+
+    records = []
+    for ind, input_file in enumerate(input_files):
+        _check_fasta_file(input_file)
+        file_records = list(SeqIO.parse(input_file, "fasta"))
+
+        if output_dir is not None:
+            records.extend(
+                (record.id, str(record.seq), os.path.join(output_dir, f"{record.id}.pdb"))
+                for record in file_records
+            )
+            continue
+
+        if len(file_records) > 1:
+            raise Exception(
+                f"{input_file} contains more than one FASTA entry. "
+                "Please provide an output directory instead of output files."
+            )
+
+        if output_files is not None:
+            output_file = output_files[ind]
+        else:
+            output_file = input_file.replace(input_file.rsplit(".", 1)[1], "pdb")
+
+        records.extend((record.id, str(record.seq), output_file) for record in file_records)
+
+    return records
+
+
+def make_predictor(predictor: str, endpoint=DEFAULT_LOCAL_ENDPOINT, precomputed_dir=None):
+    """
+    Constructs a function that predicts the structure of a sequence using the given backend.
+
+    Args:
+        predictor (str): the predictor backend ('remote', 'local' or 'precomputed').
+        endpoint (str): URL of the local server used by the 'local' predictor.
+        precomputed_dir (str): directory of PDB files used by the 'precomputed' predictor.
+    Returns:
+        a function that takes an entry ID and a sequence and returns the contents
+        of the PDB file (or None if the structure could not be predicted).
+    """
+    if predictor in [REMOTE_PREDICTOR, LOCAL_PREDICTOR]:
+        url = ESMFOLD_API if predictor == REMOTE_PREDICTOR else endpoint
+        session = session_with_retry()
+
+        def predict(record_id: str, sequence: str):
+            if predictor == REMOTE_PREDICTOR and len(sequence) > MAX_REMOTE_SEQUENCE_LENGTH:
+                print(
+                    f"The input protein {record_id} is {len(sequence)} AA long.\n"
+                    f"ESMFold API query only allows proteins up to "
+                    f"{MAX_REMOTE_SEQUENCE_LENGTH} AA long.\n"
+                    f"Try using ColabFold instead.\n"
+                    f"Skipping..."
+                )
+                return None
+            return post_esmfold_apiquery(sequence, endpoint=url, session=session)
+
+    elif predictor == PRECOMPUTED_PREDICTOR:
+        if not precomputed_dir:
+            sys.exit("The precomputed predictor requires a directory of PDB files.")
+
+        def predict(record_id: str, sequence: str):
+            for filename in [f"{record_id}.pdb", f"{cache_utils.hash_string(sequence)}.pdb"]:
+                filepath = os.path.join(precomputed_dir, filename)
+                if os.path.exists(filepath):
+                    with open(filepath) as file:
+                        return file.read()
+            print(f"No precomputed structure was found for {record_id}. Skipping...")
+            return None
+
     else:
-        output_filepath = output_file
+        sys.exit(f"Unknown predictor '{predictor}'. Accepted predictors are {PREDICTORS}.")
 
-    # parse input_file and assign it to the variable records
-    records = list(SeqIO.parse(input_file, "fasta"))
+    return predict
 
-    if len(records) > 1:
-        raise Exception(
-            "This script expects a single FASTA entry in the input file. Please try again."
-        )
 
-    record = records[0]
-    fasta = str(record.seq)
+def _write_pdb(contents: str, output_file: str):
+    output_dirpath = os.path.dirname(output_file)
+    if output_dirpath:
+        os.makedirs(output_dirpath, exist_ok=True)
+    with open(output_file, "w+") as file:
+        file.write(contents)
+
 
-    prot_len = len(fasta)
-    if prot_len > 400:
-        print(
-            f"The input protein is {prot_len} AA long.\n"
-            f"ESMFold API query only allows proteins up to 400 AA long.\n"
-            f"Try using ColabFold instead.\n"
-            f"Skipping..."
+def esmfold_batch(
+    records: list,
+    predictor=REMOTE_PREDICTOR,
+    endpoint=DEFAULT_LOCAL_ENDPOINT,
+    precomputed_dir=None,
+    max_concurrent_predictions=DEFAULT_MAX_CONCURRENT_PREDICTIONS,
+    cache_dir=None,
+    cache_ttl_days=None,
+    cache_max_size_gb=None,
+):
+    """
+    Predicts the structures of a batch of sequences and writes one PDB file per entry.
+
+    Identical sequences are only predicted once. If a cache directory is provided, the structure
+    of each sequence is cached using a key derived from the sequence and the predictor,
+    so that sequences that have been predicted before are not predicted again.
+    The remaining sequences are predicted concurrently
+    (up to `max_concurrent_predictions` at a time).
+
+    Args:
+        records (list): (entry ID, sequence, output file) tuples, as returned by
+            `read_fasta_records`.
+        predictor (str): the predictor backend ('remote', 'local' or 'precomputed').
+        endpoint (str): URL of the local server used by the 'local' predictor.
+        precomputed_dir (str): directory of PDB files used by the 'precomputed' predictor.
+        max_concurrent_predictions (int): maximum number of structures to predict concurrently.
+        cache_dir (str): path to the root cache directory. If None, caching is disabled.
+        cache_ttl_days (float): maximum age of cached structures in days.
+        cache_max_size_gb (float): maximum size of the structure cache in GB.
+    """
+    # note: the precomputed structures are already local, so they are not cached
+    cache = None
+    if predictor != PRECOMPUTED_PREDICTOR:
+        cache = cache_utils.make_result_cache(
+            cache_dir,
+            "esmfold",
+            suffix=".pdb",
+            ttl_days=cache_ttl_days,
+            max_size_gb=cache_max_size_gb,
         )
+
+    # group the entries by sequence, so that each distinct sequence is only predicted once
+    records_by_sequence = {}
+    for record_id, sequence, output_file in records:
+        records_by_sequence.setdefault(sequence, []).append((record_id, output_file))
+
+    pending = []
+    for sequence, sequence_records in records_by_sequence.items():
+        if cache is not None:
+            cache_key = cache.make_key(cache_utils.hash_string(sequence), predictor)
+            cached_filepath = cache.get(cache_key)
+            if cached_filepath is not None:
+                for record_id, output_file in sequence_records:
+                    print(f"Using the cached structure for {record_id}.")
+                    cache.fetch(cache_key, output_file)
+                continue
+        pending.append((sequence, sequence_records))
+
+    print(
+        f"Predicting {len(pending)} structures "
+        f"({len(records_by_sequence) - len(pending)} of {len(records_by_sequence)} distinct "
+        "sequences were cached)."
+    )
+    if not pending:
         return
 
-    # submit a new job via the API
-    result = post_esmfold_apiquery(fasta)
+    predict = make_predictor(predictor, endpoint=endpoint, precomputed_dir=precomputed_dir)
+
+    def predict_sequence(sequence: str, sequence_records: list):
+        record_id = sequence_records[0][0]
+        result = predict(record_id, sequence)
+        if result is None:
+            return
+
+        for _, output_file in sequence_records:
+            _write_pdb(result, output_file)
+
+        if cache is not None:
+            cache.put(
+                cache.make_key(cache_utils.hash_string(sequence), predictor),
+                sequence_records[0][1],
+            )
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrent_predictions, len(pending))) as executor:
+        # note: `list` is used to raise any exceptions from the threads
+        list(executor.map(lambda args: predict_sequence(*args), pending))
+
+
+def esmfold_apiquery(input_file: str, output_file=None):
+    """
+    Takes an input peptide FASTA file with one entry
+    and submits it for folding using the ESMfold API.
+    Creates a PDB file with the resulting output.
+    This is a convenience wrapper around `esmfold_batch` for a single entry.
 
-    if result is not None:
-        with open(output_filepath, "w+") as file:
-            file.write(result)
+    Args:
+        input_file (str): path to input FASTA file
+            (must end with .fa, .fna, or .fasta; not case-sensitive).
+        output_file (str): path to the destination PDB file.
+    """
+    records = read_fasta_records(
+        [input_file], output_files=[output_file] if output_file is not None else None
+    )
+    esmfold_batch(records, max_concurrent_predictions=1)
 
 
 # run this if called from the interpreter
@@ -125,14 +379,22 @@ def main():
     # parse args
     args = parse_args()
 
-    input_file = args.input
-    output_file = args.output
+    records = read_fasta_records(args.input, output_files=args.output, output_dir=args.output_dir)
 
     # Ignore warnings when we make the ESMFold API request
     # We're disabling SSL which `requests` will otherwise warn us about
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", category=InsecureRequestWarning)
-        esmfold_apiquery(input_file, output_file)
+        esmfold_batch(
+            records,
+            predictor=args.predictor,
+            endpoint=args.endpoint,
+            precomputed_dir=args.precomputed_dir,
+            max_concurrent_predictions=args.max_concurrent_predictions,
+            cache_dir=args.cache_dir,
+            cache_ttl_days=args.cache_ttl_days,
+            cache_max_size_gb=args.cache_max_size_gb,
+        )
 
 
 # check if called from interpreter
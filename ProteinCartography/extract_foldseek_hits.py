@@ -1,10 +1,7 @@
 #!/usr/bin/env python
 import argparse
-import os
-import re
 
-import constants
-import pandas as pd
+import foldseek_utils
 
 # only import these functions when using import *
 __all__ = ["extract_foldseekhits"]
@@ -53,45 +50,18 @@ def extract_foldseekhits(
         output_file (str): path of destination file.
     """
 
-    # empty df for collecting results
-    dummy_df = pd.DataFrame()
+    # read all of the results files, keeping only hits to AlphaFold models
+    hits_df = foldseek_utils.read_m8_files(input_files)
 
-    # iterate through results files, reading them
-    for i, file in enumerate(input_files):
-        # load the file
-        file_df = pd.read_csv(file, sep="\t", names=constants.FOLDSEEK_COLUMN_NAMES)
-
-        if os.path.getsize(file) == 0:
-            continue
-
-        # extract the model ID from the results target column
-        file_df["modelid"] = file_df["target"].str.split(" ", expand=True)[0]
-
-        # extract only models that contain AF model string
-        # this will need to be changed in the future
-        file_df = file_df[file_df["modelid"].str.contains("-F1-model_v4")]
-
-        # filter by evalue
-        file_df = file_df[file_df["evalue"] < evalue]
-
-        # get the uniprot ID out from that target
-        file_df["uniprotid"] = file_df["modelid"].apply(
-            lambda x: re.findall("AF-(.*)-F1-model_v4", x)[0]
-        )
-
-        # if it's the first results file, fill the dummy_df
-        if i == 0:
-            dummy_df = file_df
-        # otherwise, add to the df
-        else:
-            dummy_df = pd.concat([dummy_df, file_df], axis=0)
+    # filter by evalue
+    hits_df = hits_df[hits_df["evalue"] < evalue]
 
     # extract unique uniprot IDs
-    if dummy_df.empty:
+    if hits_df.empty:
         print(f"WARNING: No matching foldseek hits found in {input_files}.")
         hits = []
     else:
-        hits = dummy_df["uniprotid"].unique()
+        hits = hits_df["protid"].unique()
 
     # if max_num_hits is provided, truncate the list
     if max_num_hits is not None:
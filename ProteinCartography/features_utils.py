@@ -0,0 +1,239 @@
+import ast
+import os
+
+import numpy as np
+import pandas as pd
+
+# only import these functions when using import *
+__all__ = [
+    "apply_feature_dtypes",
+    "parse_lineage",
+    "read_features",
+    "write_features",
+    "write_features_in_chunks",
+]
+
+# the dtypes of the features columns that are not inferred correctly from the TSV files
+# (the 'Lineage' column is handled separately, because it is list-typed)
+FEATURE_DTYPES = {
+    "Organism": "category",
+    "Annotation": "category",
+    "Length": "Int64",
+}
+
+# the suffix of the typed Parquet file written next to each features TSV file
+PARQUET_SIDECAR_SUFFIX = ".parquet"
+
+# the numeric columns of the features files that are written in chunks
+# (all of the other columns are written to the Parquet file as strings)
+NUMERIC_CHUNK_COLUMNS = {"Annotation": "float64", "Length": "Int64"}
+
+
+def parse_lineage(lineage: pd.Series) -> pd.Series:
+    """
+    Convert a 'Lineage' column to lists of taxa.
+
+    In the TSV files, each lineage is the repr of a Python list (e.g. "['Eukaryota', 'Metazoa']");
+    because there are usually far fewer distinct lineages than proteins, each distinct string
+    is parsed only once (using `ast.literal_eval` rather than `eval`). Values that are already lists
+    (or arrays, as returned by `pd.read_parquet`) are converted to lists, and missing values are
+    left as NaN.
+    """
+    is_string = lineage.map(lambda value: isinstance(value, str))
+    parsed = {value: ast.literal_eval(value) for value in lineage[is_string].unique()}
+
+    def to_list(value):
+        if isinstance(value, str):
+            return parsed[value]
+        if isinstance(value, (list, np.ndarray)):
+            return list(value)
+        return np.nan
+
+    return lineage.map(to_list)
+
+
+def apply_feature_dtypes(df: pd.DataFrame, parse_lineage_column=True) -> pd.DataFrame:
+    """
+    Apply the dtypes in `FEATURE_DTYPES` to the columns of a features dataframe that have them,
+    and (optionally) convert the 'Lineage' column to lists.
+    """
+    dtypes = {column: dtype for column, dtype in FEATURE_DTYPES.items() if column in df.columns}
+    df = df.astype(dtypes)
+
+    if parse_lineage_column and "Lineage" in df.columns:
+        df["Lineage"] = parse_lineage(df["Lineage"])
+
+    return df
+
+
+def _read_parquet_sidecar(sidecar_filepath: str, columns=None):
+    """
+    Read the typed Parquet file (optionally only the given columns that it contains),
+    returning None if it cannot be read
+    (e.g. because pyarrow is not installed or the file is corrupt)
+    """
+    try:
+        if columns is not None:
+            import pyarrow.parquet as pq
+
+            names = pq.read_schema(sidecar_filepath).names
+            columns = [column for column in columns if column in names]
+        return pd.read_parquet(sidecar_filepath, columns=columns)
+    except Exception:
+        return None
+
+
+def _write_parquet_sidecar(df: pd.DataFrame, sidecar_filepath: str):
+    """
+    Write the typed features to a Parquet file next to the TSV file.
+
+    Note: the TSV file is the canonical output, so failures are ignored (for example, because
+    a column has mixed types). The file is written to a temporary path and then moved into place,
+    so that concurrent readers never see a partially-written file.
+    """
+    temp_filepath = f"{sidecar_filepath}.{os.getpid()}.temp"
+    try:
+        df.to_parquet(temp_filepath, index=False)
+        os.replace(temp_filepath, sidecar_filepath)
+    except Exception:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+
+
+def read_features(input_file: str, parse_lineage_column=True, columns=None) -> pd.DataFrame:
+    """
+    Reads a features TSV file (e.g. uniprot_features.tsv or an aggregated features file)
+    with typed columns: the 'Lineage' column is list-typed, 'Organism' and 'Annotation'
+    are categorical, and 'Length' is an integer.
+
+    If the TSV file was written by `write_features`, the typed Parquet file written next to it
+    is read instead (as long as it is not older than the TSV file).
+
+    Args:
+        input_file (str): path to the features TSV file.
+        parse_lineage_column (bool): whether to convert the 'Lineage' column to lists.
+            If False, the lineages are left as strings (as they appear in the TSV file).
+        columns (list): optional names of the columns to read; the other columns
+            (e.g. the sequences) are skipped, and the names that are not in the file are ignored.
+
+    Returns:
+        a pandas.DataFrame of the features.
+    """
+    sidecar_filepath = input_file + PARQUET_SIDECAR_SUFFIX
+    df = None
+    if os.path.exists(sidecar_filepath) and os.path.getmtime(sidecar_filepath) >= os.path.getmtime(
+        input_file
+    ):
+        df = _read_parquet_sidecar(sidecar_filepath, columns=columns)
+
+    if df is None:
+        usecols = None if columns is None else (lambda column: column in columns)
+        df = pd.read_csv(input_file, sep="\t", usecols=usecols)
+    elif not parse_lineage_column and "Lineage" in df.columns:
+        # restore the string representation used in the TSV file
+        df["Lineage"] = parse_lineage(df["Lineage"]).map(
+            lambda value: str(value) if isinstance(value, list) else value
+        )
+        return apply_feature_dtypes(df, parse_lineage_column=False)
+
+    return apply_feature_dtypes(df, parse_lineage_column=parse_lineage_column)
+
+
+def write_features(df: pd.DataFrame, output_file: str):
+    """
+    Writes a features dataframe to a TSV file, and the same features with typed columns
+    to a Parquet file next to it (see `read_features`).
+
+    Args:
+        df (pandas.DataFrame): the features.
+        output_file (str): path to the TSV file.
+    """
+    df.to_csv(output_file, sep="\t", index=None)
+    _write_parquet_sidecar(apply_feature_dtypes(df), output_file + PARQUET_SIDECAR_SUFFIX)
+
+
+def _chunk_schema(columns: list):
+    """
+    The schema of the Parquet file written by `write_features_in_chunks`;
+    it is fixed in advance, because the types inferred from each chunk may differ
+    (e.g. for a column that is empty in one of the chunks)
+    """
+    import pyarrow as pa
+
+    types = {
+        "Annotation": pa.float64(),
+        "Length": pa.int64(),
+        "Lineage": pa.list_(pa.string()),
+    }
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+
+def _typed_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a chunk of string values (as read by `pd.read_csv` with `dtype=str`)
+    to the types in the schema of the Parquet file
+    """
+    chunk = chunk.replace("", None)
+    for column, dtype in NUMERIC_CHUNK_COLUMNS.items():
+        if column in chunk.columns:
+            chunk[column] = pd.to_numeric(chunk[column], errors="coerce").astype(dtype)
+    if "Lineage" in chunk.columns:
+        chunk["Lineage"] = parse_lineage(chunk["Lineage"])
+    return chunk
+
+
+def write_features_in_chunks(chunks, output_file: str):
+    """
+    Writes chunks of a features dataframe to a TSV file (and a typed Parquet file next to it,
+    as in `write_features`) without holding more than one chunk in memory.
+
+    The values of each chunk should be strings (except for the 'Lineage' column, which may be lists)
+    so that they are written to the TSV file exactly as they were read. Both files are written
+    to temporary paths and then moved into place once all of the chunks have been written.
+
+    Args:
+        chunks (iterable): the chunks of the features dataframe, all with the same columns.
+        output_file (str): path to the TSV file.
+    """
+    temp_filepath = f"{output_file}.{os.getpid()}.temp"
+    sidecar_filepath = output_file + PARQUET_SIDECAR_SUFFIX
+    temp_sidecar_filepath = f"{sidecar_filepath}.{os.getpid()}.temp"
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        pq = None
+
+    writer = None
+    for ind, chunk in enumerate(chunks):
+        is_first_chunk = ind == 0
+        chunk.to_csv(
+            temp_filepath,
+            sep="\t",
+            index=None,
+            mode="w" if is_first_chunk else "a",
+            header=is_first_chunk,
+        )
+
+        if pq is None:
+            continue
+        try:
+            if writer is None:
+                schema = _chunk_schema(list(chunk.columns))
+                writer = pq.ParquetWriter(temp_sidecar_filepath, schema)
+            writer.write_table(
+                pa.Table.from_pandas(_typed_chunk(chunk), schema=schema, preserve_index=False)
+            )
+        except Exception:
+            # the TSV file is the canonical output, so the Parquet file is abandoned
+            pq = None
+
+    if writer is not None:
+        writer.close()
+        if pq is not None:
+            os.replace(temp_sidecar_filepath, sidecar_filepath)
+    if os.path.exists(temp_sidecar_filepath):
+        os.remove(temp_sidecar_filepath)
+
+    os.replace(temp_filepath, output_file)
@@ -2,11 +2,21 @@
 import argparse
 import os
 import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlparse
 
+import cache_utils
 import numpy as np
 import pandas as pd
-from api_utils import UniProtWithExpBackoff, session_with_retry
+import pyarrow as pa
+import pyarrow.parquet as pq
+import uniprot_metadata_store
+from api_utils import UniProtWithExpBackoff, get_rate_limiter, session_with_retry
 from constants import UniProtService
+from features_utils import write_features_in_chunks
 from tests import mocks
 
 # if necessary, mock the `uniprot.search` method (used by `query_uniprot`)
@@ -17,6 +27,22 @@ if os.environ.get("PROTEINCARTOGRAPHY_SHOULD_USE_MOCKS") == "true":
 # only import these functions when using import *
 __all__ = ["query_uniprot"]
 
+# the UniProtKB endpoint that returns the entries for a list of accessions
+UNIPROTKB_ACCESSIONS_API = "https://rest.uniprot.org/uniprotkb/accessions"
+
+# the number of accessions per batch (the accessions endpoint accepts at most 1000)
+DEFAULT_BATCH_SIZE = 500
+
+# the maximum number of batches to fetch at once
+# (the rate of requests to UniProt is limited by `api_utils.HOST_RATE_LIMITS`)
+DEFAULT_MAX_CONCURRENT_BATCHES = 4
+
+# the name of the file in which the completed batches are recorded
+MANIFEST_FILENAME = "manifest.tsv"
+
+# the number of entries to transform at once when writing the output file
+TRANSFORM_CHUNK_SIZE = 10_000
+
 # global fields for querying using REST API
 REQUIRED_FIELDS_DICT = {
     "Entry": "accession",
@@ -47,6 +73,11 @@ DEFAULT_FIELDS_DICT = REQUIRED_FIELDS_DICT | OTHER_FIELDS_DICT
 REQUIRED_FIELDS = list(REQUIRED_FIELDS_DICT.values())
 DEFAULT_FIELDS = list(DEFAULT_FIELDS_DICT.values())
 
+# the names of the TSV columns corresponding to the default fields
+# (these are needed to look up the fields in the local metadata store;
+# the columns of any additional fields are recorded in the store, see `_field_columns`)
+DEFAULT_FIELD_COLUMNS = {field: column for column, field in DEFAULT_FIELDS_DICT.items()}
+
 
 # parse command line arguments
 def parse_args():
@@ -59,7 +90,19 @@ def parse_args():
         help="path of destination uniprot_features.tsv file",
     )
     parser.add_argument(
-        "-s", "--service", default=UniProtService.BIOSERVICES.value, help="how to fetch metadata"
+        "-s", "--service", default=UniProtService.REST.value, help="how to fetch metadata"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="number of accessions to fetch per batch (at most 1000).",
+    )
+    parser.add_argument(
+        "--max-concurrent-batches",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_BATCHES,
+        help="maximum number of batches to fetch at once.",
     )
     parser.add_argument(
         "-a",
@@ -67,24 +110,174 @@ def parse_args():
         nargs="*",
         help="additional non-default fields to fetch from uniprot if using REST",
     )
+    # note: this CLI option requires `nargs="?"` because it is passed without a value
+    # by the `fetch_uniprot_metadata` rule when no metadata store is configured
+    parser.add_argument(
+        "--metadata-store",
+        nargs="?",
+        help=(
+            "path to a local store of UniProt metadata built by `uniprot_metadata_store.py`. "
+            "If provided, UniProt is only queried for accessions that are missing or stale."
+        ),
+    )
+    # note: this CLI option requires `nargs="?"` because it is passed without a value
+    # by the `fetch_uniprot_metadata` rule when the sequences are kept in the features file
+    parser.add_argument(
+        "--sequences-output",
+        nargs="?",
+        help=(
+            "path to a FASTA file (or a Parquet file, if the path ends in '.parquet') "
+            "to which to write the sequences instead of including them in the output file."
+        ),
+    )
+    parser.add_argument(
+        "--metadata-max-age-days",
+        type=float,
+        help=(
+            "Maximum age of the entries in the metadata store. If not provided, they never expire."
+        ),
+    )
     args = parser.parse_args()
 
     return args
 
 
+def _read_manifest(manifest_filepath: Path) -> set:
+    """
+    Returns the keys of the batches that have been completely downloaded, according to the manifest
+    """
+    if not manifest_filepath.exists():
+        return set()
+
+    with open(manifest_filepath) as file:
+        keys = {line.split("\t")[0] for line in file if line.strip()}
+
+    # only trust the manifest entries whose part files still exist
+    return {key for key in keys if (manifest_filepath.parent / f"part_{key}.tsv").exists()}
+
+
+def _write_part_file(part_filepath: Path, lines: list):
+    """
+    Write the lines of a TSV file to a temporary path and then move it into place,
+    so that a part file exists only if it was written completely.
+    """
+    temp_part_filepath = part_filepath.with_name(f"{part_filepath.name}.temp")
+    with open(temp_part_filepath, "w") as file:
+        file.writelines(f"{line}\n" for line in lines)
+    os.replace(temp_part_filepath, part_filepath)
+
+
+def _concatenate_part_files(part_filepaths: list, output_filepath: str):
+    """
+    Concatenate the part files into a single TSV file, keeping only the first header
+    """
+    header_written = False
+    with open(output_filepath, "w") as output_file:
+        for part_filepath in part_filepaths:
+            with open(part_filepath) as part_file:
+                header = part_file.readline()
+                if not header:
+                    continue
+                if not header_written:
+                    output_file.write(header)
+                    header_written = True
+                shutil.copyfileobj(part_file, output_file)
+
+
+def _field_columns(fields: list, columns: list) -> dict:
+    """
+    Map the fields requested from UniProt to the columns of the TSV files returned by UniProt,
+    which are in the same order as the requested fields (e.g. 'cc_function' -> 'Function [CC]').
+    Returns an empty dict if the number of columns does not match the number of fields.
+    """
+    if len(fields) != len(columns):
+        return {}
+    return dict(zip(fields, columns))
+
+
+def _lineage_string_splitter(lineage_string: str):
+    if not lineage_string:
+        return np.nan
+    else:
+        return [rank.split(" (")[0] for rank in lineage_string.split(", ")]
+
+
+def _transform_chunks(input_filepath: str):
+    """
+    Read the downloaded entries in chunks of `TRANSFORM_CHUNK_SIZE` entries,
+    adding the 'protid' and 'Lineage' columns to each chunk.
+
+    Note: the values are read as strings, so that they are written to the output file
+    exactly as they were downloaded.
+    """
+    chunks = pd.read_csv(
+        input_filepath,
+        sep="\t",
+        dtype=str,
+        keep_default_na=False,
+        chunksize=TRANSFORM_CHUNK_SIZE,
+    )
+    for chunk in chunks:
+        chunk.insert(0, "protid", chunk["Entry"].values)
+        if "Taxonomic lineage" in chunk.columns:
+            chunk["Lineage"] = chunk["Taxonomic lineage"].map(_lineage_string_splitter)
+        yield chunk
+
+
+def _split_sequences(chunks, sequences_file: str):
+    """
+    Write the 'Sequence' column of each chunk to a FASTA file (or a Parquet file, if the path
+    ends in '.parquet') and yield the chunks without it.
+    """
+    if sequences_file.endswith(".parquet"):
+        schema = pa.schema([("protid", pa.string()), ("Sequence", pa.string())])
+        with pq.ParquetWriter(sequences_file, schema) as writer:
+            for chunk in chunks:
+                sequences_df = chunk.loc[chunk["Sequence"] != "", ["protid", "Sequence"]]
+                writer.write_table(
+                    pa.Table.from_pandas(sequences_df, schema=schema, preserve_index=False)
+                )
+                yield chunk.drop(columns="Sequence")
+    else:
+        with open(sequences_file, "w") as file:
+            for chunk in chunks:
+                file.writelines(
+                    f">{protid}\n{sequence}\n"
+                    for protid, sequence in zip(chunk["protid"], chunk["Sequence"])
+                    if sequence
+                )
+                yield chunk.drop(columns="Sequence")
+
+
 def query_uniprot(
     input_file: str,
     output_file: str,
-    batch_size=300,
-    sub_batch_size=300,
+    batch_size=DEFAULT_BATCH_SIZE,
+    sub_batch_size=DEFAULT_BATCH_SIZE,
     fmt="tsv",
     fields=DEFAULT_FIELDS,
-    service=UniProtService.BIOSERVICES,
+    service=UniProtService.REST,
+    metadata_store=None,
+    metadata_max_age_days=None,
+    max_concurrent_batches=DEFAULT_MAX_CONCURRENT_BATCHES,
+    sequences_file=None,
 ):
     """
     Takes an input list of accessions and gets the full information set from Uniprot
     for those proteins.
 
+    The accessions are split into batches, which are fetched concurrently (with a shared limit
+    on the rate of requests). Each batch is written to its own part file, and is recorded
+    in a manifest once it is complete, so that an interrupted run can be resumed
+    without re-fetching (or re-parsing) the completed batches.
+
+    If a local metadata store is provided, the accessions are first looked up in the store,
+    and UniProt is only queried for the accessions that are missing from the store or are stale.
+    The entries retrieved from UniProt are then added to the store.
+
+    The entries are then transformed and written to the output file in chunks,
+    so that the memory used is bounded even for very large sets of accessions.
+
     Args:
         input_file (str): path to a text file of accessions (with one accession per line)
         output_file (str): path of destination tsv file with all uniprot features
@@ -93,9 +286,14 @@ def query_uniprot(
         fmt (str): output suffix format (default 'tsv')
         fields (list): list of UniProt fields to retrieve.
         service (str): which API to use: 'rest' or 'bioservices'.
-
-    Returns:
-        a pandas.DataFrame of the resulting features
+        metadata_store (str): optional path to a local metadata store (a directory of Parquet files)
+            built by `uniprot_metadata_store.py`; the newly fetched entries are added to it
+            as a new part file.
+        metadata_max_age_days (float): maximum age of the entries in the metadata store.
+        max_concurrent_batches (int): maximum number of batches to fetch at once.
+        sequences_file (str): optional path to a FASTA file (or a Parquet file, if the path ends
+            in '.parquet') to which to write the sequences. If provided, the 'Sequence' column
+            is not included in the output features file.
     """
 
     temp_filepath = output_file + ".temp"
@@ -104,20 +302,20 @@ def query_uniprot(
         print("Output file already exists at this location. Aborting.")
         return
 
-    header_written = False  # Flag to check if header has been written
-
-    # Load any existing results from previous incomplete runs, to remove them from the query list.
-    existing_data = set()
-    if os.path.exists(temp_filepath):
-        existing_df = pd.read_csv(temp_filepath, sep="\t", usecols=["Entry"])
-        existing_data = set(existing_df["Entry"].values)
-        print(f"Loaded {len(existing_data)} entries from {temp_filepath}")
-        header_written = True
+    # The part files and the manifest of completed batches from this (or a previous) run
+    parts_dirpath = Path(output_file + ".parts")
+    parts_dirpath.mkdir(exist_ok=True)
+    manifest_filepath = parts_dirpath / MANIFEST_FILENAME
+    completed_batch_keys = _read_manifest(manifest_filepath)
 
     # Define regular expression pattern to extract the next URL from the response headers
     re_next_link = re.compile(r'<(.+)>; rel="next"')
 
+    # note: the requests made with the shared session are rate-limited by its adapters,
+    # but bioservices uses its own session, so its requests are rate-limited explicitly
+    # (using the same rate limiter, which is throttled by the retries of `UniProtWithExpBackoff`)
     session = session_with_retry()
+    rate_limiter = get_rate_limiter(urlparse(UNIPROTKB_ACCESSIONS_API).hostname)
 
     def get_next_link(headers):
         # Extract the next URL from the "Link" header if present
@@ -128,81 +326,148 @@ def query_uniprot(
 
     fields_string = ",".join(fields)
 
-    def get_batch(query_string: str):
+    def get_batch(accession_batch: list):
         # Generator function to fetch data in batches
         if service == UniProtService.REST:
-            batch_url = f"https://rest.uniprot.org/uniprotkb/search?query={query_string}&format={fmt}&fields={fields_string}&size={sub_batch_size}"
+            batch_url = UNIPROTKB_ACCESSIONS_API
+            params = {
+                "accessions": ",".join(accession_batch),
+                "format": fmt,
+                "fields": fields_string,
+                "size": sub_batch_size,
+            }
             while batch_url:
-                response = session.get(batch_url)
+                response = session.get(batch_url, params=params)
                 response.raise_for_status()
                 yield response.text
                 batch_url = get_next_link(response.headers)
+                # the next link already includes the query parameters
+                params = None
         elif service == UniProtService.BIOSERVICES:
+            # Construct the query string for the batch
+            query_string = " OR ".join(f"accession:{accession}" for accession in accession_batch)
+            query_string = f"({query_string})"
+
             uniprot = UniProtWithExpBackoff()
-            results = uniprot.search(
-                query_string, columns=fields_string, size=sub_batch_size, progress=False
-            )
+            with rate_limiter:
+                results = uniprot.search(
+                    query_string, columns=fields_string, size=sub_batch_size, progress=False
+                )
             # bioservices doesn't directly return the number of results.
             yield results
         else:
             raise ValueError(f"Unknown service {service}")
 
-    with open(input_file) as q:
-        query_accessions = [line.rstrip("\n") for line in q.readlines()]
-        # Remove accessions that have already been downloaded, keeping the order.
-        query_accessions = [e for e in query_accessions if e not in existing_data]
+    manifest_lock = threading.Lock()
+
+    def fetch_batch(batch_key: str, accession_batch: list):
+        lines = []
+        for batch in get_batch(accession_batch):
+            batch_lines = batch.splitlines()
+            if not batch_lines:
+                continue
+            if not lines:
+                lines.append(batch_lines[0])
+            lines.extend(batch_lines[1:])
 
-    # Split the query accessions into batches
+        _write_part_file(parts_dirpath / f"part_{batch_key}.tsv", lines)
+        with manifest_lock, open(manifest_filepath, "a") as manifest_file:
+            manifest_file.write(f"{batch_key}\t{max(len(lines) - 1, 0)}\n")
+        return max(len(lines) - 1, 0)
+
+    with open(input_file) as q:
+        # Remove duplicate accessions, keeping the order.
+        query_accessions = list(dict.fromkeys(line.rstrip("\n") for line in q.readlines()))
+
+    part_filepaths = []
+
+    # Use the local metadata store for any accessions it includes that are not stale.
+    if metadata_store:
+        # note: the TSV columns of additional fields are only known once they have been
+        # fetched from UniProt and added to the store (see `_field_columns`)
+        field_columns = (
+            uniprot_metadata_store.read_field_columns(metadata_store) | DEFAULT_FIELD_COLUMNS
+        )
+        columns = [field_columns.get(field, field) for field in fields]
+        stored_df = uniprot_metadata_store.lookup_metadata_store(
+            metadata_store, query_accessions, columns, max_age_days=metadata_max_age_days
+        )
+        if len(stored_df):
+            stored_filepath = parts_dirpath / "metadata_store.tsv"
+            stored_df.to_csv(stored_filepath, sep="\t", index=False)
+            part_filepaths.append(stored_filepath)
+
+        stored_accessions = set(stored_df["Entry"])
+        query_accessions = [e for e in query_accessions if e not in stored_accessions]
+        print(
+            f"Loaded {len(stored_accessions)} entries from the metadata store; "
+            f"{len(query_accessions)} will be fetched from UniProt."
+        )
+
+    # Split the query accessions into batches, each of which is identified by the hash
+    # of its accessions (so that the batches completed by a previous run can be recognized)
     accession_batches = [
         query_accessions[i : i + batch_size] for i in range(0, len(query_accessions), batch_size)
     ]
+    batch_keys = [cache_utils.hash_string(",".join(batch)) for batch in accession_batches]
+    fetched_part_filepaths = [parts_dirpath / f"part_{key}.tsv" for key in batch_keys]
+    part_filepaths.extend(fetched_part_filepaths)
+
+    pending_batches = [
+        (batch_key, accession_batch)
+        for batch_key, accession_batch in zip(batch_keys, accession_batches)
+        if batch_key not in completed_batch_keys
+    ]
+    print(
+        f"{len(accession_batches) - len(pending_batches)} of {len(accession_batches)} batches "
+        "were downloaded by a previous run."
+    )
 
-    total = len(query_accessions)
-    # Process each batch separately
-    for i, accession_batch in enumerate(accession_batches):
-        print(f">> Starting batch {i + 1} of {len(accession_batches)}")
-
-        # Construct the query string for the batch
-        query_string = " OR ".join(f"accession:{accession}" for accession in accession_batch)
-        query_string = f"({query_string})"
-
-        # Construct the URL with the constructed query string
-        progress = 0
-
-        with open(temp_filepath, "a") as temp_file:
-            for batch in get_batch(query_string):
-                lines = batch.splitlines()
-
-                if not header_written:
-                    print_lines = lines
-                    header_written = True
-                else:
-                    print_lines = lines[1:]
-
-                for line in print_lines:
-                    print(line, file=temp_file)
-
-                progress += len(lines) - 1
-                print(f"downloaded {progress} / {total} hits for batch {i + 1}")
-
-    df = pd.read_csv(temp_filepath, sep="\t")
-    df.insert(0, "protid", df["Entry"].values)
-
-    def lineage_string_splitter(lineage_string):
-        if lineage_string is np.nan:
-            return np.nan
-        else:
-            return [rank.split(" (")[0] for rank in lineage_string.split(", ")]
-
-    try:
-        df["Lineage"] = df["Taxonomic lineage"].apply(lineage_string_splitter)
-    except Exception:
-        pass
+    if pending_batches:
+        with ThreadPoolExecutor(
+            max_workers=min(max_concurrent_batches, len(pending_batches))
+        ) as executor:
+            futures = [executor.submit(fetch_batch, *batch) for batch in pending_batches]
+            for i, future in enumerate(as_completed(futures)):
+                num_entries = future.result()
+                print(
+                    f">> Downloaded {num_entries} entries "
+                    f"(batch {i + 1} of {len(pending_batches)})"
+                )
+
+    _concatenate_part_files(part_filepaths, temp_filepath)
+
+    # Add the newly fetched entries to the local metadata store (as a new part file,
+    # so that the existing entries are not rewritten).
+    if metadata_store and fetched_part_filepaths:
+        # note: the entries are read in chunks, so that the memory used is bounded
+        fetched_filepath = temp_filepath + ".fetched"
+        _concatenate_part_files(fetched_part_filepaths, fetched_filepath)
+        with open(fetched_filepath) as file:
+            fetched_columns = file.readline().rstrip("\n").split("\t")
+        if os.path.getsize(fetched_filepath):
+            with pd.read_csv(
+                fetched_filepath,
+                sep="\t",
+                dtype="string",
+                keep_default_na=False,
+                chunksize=TRANSFORM_CHUNK_SIZE,
+            ) as fetched_chunks:
+                uniprot_metadata_store.update_metadata_store(
+                    metadata_store,
+                    fetched_chunks,
+                    field_columns=_field_columns(fields, fetched_columns),
+                )
+        os.remove(fetched_filepath)
+
+    # Transform the entries one chunk at a time.
+    chunks = _transform_chunks(temp_filepath)
+    if sequences_file:
+        chunks = _split_sequences(chunks, sequences_file)
+    write_features_in_chunks(chunks, output_file)
 
-    df.to_csv(output_file, sep="\t", index=None)
     os.remove(temp_filepath)
-
-    return df
+    shutil.rmtree(parts_dirpath)
 
 
 # run this if called from the interpreter
@@ -218,7 +483,17 @@ def main():
     if additional_fields is not None:
         fields += additional_fields
 
-    query_uniprot(input_file, output_file, fields=fields, service=service)
+    query_uniprot(
+        input_file,
+        output_file,
+        fields=fields,
+        service=service,
+        metadata_store=args.metadata_store,
+        metadata_max_age_days=args.metadata_max_age_days,
+        batch_size=args.batch_size,
+        max_concurrent_batches=args.max_concurrent_batches,
+        sequences_file=args.sequences_output,
+    )
 
 
 # check if called from interpreter
@@ -1,7 +1,14 @@
 #!/usr/bin/env python
 import argparse
 
-import pandas as pd
+from features_utils import read_features
+from hit_funnel import (
+    filter_columns,
+    filter_features,
+    order_by_hits,
+    read_id_list,
+    write_id_list,
+)
 
 __all__ = ["filter_results"]
 
@@ -35,6 +42,35 @@ def parse_args():
         nargs="*",
         help="a list of protids to exclude from the results",
     )
+    parser.add_argument(
+        "--reviewed-only",
+        action="store_true",
+        help="only keep reviewed (Swiss-Prot) proteins",
+    )
+    parser.add_argument(
+        "--min-annotation-score",
+        default="0",
+        help="minimum UniProt annotation score of proteins to keep",
+    )
+    parser.add_argument(
+        "--include-taxa",
+        nargs="*",
+        help="only keep the proteins with one of these taxa in their lineage (or organism)",
+    )
+    parser.add_argument(
+        "--exclude-taxa",
+        nargs="*",
+        help="remove the proteins with one of these taxa in their lineage (or organism)",
+    )
+    parser.add_argument(
+        "--hits",
+        help="path of the aggregated hits list, in the order of which the hits are written",
+    )
+    parser.add_argument(
+        "--max-structures",
+        type=int,
+        help="maximum number of hits to keep. If not provided, all hits are kept.",
+    )
     args = parser.parse_args()
 
     return args
@@ -48,10 +84,17 @@ def filter_results(
     min_length=0,
     max_length=0,
     excluded_protids=None,
+    hits_file=None,
+    max_structures=None,
+    reviewed_only=False,
+    min_annotation_score=0,
+    include_taxa=None,
+    exclude_taxa=None,
 ):
     """
     Takes an input uniprot_features.tsv file and filters the results based on fragment status,
-    inactive status, and size.
+    inactive status, size, review status, annotation score and taxonomy
+    (see `hit_funnel.filter_features`). Only the columns needed by the filters are read.
 
     Args:
         input_file (str): path of input tsv file with all uniprot features
@@ -60,37 +103,38 @@ def filter_results(
         filter_fragment (bool): whether to remove fragmentary proteins
         min_length (int): minimum length of proteins to keep
         max_length (int): maximum length of proteins to keep
+        excluded_protids (list): protids to exclude from the results
+        hits_file (str): optional path of the aggregated hits list; if provided,
+            the filtered hits are written in the order of this list
+        max_structures (int): maximum number of hits to keep. If None, keeps all of the hits.
+        reviewed_only (bool): whether to remove unreviewed (TrEMBL) proteins
+        min_annotation_score (float): minimum UniProt annotation score of proteins to keep
+        include_taxa (list): if provided, only keeps the proteins with one of these taxa
+            in their lineage (or as their organism)
+        exclude_taxa (list): taxa whose proteins are removed
 
     Returns:
-        a pandas.DataFrame of the resulting features
+        a pandas.DataFrame of the resulting features (only the columns used by the filters)
     """
+    filters = dict(
+        filter_inactive=filter_inactive,
+        filter_fragment=filter_fragment,
+        min_length=min_length,
+        max_length=max_length,
+        excluded_protids=excluded_protids,
+        reviewed_only=reviewed_only,
+        min_annotation_score=min_annotation_score,
+        include_taxa=include_taxa,
+        exclude_taxa=exclude_taxa,
+    )
 
-    df = pd.read_csv(input_file, sep="\t")
-
-    filtered_df = df.copy(deep=True)
-
-    if filter_inactive:
-        filtered_df = filtered_df[
-            (filtered_df["Protein names"] != "deleted") & ~filtered_df["Annotation"].isna()
-        ]
-    if filter_fragment:
-        filtered_df = filtered_df[filtered_df["Fragment"] != "fragment"]
-
-    if min_length > max_length and max_length != 0:
-        raise ValueError("Minimum length must be less than maximum length.")
-
-    if min_length > 0:
-        filtered_df = filtered_df[filtered_df["Length"].astype(int) > min_length]
-    if max_length > 0:
-        filtered_df = filtered_df[filtered_df["Length"].astype(int) < max_length]
-
-    if excluded_protids is None:
-        excluded_protids = []
-
-    filtered_df = filtered_df[~filtered_df["protid"].isin(excluded_protids)]
+    df = read_features(input_file, parse_lineage_column=False, columns=filter_columns(**filters))
+    filtered_df = filter_features(df, **filters)
+    if hits_file:
+        filtered_df = order_by_hits(filtered_df, list(read_id_list(hits_file)))
 
-    with open(output_file, "w+") as f:
-        f.writelines([protid + "\n" for protid in filtered_df["protid"]])
+    filtered_df = filtered_df.iloc[:max_structures]
+    write_id_list(filtered_df["protid"], output_file)
 
     return filtered_df
 
@@ -109,6 +153,10 @@ def main():
         max_length = int(args.max_length)
     except (TypeError, ValueError):
         max_length = 0
+    try:
+        min_annotation_score = float(args.min_annotation_score)
+    except (TypeError, ValueError):
+        min_annotation_score = 0
 
     filter_results(
         input_file,
@@ -116,6 +164,12 @@ def main():
         min_length=min_length,
         max_length=max_length,
         excluded_protids=excluded_protids,
+        hits_file=args.hits,
+        max_structures=args.max_structures,
+        reviewed_only=args.reviewed_only,
+        min_annotation_score=min_annotation_score,
+        include_taxa=args.include_taxa,
+        exclude_taxa=args.exclude_taxa,
     )
 
 
@@ -1,10 +1,15 @@
 #!/usr/bin/env python
 import argparse
+import asyncio
 import os
+import subprocess
 import sys
-from time import sleep
+import tarfile
+import tempfile
+import time
 
-from api_utils import session_with_retry
+import cache_utils
+from api_utils import DOWNLOAD_CHUNK_SIZE, poll_with_backoff_async, session_with_retry
 
 ### NOTES
 # FoldSeek API example from website:
@@ -16,7 +21,16 @@ https://search.foldseek.com/api/ticket
 """
 
 # only import these functions when using import *
-__all__ = ["foldseek_apiquery"]
+__all__ = [
+    "submit_ticket",
+    "get_ticket_status",
+    "wait_for_ticket",
+    "download_results",
+    "write_phase_timings",
+    "foldseek_apiquery",
+    "foldseek_apiquery_batch",
+    "foldseek_local_search",
+]
 
 # Possible align mode options from API
 SET_MODES = ["3diaa", "tmalign"]
@@ -34,19 +48,73 @@ DEFAULT_DATABASES = ["afdb50", "afdb-swissprot", "afdb-proteome"]
 FOLDSEEK_SERVER_TIMEOUT = 60 * 30  # 30 minutes
 PUBLIC_FOLDSEEK_SERVER = "https://search.foldseek.com"
 
+# polling intervals (in seconds); the interval doubles after each poll up to the maximum
+INITIAL_POLL_INTERVAL = 1
+MAX_POLL_INTERVAL = 5
+PUBLIC_SERVER_MAX_POLL_INTERVAL = 30
+
+# the default maximum number of searches to have in flight at once in batch mode
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# the backends that can be used to run the searches
+WEB_BACKEND = "web"
+LOCAL_BACKEND = "local"
+
+# the columns written by `foldseek easy-search` for the local backend;
+# together with `LOCAL_TAXONOMY_FIELDS`, these correspond to `constants.FOLDSEEK_COLUMN_NAMES`,
+# i.e. to the columns of the .m8 files returned by the web API
+# (note: 'pident' is used because the web API reports the percent identity in its 'fident' column)
+LOCAL_FORMAT_OUTPUT = [
+    "query",
+    "target",
+    "pident",
+    "alnlen",
+    "mismatch",
+    "gapopen",
+    "qstart",
+    "qend",
+    "tstart",
+    "tend",
+    "prob",
+    "evalue",
+    "bits",
+    "qcov",
+    "tcov",
+    "qaln",
+    "taln",
+    "tca",
+    "tseq",
+]
+
+# the taxonomy columns, which `foldseek easy-search` can only write for databases with taxonomy
+# (i.e. with a '{db}_taxonomy' file), and the placeholders used for databases without taxonomy
+LOCAL_TAXONOMY_FIELDS = {"taxid": "0", "taxname": "N/A"}
+
+# the `foldseek easy-search` alignment type corresponding to each mode
+LOCAL_ALIGNMENT_TYPES = {"3diaa": "2", "tmalign": "1"}
+DEFAULT_LOCAL_THREADS = 8
+
 
 # parse command line arguments
 def parse_args():
     # Set command line arguments
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "-i", "--input", required=True, help='Name of input file. Must end in ".pdb"'
+        "-i",
+        "--input",
+        nargs="+",
+        required=True,
+        help='Name of input file(s). Must end in ".pdb"',
     )
     parser.add_argument(
         "-o",
         "--output",
+        nargs="+",
         required=True,
-        help='Name of output file. Expects a ".tar.gz" suffix and will append if missing.',
+        help=(
+            "Name of output file(s), one per input file. "
+            'Expects a ".tar.gz" suffix and will append if missing.'
+        ),
     )
     parser.add_argument(
         "-m",
@@ -64,40 +132,195 @@ def parse_args():
     parser.add_argument(
         "-s", "--server", help="The Foldseek server to use.", default=PUBLIC_FOLDSEEK_SERVER
     )
+    # note: this CLI option requires `nargs="?"` because it is passed without a value
+    # by the `run_foldseek` rule when caching is disabled
+    parser.add_argument(
+        "--cache-dir",
+        nargs="?",
+        help="Directory in which to cache the results. If not provided, caching is disabled.",
+    )
+    parser.add_argument(
+        "--cache-ttl-days",
+        type=float,
+        help="Maximum age of cached results in days. If not provided, results never expire.",
+    )
+    parser.add_argument(
+        "--cache-max-size-gb",
+        type=float,
+        help="Maximum size of the results cache in GB. If not provided, the size is unbounded.",
+    )
+    parser.add_argument(
+        "--timings-file",
+        nargs="+",
+        help=(
+            "Path(s) to TSV files, one per input file, "
+            "in which to record the duration of each phase of the search."
+        ),
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        default=WEB_BACKEND,
+        choices=[WEB_BACKEND, LOCAL_BACKEND],
+        help=(
+            f"'{WEB_BACKEND}' to query the Foldseek server, "
+            f"or '{LOCAL_BACKEND}' to run `foldseek easy-search` against local databases."
+        ),
+    )
+    parser.add_argument(
+        "--local-database",
+        nargs="*",
+        default=[],
+        help=(
+            "Paths to the local Foldseek databases to search with the local backend, "
+            "in the form 'name=path' (e.g. 'afdb50=/data/foldseek/afdb50')."
+        ),
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        type=int,
+        default=DEFAULT_LOCAL_THREADS,
+        help="Number of threads to use with the local backend.",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT,
+        help="Maximum number of searches to run concurrently when multiple inputs are provided.",
+    )
     args = parser.parse_args()
     return args
 
 
-def foldseek_apiquery(input_file: str, output_file: str, mode: str, database: list, server: str):
+def submit_ticket(session, server: str, pdb: str, query_databases: list, mode: str, auth=None):
     """
-    Queries the Foldseek web API with a PDB file and retrieves the results.
+    Submits a search to the Foldseek API, exiting if the ticket could not be created.
 
     Args:
-        input_file (str): path to the query PDB file.
-        output_file (str): path to a compressed '.tar.gz' results file.
-            If suffix is missing, adds it.
+        session (requests.Session): the session to use for the request.
+        server (str): the URL of the Foldseek server.
+        pdb (str): the contents of the query PDB file.
+        query_databases (list): list of databases to search.
         mode (str): whether to run in '3diaa' or 'tmalign' mode.
-        database (list): list of run databases.
-            Valid databases include 'afdb50', 'afdb-swissprot', 'afdb-proteome', 'mgnify_esm30',
-            'pdb100', and 'gmgcl_id'.
+        auth (tuple): optional (username, password) for the server.
+
+    Returns:
+        the ticket returned by the API, as a dict with 'id' and 'status' keys.
     """
-    # Check to make sure input file has '.pdb' suffix
-    if ".pdb" not in input_file:
-        sys.exit("Input expects a .pdb file.")
+    response = session.post(
+        f"{server}/api/ticket",
+        {"q": pdb, "database[]": query_databases, "mode": mode},
+        auth=auth,
+    )
 
-    # Makes sure that the input file exists
-    if not os.path.exists(input_file):
-        sys.exit(f"File {input_file} not found.")
+    if response.status_code == 401:
+        sys.exit(
+            "This server requires authentication. "
+            "Please define a password in the environment variable FOLDSEEK_PASSWORD."
+        )
+    elif response.status_code != 200:
+        sys.exit(f"Error {response.status_code} searching Foldseek: {response.reason}")
 
-    # Append '.tar.gz' to file if it's not included
-    if not output_file.endswith(".tar.gz"):
-        output_file = output_file + ".tar.gz"
+    ticket = response.json()
+
+    # check to see if the ticket failed to be posted
+    # tickets can fail to be posted because of ratelimits
+    if "id" not in ticket.keys():
+        if "status" in ticket.keys() and "reason" in ticket.keys():
+            print("===============")
+            print(ticket["status"])
+            print(ticket["reason"])
+            print("===============")
+        sys.exit("Foldseek may be rate-limiting your requests. Try again later.")
+
+    return ticket
+
+
+def get_ticket_status(session, server: str, ticket_id: str, auth=None) -> dict:
+    """
+    Gets the current status of a Foldseek ticket, exiting if the ticket failed.
+    """
+    status = session.get(f"{server}/api/ticket/{ticket_id}", auth=auth).json()
+    if status["status"] == "ERROR":
+        # handle error
+        sys.exit("The ticket returned with status ERROR.")
+    return status
+
+
+async def wait_for_ticket(
+    session, server: str, ticket: dict, auth=None, max_interval=MAX_POLL_INTERVAL
+):
+    """
+    Polls a Foldseek ticket with exponential backoff until it is complete.
+    Returns immediately if the ticket is already complete.
+
+    Note: the blocking status requests are run in a worker thread,
+    so that many tickets can be polled concurrently from the same event loop.
+
+    Returns:
+        a tuple of the final status and the number of seconds
+        before the ticket was first observed to have left the 'PENDING' state.
+    """
+    start_time = time.monotonic()
+    queue_time = None
+
+    async def get_status():
+        nonlocal queue_time
+        status = await asyncio.to_thread(get_ticket_status, session, server, ticket["id"], auth)
+        if queue_time is None and status["status"] != "PENDING":
+            queue_time = time.monotonic() - start_time
+        return status
+
+    if ticket.get("status") == "COMPLETE":
+        status = ticket
+    else:
+        try:
+            status = await poll_with_backoff_async(
+                get_status,
+                is_done=lambda status: status["status"] == "COMPLETE",
+                initial_interval=INITIAL_POLL_INTERVAL,
+                max_interval=max_interval,
+                timeout=FOLDSEEK_SERVER_TIMEOUT,
+            )
+        except TimeoutError as error:
+            sys.exit(f"The ticket failed to complete: {error}")
+
+    return status, queue_time or 0
+
+
+def download_results(session, server: str, ticket_id: str, output_file: str, auth=None):
+    """
+    Streams the results archive for a completed Foldseek ticket to `output_file`.
+    """
+    download = session.get(
+        f"{server}/api/result/download/{ticket_id}",
+        stream=True,
+        auth=auth,
+    )
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, "wb") as fd:
+        for chunk in download.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            fd.write(chunk)
 
-    # Checks for correct mode input
-    if mode not in SET_MODES:
-        sys.exit(f"Mode {mode} is not available. Accepted modes are {SET_MODES}.")
 
-    ### Parse databases
+def write_phase_timings(timings: dict, timings_file: str):
+    """
+    Writes the duration in seconds of each phase of a Foldseek search to a TSV file.
+    """
+    with open(timings_file, "w") as file:
+        file.write("phase\tseconds\n")
+        for phase, seconds in timings.items():
+            file.write(f"{phase}\t{seconds:.3f}\n")
+
+
+def parse_databases(database: list) -> list:
+    """
+    Returns the list of valid databases to query, exiting if there are none.
+
+    Args:
+        database (list): 'all' or a list of databases; invalid databases are ignored.
+    """
     # Collector for user input databases
     query_databases = []
 
@@ -119,13 +342,171 @@ def foldseek_apiquery(input_file: str, output_file: str, mode: str, database: li
     if len(query_databases) == 0:
         sys.exit(f"No valid databases provided. Valid databases include {SET_DATABASES}.")
 
-    # Collector for PDB information for requests.post()
-    pdb = ""
+    return query_databases
+
+
+def check_query_files(input_file: str, output_file: str) -> str:
+    """
+    Checks that the input file is an existing PDB file.
+
+    Returns:
+        the path to the output file, with the '.tar.gz' suffix appended if it was missing.
+    """
+    # Check to make sure input file has '.pdb' suffix
+    if ".pdb" not in input_file:
+        sys.exit("Input expects a .pdb file.")
+
+    # Makes sure that the input file exists
+    if not os.path.exists(input_file):
+        sys.exit(f"File {input_file} not found.")
+
+    # Append '.tar.gz' to file if it's not included
+    if not output_file.endswith(".tar.gz"):
+        output_file = output_file + ".tar.gz"
+
+    return output_file
+
+
+async def _search(
+    session,
+    semaphore: asyncio.Semaphore,
+    input_file: str,
+    output_file: str,
+    query_databases: list,
+    mode: str,
+    server: str,
+    auth=None,
+    timings_file=None,
+    cache=None,
+    cache_key=None,
+):
+    """
+    Runs a single Foldseek search: submits the ticket, polls until it is complete,
+    and downloads the results. At most one search per unit of `semaphore` is in flight at once.
 
+    If a cache is provided, the results are added to it as soon as they are downloaded,
+    so that they are kept even if another search in the same batch fails.
+    """
     # Open input file and collect text as string
     with open(input_file) as file:
-        text = file.readlines()
-        pdb = "".join(text)
+        pdb = file.read()
+
+    # note: the public server is polled less often, to avoid being rate-limited
+    max_interval = (
+        PUBLIC_SERVER_MAX_POLL_INTERVAL if server == PUBLIC_FOLDSEEK_SERVER else MAX_POLL_INTERVAL
+    )
+
+    async with semaphore:
+        timings = {}
+
+        ### Code below is mostly based on:
+        ### <https://github.com/soedinglab/MMseqs2-App/blob/master/docs/api_example.py>
+        # submit a new job via the API
+        start_time = time.monotonic()
+        ticket = await asyncio.to_thread(
+            submit_ticket, session, server, pdb, query_databases, mode, auth
+        )
+        timings["submit"] = time.monotonic() - start_time
+
+        # poll until the job was successful or failed
+        start_time = time.monotonic()
+        _, queue_time = await wait_for_ticket(
+            session, server, ticket, auth, max_interval=max_interval
+        )
+        timings["queue"] = queue_time
+        timings["run"] = time.monotonic() - start_time - queue_time
+
+        # download blast compatible result archive
+        start_time = time.monotonic()
+        await asyncio.to_thread(download_results, session, server, ticket["id"], output_file, auth)
+        timings["download"] = time.monotonic() - start_time
+
+    print(f"Downloaded Foldseek results for {input_file}.")
+    if cache is not None:
+        cache.put(cache_key, output_file)
+    if timings_file is not None:
+        write_phase_timings(timings, timings_file)
+
+
+async def _search_all(searches: list, max_in_flight: int):
+    """
+    Runs the given searches concurrently from a single event loop,
+    using one shared session and at most `max_in_flight` searches in flight at once.
+
+    Args:
+        searches (list): list of dicts of keyword arguments to `_search`.
+        max_in_flight (int): maximum number of searches to run concurrently.
+    """
+    session = session_with_retry()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    await asyncio.gather(
+        *[_search(session=session, semaphore=semaphore, **search) for search in searches]
+    )
+
+
+def foldseek_apiquery_batch(
+    input_files: list,
+    output_files: list,
+    mode: str,
+    database: list,
+    server: str,
+    max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+    cache_dir=None,
+    cache_ttl_days=None,
+    cache_max_size_gb=None,
+    timings_files=None,
+):
+    """
+    Queries the Foldseek web API with a batch of PDB files and retrieves the results.
+    The searches are submitted concurrently, up to `max_in_flight` searches at a time,
+    and the results for each search are downloaded as soon as that search is complete.
+
+    If a cache directory is provided, the results archive for each search is cached using a key
+    derived from the contents of the PDB file, the databases, the mode and the server,
+    so that repeated searches return the cached archive immediately.
+
+    Args:
+        input_files (list): paths to the query PDB files.
+        output_files (list): paths to the compressed '.tar.gz' results files,
+            one per input file. If the suffix is missing, adds it.
+        mode (str): whether to run in '3diaa' or 'tmalign' mode.
+        database (list): list of run databases.
+            Valid databases include 'afdb50', 'afdb-swissprot', 'afdb-proteome', 'mgnify_esm30',
+            'pdb100', and 'gmgcl_id'.
+        server (str): the URL of the Foldseek server.
+        max_in_flight (int): maximum number of searches to run concurrently.
+        cache_dir (str): path to the root cache directory. If None, caching is disabled.
+        cache_ttl_days (float): maximum age of cached results in days.
+        cache_max_size_gb (float): maximum size of the results cache in GB.
+        timings_files (list): optional paths to TSV files, one per input file, in which to record
+            the duration of each phase of the search (submit, queue, run and download).
+    """
+    if len(input_files) != len(output_files):
+        sys.exit("The number of output files must match the number of input files.")
+
+    if timings_files is None:
+        timings_files = [None] * len(input_files)
+    elif len(timings_files) != len(input_files):
+        sys.exit("The number of timings files must match the number of input files.")
+
+    output_files = [
+        check_query_files(input_file, output_file)
+        for input_file, output_file in zip(input_files, output_files)
+    ]
+
+    # Checks for correct mode input
+    if mode not in SET_MODES:
+        sys.exit(f"Mode {mode} is not available. Accepted modes are {SET_MODES}.")
+
+    query_databases = parse_databases(database)
+
+    cache = cache_utils.make_result_cache(
+        cache_dir,
+        "foldseek",
+        suffix=".tar.gz",
+        ttl_days=cache_ttl_days,
+        max_size_gb=cache_max_size_gb,
+    )
 
     username = os.environ.get("FOLDSEEK_USERNAME", "")
     auth = (
@@ -134,70 +515,183 @@ def foldseek_apiquery(input_file: str, output_file: str, mode: str, database: li
         else None
     )
 
-    ### Code below is mostly based on:
-    ### <https://github.com/soedinglab/MMseqs2-App/blob/master/docs/api_example.py>
-    # submit a new job via the API
-    response = session_with_retry().post(
-        f"{server}/api/ticket",
-        {"q": pdb, "database[]": query_databases, "mode": mode},
-        auth=auth,
-    )
-
-    if response.status_code == 401:
-        sys.exit(
-            "This server requires authentication. "
-            "Please define a password in the environment variable FOLDSEEK_PASSWORD."
+    searches = []
+    for input_file, output_file, timings_file in zip(input_files, output_files, timings_files):
+        # Use the cached results if this exact search has been run before
+        if cache is not None:
+            cache_key = cache.make_key(
+                cache_utils.hash_file(input_file), sorted(query_databases), mode, server
+            )
+            if cache.fetch(cache_key, output_file):
+                print(f"Using cached Foldseek results for {input_file}.")
+                continue
+        else:
+            cache_key = None
+
+        searches.append(
+            dict(
+                input_file=input_file,
+                output_file=output_file,
+                query_databases=query_databases,
+                mode=mode,
+                server=server,
+                auth=auth,
+                timings_file=timings_file,
+                cache=cache,
+                cache_key=cache_key,
+            )
         )
-    elif response.status_code != 200:
-        sys.exit(f"Error {response.status_code} searching Foldseek: {response.reason}")
 
-    ticket = response.json()
+    if searches:
+        asyncio.run(_search_all(searches, max_in_flight=max_in_flight))
 
-    # check to see if the ticket failed to be posted
-    # tickets can fail to be posted because of ratelimits
-    if "id" not in ticket.keys():
-        if "status" in ticket.keys() and "reason" in ticket.keys():
-            print("===============")
-            print(ticket["status"])
-            print(ticket["reason"])
-            print("===============")
-        sys.exit("Foldseek may be rate-limiting your requests. Try again later.")
 
-    # poll until the job was successful or failed
-    repeat = True
-    elapsed = 0
-    sleep_time = 30 if server == PUBLIC_FOLDSEEK_SERVER else 5
-    while repeat and elapsed < FOLDSEEK_SERVER_TIMEOUT:
-        status = (
-            session_with_retry()
-            .get(
-                f"{server}/api/ticket/{ticket['id']}",
-                auth=auth,
-            )
-            .json()
-        )
-        if status["status"] == "ERROR":
-            # handle error
-            sys.exit("The ticket returned with status ERROR.")
+def _append_taxonomy_placeholders(m8_filepath: str):
+    """
+    Appends the `LOCAL_TAXONOMY_FIELDS` placeholders to each row of an .m8 file
+    written for a database without taxonomy, so that it has the same columns as the others.
+    """
+    placeholders = "\t".join(LOCAL_TAXONOMY_FIELDS.values())
+    temp_filepath = f"{m8_filepath}.temp"
+    with open(m8_filepath) as m8_file, open(temp_filepath, "w") as temp_file:
+        for line in m8_file:
+            line = line.rstrip("\n")
+            temp_file.write(f"{line}\t{placeholders}\n")
+    os.replace(temp_filepath, m8_filepath)
+
+
+def foldseek_local_search(
+    input_files: list,
+    output_files: list,
+    mode: str,
+    database_paths: dict,
+    threads=DEFAULT_LOCAL_THREADS,
+):
+    """
+    Searches local Foldseek databases with `foldseek easy-search`, as an alternative to the web API.
+    For each query, the results for each database are written to an 'alis_{db}.m8' file
+    and packaged into a '.tar.gz' archive, exactly like the archives returned by the web API,
+    so that the downstream rules are the same for both backends.
+    The taxonomy columns are only requested for databases with taxonomy;
+    for the other databases, they are filled with the `LOCAL_TAXONOMY_FIELDS` placeholders.
 
-        # wait a short time between poll requests
-        sleep(sleep_time)
-        elapsed += sleep_time
-        repeat = status["status"] != "COMPLETE"
+    Args:
+        input_files (list): paths to the query PDB files.
+        output_files (list): paths to the compressed '.tar.gz' results files,
+            one per input file. If the suffix is missing, adds it.
+        mode (str): whether to run in '3diaa' or 'tmalign' mode.
+        database_paths (dict): mapping from database names (used to name the .m8 files)
+            to the paths of the corresponding local Foldseek databases.
+        threads (int): number of threads used by `foldseek easy-search`.
+    """
+    if len(input_files) != len(output_files):
+        sys.exit("The number of output files must match the number of input files.")
 
-    if elapsed > FOLDSEEK_SERVER_TIMEOUT:
-        sys.exit(f"The ticket failed to complete after {elapsed} seconds.")
+    if mode not in LOCAL_ALIGNMENT_TYPES:
+        sys.exit(f"Mode {mode} is not available. Accepted modes are {SET_MODES}.")
 
-    # download blast compatible result archive
-    download = session_with_retry().get(
-        f"{server}/api/result/download/{ticket['id']}",
-        stream=True,
-        auth=auth,
+    if not database_paths:
+        sys.exit("No local Foldseek databases were provided.")
+
+    # a foldseek database is a set of files sharing a common prefix;
+    # the '.dbtype' file is always present
+    for db, database_path in database_paths.items():
+        if not os.path.exists(f"{database_path}.dbtype"):
+            sys.exit(f"The local Foldseek database for '{db}' was not found at {database_path}.")
+
+    has_taxonomy = {
+        db: os.path.exists(f"{database_path}_taxonomy")
+        for db, database_path in database_paths.items()
+    }
+
+    for input_file, output_file in zip(input_files, output_files):
+        output_file = check_query_files(input_file, output_file)
+
+        with tempfile.TemporaryDirectory() as temp_dirpath:
+            m8_filepaths = []
+            for db, database_path in database_paths.items():
+                m8_filepath = os.path.join(temp_dirpath, f"alis_{db}.m8")
+                format_output = LOCAL_FORMAT_OUTPUT + (
+                    list(LOCAL_TAXONOMY_FIELDS) if has_taxonomy[db] else []
+                )
+                result = subprocess.run(
+                    [
+                        "foldseek",
+                        "easy-search",
+                        input_file,
+                        database_path,
+                        m8_filepath,
+                        os.path.join(temp_dirpath, "tmp"),
+                        "--alignment-type",
+                        LOCAL_ALIGNMENT_TYPES[mode],
+                        "--format-output",
+                        ",".join(format_output),
+                        "--threads",
+                        str(threads),
+                    ],
+                    capture_output=True,
+                )
+                if result.returncode != 0:
+                    sys.exit(
+                        f"`foldseek easy-search` failed for {input_file} against '{db}': "
+                        f"{result.stderr.decode()}"
+                    )
+                if not has_taxonomy[db]:
+                    _append_taxonomy_placeholders(m8_filepath)
+                m8_filepaths.append(m8_filepath)
+
+            output_dirpath = os.path.dirname(output_file)
+            if output_dirpath:
+                os.makedirs(output_dirpath, exist_ok=True)
+            with tarfile.open(output_file, "w:gz") as tar:
+                for m8_filepath in m8_filepaths:
+                    tar.add(m8_filepath, arcname=os.path.basename(m8_filepath))
+
+        print(f"Wrote local Foldseek results for {input_file} to {output_file}.")
+
+
+def foldseek_apiquery(
+    input_file: str,
+    output_file: str,
+    mode: str,
+    database: list,
+    server: str,
+    cache_dir=None,
+    cache_ttl_days=None,
+    cache_max_size_gb=None,
+    timings_file=None,
+):
+    """
+    Queries the Foldseek web API with a PDB file and retrieves the results.
+    This is a convenience wrapper around `foldseek_apiquery_batch` for a single query.
+
+    Args:
+        input_file (str): path to the query PDB file.
+        output_file (str): path to a compressed '.tar.gz' results file.
+            If suffix is missing, adds it.
+        mode (str): whether to run in '3diaa' or 'tmalign' mode.
+        database (list): list of run databases.
+            Valid databases include 'afdb50', 'afdb-swissprot', 'afdb-proteome', 'mgnify_esm30',
+            'pdb100', and 'gmgcl_id'.
+        server (str): the URL of the Foldseek server.
+        cache_dir (str): path to the root cache directory. If None, caching is disabled.
+        cache_ttl_days (float): maximum age of cached results in days.
+        cache_max_size_gb (float): maximum size of the results cache in GB.
+        timings_file (str): optional path to a TSV file in which to record the duration
+            of each phase of the search (submit, queue, run and download).
+    """
+    foldseek_apiquery_batch(
+        [input_file],
+        [output_file],
+        mode,
+        database,
+        server,
+        max_in_flight=1,
+        cache_dir=cache_dir,
+        cache_ttl_days=cache_ttl_days,
+        cache_max_size_gb=cache_max_size_gb,
+        timings_files=[timings_file],
     )
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    with open(output_file, "wb") as fd:
-        for chunk in download.iter_content(chunk_size=128):
-            fd.write(chunk)
 
 
 # run this if called from the interpreter
@@ -205,13 +699,29 @@ def main():
     # parse args
     args = parse_args()
 
-    input_file = args.input
-    output_file = args.output
-    mode = args.mode
-    database = args.database
-    server = args.server
-
-    foldseek_apiquery(input_file, output_file, mode, database, server)
+    if args.backend == LOCAL_BACKEND:
+        database_paths = dict(item.split("=", 1) for item in args.local_database)
+        foldseek_local_search(
+            args.input,
+            args.output,
+            args.mode,
+            database_paths,
+            threads=args.threads,
+        )
+        return
+
+    foldseek_apiquery_batch(
+        args.input,
+        args.output,
+        args.mode,
+        args.database,
+        args.server,
+        max_in_flight=args.max_in_flight,
+        cache_dir=args.cache_dir,
+        cache_ttl_days=args.cache_ttl_days,
+        cache_max_size_gb=args.cache_max_size_gb,
+        timings_files=args.timings_file,
+    )
 
 
 # check if called from interpreter
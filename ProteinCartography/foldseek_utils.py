@@ -0,0 +1,177 @@
+import os
+
+import constants
+import pandas as pd
+
+# only import these functions when using import *
+__all__ = ["read_m8", "read_m8_files"]
+
+# the subset of the .m8 columns used downstream, and their dtypes
+M8_USECOLS_DTYPES = {
+    "target": "string",
+    "fident": "float64",
+    "prob": "float64",
+    "evalue": "float64",
+}
+
+# extracts the UniProt accession from the first token of the target column
+# (e.g. 'AF-P60709-F1-model_v4 Actin, cytoplasmic 1' -> 'P60709')
+# this is equivalent to splitting the target on spaces and matching 'AF-(.*)-F1-model_v4'
+ALPHAFOLD_MODEL_ID_REGEX = r"^[^ ]*?AF-([^ ]*)-F1-model_v4"
+
+# the number of rows to parse at a time; this bounds the memory used for very large result sets
+DEFAULT_CHUNKSIZE = 500_000
+
+# the suffix of the cached Parquet file written next to each parsed .m8 file
+PARQUET_SIDECAR_SUFFIX = ".parquet"
+
+# the keys of the Parquet metadata in which the size and modification time of the .m8 file
+# are recorded when the cached Parquet file is written (see `_source_file_key`)
+SIDECAR_SOURCE_SIZE_KEY = "proteincartography.source_size"
+SIDECAR_SOURCE_MTIME_NS_KEY = "proteincartography.source_mtime_ns"
+
+
+def _parse_m8_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Extract the protid from the target column of a chunk of a .m8 file,
+    dropping any hits that are not AlphaFold models.
+    """
+    protids = chunk["target"].str.extract(ALPHAFOLD_MODEL_ID_REGEX, expand=False)
+    chunk = chunk.assign(protid=protids).dropna(subset=["protid"])
+    return chunk[constants.FOLDSEEK_OUT_COLUMN_NAMES]
+
+
+def _empty_m8_dataframe() -> pd.DataFrame:
+    """
+    Returns an empty dataframe with the columns and dtypes returned by `read_m8`
+    """
+    return pd.DataFrame(
+        {
+            column: pd.Series(dtype="string" if column == "protid" else "float64")
+            for column in constants.FOLDSEEK_OUT_COLUMN_NAMES
+        }
+    )
+
+
+def _source_file_key(input_file: str) -> dict:
+    """
+    Returns the size and modification time (in nanoseconds) of a .m8 file, which are stored
+    in the metadata of its cached Parquet file to check that the cache matches the file.
+
+    Note: the modification times are compared for equality, rather than checking that the cache
+    is newer than the .m8 file, because `tar -x` restores the (older) modification times
+    of the archived files, so a re-extracted .m8 file can be older than a stale cache.
+    """
+    stat = os.stat(input_file)
+    return {
+        SIDECAR_SOURCE_SIZE_KEY: str(stat.st_size),
+        SIDECAR_SOURCE_MTIME_NS_KEY: str(stat.st_mtime_ns),
+    }
+
+
+def _read_parquet_sidecar(sidecar_filepath: str, source_key: dict):
+    """
+    Read the cached Parquet file, returning None if it was not written for the current version
+    of the .m8 file (see `_source_file_key`) or if it cannot be read
+    (e.g. because pyarrow is not installed or the file is corrupt)
+    """
+    try:
+        import pyarrow.parquet as pq
+
+        metadata = pq.read_schema(sidecar_filepath).metadata or {}
+        for key, value in source_key.items():
+            if metadata.get(key.encode()) != value.encode():
+                return None
+        return pd.read_parquet(sidecar_filepath)
+    except Exception:
+        return None
+
+
+def _write_parquet_sidecar(df: pd.DataFrame, sidecar_filepath: str, source_key: dict):
+    """
+    Write the parsed results to a Parquet file next to the .m8 file,
+    recording the size and modification time of the .m8 file in the Parquet metadata.
+
+    Note: this is only a cache, so failures are ignored. The file is written to a temporary path
+    and then moved into place, so that concurrent readers never see a partially-written file.
+    """
+    temp_filepath = f"{sidecar_filepath}.{os.getpid()}.temp"
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = (table.schema.metadata or {}) | {
+            key.encode(): value.encode() for key, value in source_key.items()
+        }
+        pq.write_table(table.replace_schema_metadata(metadata), temp_filepath)
+        os.replace(temp_filepath, sidecar_filepath)
+    except Exception:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+
+
+def read_m8(input_file: str, chunksize=DEFAULT_CHUNKSIZE, use_cache=True) -> pd.DataFrame:
+    """
+    Reads a tabular Foldseek results file (ending in .m8) from the API query.
+    Only the columns needed downstream are loaded, and only hits to AlphaFold models are kept.
+
+    The parsed results are cached in a Parquet file next to the .m8 file,
+    so that subsequent reads of the same file are nearly instantaneous; the cache is only used
+    if the size and modification time of the .m8 file have not changed since it was written.
+
+    Args:
+        input_file (str): path to the .m8 file.
+        chunksize (int): number of rows to parse at a time.
+        use_cache (bool): whether to read from and write to the cached Parquet file.
+
+    Returns:
+        a pandas.DataFrame with the columns in `constants.FOLDSEEK_OUT_COLUMN_NAMES`.
+    """
+    if os.path.getsize(input_file) == 0:
+        return _empty_m8_dataframe()
+
+    # note: the key is determined before parsing the file, so that if the file is modified
+    # while it is being parsed, the cache is not used by subsequent reads
+    sidecar_filepath = input_file + PARQUET_SIDECAR_SUFFIX
+    source_key = _source_file_key(input_file)
+    if use_cache and os.path.exists(sidecar_filepath):
+        df = _read_parquet_sidecar(sidecar_filepath, source_key)
+        if df is not None:
+            return df
+
+    reader = pd.read_csv(
+        input_file,
+        sep="\t",
+        header=None,
+        names=constants.FOLDSEEK_COLUMN_NAMES,
+        usecols=list(M8_USECOLS_DTYPES.keys()),
+        dtype=M8_USECOLS_DTYPES,
+        chunksize=chunksize,
+    )
+    chunks = [_parse_m8_chunk(chunk) for chunk in reader]
+    df = pd.concat(chunks, ignore_index=True) if chunks else _empty_m8_dataframe()
+
+    if use_cache:
+        _write_parquet_sidecar(df, sidecar_filepath, source_key)
+
+    return df
+
+
+def read_m8_files(input_files: list, chunksize=DEFAULT_CHUNKSIZE, use_cache=True) -> pd.DataFrame:
+    """
+    Reads and concatenates a list of .m8 files using `read_m8`, skipping any empty files.
+
+    Args:
+        input_files (list): list of paths to .m8 files.
+        chunksize (int): number of rows to parse at a time.
+        use_cache (bool): whether to read from and write to the cached Parquet files.
+
+    Returns:
+        a pandas.DataFrame with the columns in `constants.FOLDSEEK_OUT_COLUMN_NAMES`.
+    """
+    dfs = [read_m8(file, chunksize=chunksize, use_cache=use_cache) for file in input_files]
+    dfs = [df for df in dfs if not df.empty]
+    if not dfs:
+        return _empty_m8_dataframe()
+    return pd.concat(dfs, ignore_index=True)
@@ -2,6 +2,7 @@
 import argparse
 import os
 
+import numpy as np
 import pandas as pd
 
 # only import these functions when using import *
@@ -49,6 +50,8 @@ def get_source(
 ) -> pd.DataFrame:
     """
     Aggregates a list of hit files to determine the source of each protid for a features matrix.
+    Only the protid column of the input file is read, and the hits for all of the source files,
+    methods and keyids are computed as a single boolean matrix.
 
     Args:
         input_file (str): path to input pivoted results file.
@@ -65,61 +68,64 @@ def get_source(
     if keyids is None:
         keyids = []
 
-    # Read the input file
-    df = pd.read_csv(input_file, sep="\t", index_col="protid")
+    # Read only the protid column of the input file to get a list of protids
+    protids = pd.read_csv(input_file, sep="\t", usecols=["protid"])["protid"]
 
-    # Get the index to get a list of protids
-    df_indexes = pd.DataFrame(df.index)
-
-    # Read the entries of each source file as a list
+    # Read the entries of each source file as a set, keyed by the column name
+    # (usually protid.method); if two files have the same column name, the last one is used
+    sourceitems = {}
     for file in hit_files:
-        # Get the name of the file
-        sourcename = os.path.basename(file)
-        # Get the column name (usually protid.method)
-        sourcecol = sourcename.partition("hits")[0]
-
-        # Read the file
+        sourcecol = os.path.basename(file).partition("hits")[0]
         with open(file) as f:
-            sourceitems = [i.rstrip("\n") for i in f.readlines()]
-        # For each protid, give it a 1 if it's a hit to that source file and a 0 if not.
-        df_indexes[sourcecol] = pd.Series([1 if i in sourceitems else 0 for i in df.index])
+            sourceitems[sourcecol] = {line.rstrip("\n") for line in f}
+
+    # Make a boolean matrix with one row per protid and one column per source file,
+    # with True if the protid is a hit in that source file.
+    sourcecols = list(sourceitems)
+    hits = np.zeros((len(protids), len(sourcecols)), dtype=bool)
+    for ind, sourcecol in enumerate(sourcecols):
+        hits[:, ind] = protids.isin(sourceitems[sourcecol]).to_numpy()
+
+    def any_hits(pattern: str) -> np.ndarray:
+        # whether each protid is a hit in any of the source files whose column name
+        # includes the pattern
+        inds = [ind for ind, sourcecol in enumerate(sourcecols) if pattern in sourcecol]
+        return hits[:, inds].any(axis=1)
+
+    columns = {"protid": protids.to_numpy()}
+    for ind, sourcecol in enumerate(sourcecols):
+        columns[sourcecol] = hits[:, ind].astype(int)
 
     # Create a summary column by method.
     # For example, if there are multiple input proteins,
     # and you want to know if any of those produced a blast hit for each protid,
     # this will do that for you.
     if "method" in groupby:
-        # Go across the methods
-        for method in methods:
-            # Identify the columns that have the method and see if any are true
-            df_indexes[method] = df_indexes[df_indexes.filter(like=method).columns].any(axis=1)
-            # convert the True / False to 1 / 0 encoding.
-            df_indexes[method] = df_indexes[method].apply(lambda x: 1 if x is True else 0)
+        method_hits = {method: any_hits(method) for method in methods}
+        columns.update({method: method_hits[method].astype(int) for method in methods})
 
         # If both 'blast' and 'foldseek' are in the methods,
-        # generate a combined column for those hits
-        # that were found via both methods.
+        # generate a combined column (with a value of 2) for those hits
+        # that were found via both methods,
+        # and summarize across the method columns to assign an "origin" for each protid.
+        # If a protein came from both blast and foldseek, that assignment overrides the other two,
+        # and if it came from neither, it is assigned to 'blast'.
         if "blast" in methods and "foldseek" in methods:
-            df_indexes["blast+foldseek"] = df_indexes[["blast", "foldseek"]].all(axis=1)
-            df_indexes["blast+foldseek"] = df_indexes["blast+foldseek"].apply(
-                lambda x: 2 if x is True else 0
+            both = method_hits["blast"] & method_hits["foldseek"]
+            columns["blast+foldseek"] = both.astype(int) * 2
+            columns["source.method"] = np.where(
+                both,
+                "blast+foldseek",
+                np.where(method_hits["foldseek"] & ~method_hits["blast"], "foldseek", "blast"),
             )
 
-        # Summarize across source columns to assign an "origin" for each protid.
-        # If a protein came from both blast and foldseek,
-        # because the blast+foldseek column has a max value of 2,
-        # that assignment overrides the other two.
-        df_indexes["source.method"] = df_indexes[["blast", "foldseek", "blast+foldseek"]].idxmax(
-            axis=1
-        )
-
     # Create a summary column by keyid (usually the input proteins used to make the search).
     # This tells you for each protid whether it was a hit to one of the keyid proteins.
     if "keyid" in groupby and len(keyids):
         for keyid in keyids:
-            keyidcol = keyid + ".hit"
-            df_indexes[keyidcol] = df_indexes[df_indexes.filter(like=keyid).columns].any(axis=1)
-            df_indexes[keyidcol] = df_indexes[keyidcol].apply(lambda x: 1 if x is True else 0)
+            columns[keyid + ".hit"] = any_hits(keyid).astype(int)
+
+    df_indexes = pd.DataFrame(columns)
 
     # Save to file
     if savefile is not None:
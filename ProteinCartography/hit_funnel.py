@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+import argparse
+import ast
+
+# only import these functions when using import *
+__all__ = [
+    "unique_in_order",
+    "read_id_list",
+    "write_id_list",
+    "aggregate_id_lists",
+    "resolve_filters",
+    "filter_columns",
+    "filter_mask",
+    "filter_features",
+    "order_by_hits",
+    "run_hit_funnel",
+]
+
+# Note: this module only imports from the standard library at the top level,
+# because `aggregate_hits.py` and `rescue_mapping.py` are run without a conda environment.
+
+
+# parse command line arguments
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Aggregates lists of hits, filters them using their UniProt features, "
+            "and keeps the first hits up to a maximum number, in a single pass."
+        )
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        nargs="+",
+        help="Paths of the hit lists. Each file should be a .txt file with one accession per line.",
+    )
+    parser.add_argument(
+        "-f",
+        "--features",
+        required=True,
+        help="Path of the uniprot_features.tsv file for the hits.",
+    )
+    parser.add_argument("-o", "--output", required=True, help="Path of the output hit list.")
+    parser.add_argument(
+        "-m", "--min-length", type=int, default=0, help="Minimum length of proteins to keep."
+    )
+    parser.add_argument(
+        "-M",
+        "--max-length",
+        type=int,
+        default=0,
+        help="Maximum length of proteins to keep. If set to 0, no upper limit is applied.",
+    )
+    parser.add_argument(
+        "--excluded-protids", nargs="*", help="A list of protids to exclude from the results."
+    )
+    parser.add_argument(
+        "--reviewed-only", action="store_true", help="Only keep reviewed (Swiss-Prot) proteins."
+    )
+    parser.add_argument(
+        "--min-annotation-score",
+        type=float,
+        default=0,
+        help="Minimum UniProt annotation score of proteins to keep.",
+    )
+    parser.add_argument(
+        "--include-taxa",
+        nargs="*",
+        help="Only keep the proteins with one of these taxa in their lineage (or organism).",
+    )
+    parser.add_argument(
+        "--exclude-taxa",
+        nargs="*",
+        help="Remove the proteins with one of these taxa in their lineage (or organism).",
+    )
+    parser.add_argument(
+        "--max-structures", type=int, help="Maximum number of hits to keep. Keeps all if not set."
+    )
+    args = parser.parse_args()
+    return args
+
+
+def unique_in_order(ids) -> list:
+    """
+    Removes the duplicates from an iterable of IDs, keeping the first occurrence of each ID
+    (so that the result is the same from run to run, unlike iterating over a set).
+    """
+    return list(dict.fromkeys(ids))
+
+
+def read_id_list(input_file: str):
+    """
+    Yields the IDs in a .txt file with one ID per line, skipping blank lines.
+    """
+    with open(input_file) as file:
+        for line in file:
+            id = line.rstrip("\n")
+            if id:
+                yield id
+
+
+def write_id_list(ids, output_file: str):
+    """
+    Writes an iterable of IDs to a .txt file, one ID per line.
+    """
+    with open(output_file, "w+") as file:
+        file.writelines(id + "\n" for id in ids)
+
+
+def aggregate_id_lists(input_files: list) -> list:
+    """
+    Combines the IDs in a list of .txt files, removing duplicates.
+    The IDs are kept in the order in which they are first seen
+    (i.e. in the order of the files, and then in the order of the IDs in each file).
+    """
+    return unique_in_order(id for input_file in input_files for id in read_id_list(input_file))
+
+
+def _is_active(features_df, enabled: bool):
+    # note: the annotation scores of inactive (e.g. deleted or merged) entries are missing
+    return (features_df["Protein names"] != "deleted") & features_df["Annotation"].notna()
+
+
+def _is_not_fragment(features_df, enabled: bool):
+    return features_df["Fragment"] != "fragment"
+
+
+def _is_reviewed(features_df, enabled: bool):
+    return features_df["Reviewed"] == "reviewed"
+
+
+def _is_longer_than(features_df, min_length: int):
+    # note: proteins whose length is missing (e.g. inactive entries) are removed
+    return (features_df["Length"] > min_length).fillna(False).astype(bool)
+
+
+def _is_shorter_than(features_df, max_length: int):
+    return (features_df["Length"] < max_length).fillna(False).astype(bool)
+
+
+def _has_min_annotation_score(features_df, min_annotation_score: float):
+    annotation_scores = features_df["Annotation"].astype("float64")
+    return (annotation_scores >= min_annotation_score).fillna(False).astype(bool)
+
+
+def _is_not_excluded(features_df, excluded_protids: list):
+    return ~features_df["protid"].isin(excluded_protids)
+
+
+def _matches_taxa(features_df, taxa: list):
+    """
+    Whether the lineage or the organism of each protein includes one of the taxa.
+
+    The lineages may be lists or the string representations of lists (as in the TSV files);
+    because there are usually far fewer distinct lineages than proteins,
+    each distinct lineage string is only parsed and matched once.
+    """
+    taxa = set(taxa)
+    matches = {}
+
+    def lineage_matches(lineage) -> bool:
+        if isinstance(lineage, str):
+            if lineage not in matches:
+                matches[lineage] = not taxa.isdisjoint(ast.literal_eval(lineage))
+            return matches[lineage]
+        if isinstance(lineage, float) or lineage is None:
+            return False
+        return not taxa.isdisjoint(lineage)
+
+    # note: the organism names include the common name (e.g. 'Homo sapiens (Human)')
+    organisms = features_df["Organism"].astype("string").str.split(" (", n=1, regex=False).str[0]
+    return features_df["Lineage"].map(lineage_matches).astype(bool) | organisms.isin(taxa)
+
+
+def _includes_taxa(features_df, include_taxa: list):
+    return _matches_taxa(features_df, include_taxa)
+
+
+def _excludes_taxa(features_df, exclude_taxa: list):
+    return ~_matches_taxa(features_df, exclude_taxa)
+
+
+# the predicates used to filter the hits, by the name of the filter that enables them:
+# each predicate takes the features dataframe and the value of the filter and returns a mask
+# of the proteins to keep, and the columns are the features columns that the predicate needs
+# (so that only these columns have to be read from the features file);
+# a filter is disabled if its value is false, zero or empty
+FILTER_PREDICATES = {
+    "excluded_protids": (["protid"], _is_not_excluded),
+    "filter_inactive": (["Protein names", "Annotation"], _is_active),
+    "filter_fragment": (["Fragment"], _is_not_fragment),
+    "reviewed_only": (["Reviewed"], _is_reviewed),
+    "min_annotation_score": (["Annotation"], _has_min_annotation_score),
+    "include_taxa": (["Lineage", "Organism"], _includes_taxa),
+    "exclude_taxa": (["Lineage", "Organism"], _excludes_taxa),
+    "min_length": (["Length"], _is_longer_than),
+    "max_length": (["Length"], _is_shorter_than),
+}
+
+# the default value of each filter
+DEFAULT_FILTERS = {
+    "excluded_protids": None,
+    "filter_inactive": True,
+    "filter_fragment": True,
+    "reviewed_only": False,
+    "min_annotation_score": 0,
+    "include_taxa": None,
+    "exclude_taxa": None,
+    "min_length": 0,
+    "max_length": 0,
+}
+
+
+def resolve_filters(**filters) -> dict:
+    """
+    Returns the enabled filters (see `FILTER_PREDICATES`), with the default values
+    of the filters that are not provided.
+    """
+    unknown_filters = set(filters) - set(FILTER_PREDICATES)
+    if unknown_filters:
+        raise ValueError(f"Unknown filters: {', '.join(sorted(unknown_filters))}")
+
+    filters = DEFAULT_FILTERS | filters
+    if filters["min_length"] > filters["max_length"] and filters["max_length"] != 0:
+        raise ValueError("Minimum length must be less than maximum length.")
+
+    return {name: value for name, value in filters.items() if value}
+
+
+def filter_columns(**filters) -> list:
+    """
+    Returns the names of the features columns that are needed to apply the filters
+    (always including the 'protid' column).
+    """
+    columns = ["protid"]
+    for name in resolve_filters(**filters):
+        columns.extend(FILTER_PREDICATES[name][0])
+    return unique_in_order(columns)
+
+
+def filter_mask(features_df, **filters):
+    """
+    Evaluates the enabled filters on a dataframe of UniProt features,
+    and combines them into a single boolean mask of the proteins to keep.
+
+    Args:
+        features_df (pandas.DataFrame): the UniProt features
+            (with at least the columns returned by `filter_columns`).
+        filters: the values of the filters (see `FILTER_PREDICATES` and `DEFAULT_FILTERS`).
+    Returns:
+        a boolean pandas.Series with the same index as `features_df`.
+    """
+    filters = resolve_filters(**filters)
+
+    missing_columns = set(filter_columns(**filters)) - set(features_df.columns)
+    if missing_columns:
+        raise ValueError(
+            f"The features are missing the columns needed by the filters: "
+            f"{', '.join(sorted(missing_columns))}"
+        )
+
+    mask = features_df["protid"].notna()
+    for name, value in filters.items():
+        mask &= FILTER_PREDICATES[name][1](features_df, value)
+    return mask
+
+
+def filter_features(features_df, **filters):
+    """
+    Filters a dataframe of UniProt features based on fragment status, inactive status, size,
+    review status, annotation score and taxonomy, using a single mask
+    (the order of the rows is unchanged).
+
+    Args:
+        features_df (pandas.DataFrame): the UniProt features.
+        filter_inactive (bool): whether to remove inactive proteins
+        filter_fragment (bool): whether to remove fragmentary proteins
+        reviewed_only (bool): whether to remove unreviewed (TrEMBL) proteins
+        min_annotation_score (float): minimum UniProt annotation score of proteins to keep
+        include_taxa (list): if provided, only keeps the proteins with one of these taxa
+            in their lineage (or as their organism)
+        exclude_taxa (list): removes the proteins with one of these taxa in their lineage
+            (or as their organism)
+        min_length (int): minimum length of proteins to keep
+        max_length (int): maximum length of proteins to keep (if nonzero)
+        excluded_protids (list): protids to remove
+    Returns:
+        the filtered pandas.DataFrame.
+    """
+    return features_df[filter_mask(features_df, **filters)]
+
+
+def order_by_hits(features_df, hits: list):
+    """
+    Sorts a dataframe of features by the position of each protid in a list of hits.
+    The protids that are not in the list of hits are placed last, in their original order.
+    """
+    positions = {hit: position for position, hit in enumerate(hits)}
+    return features_df.sort_values(
+        "protid", key=lambda protids: protids.map(positions), kind="stable", na_position="last"
+    )
+
+
+def run_hit_funnel(
+    input_files: list,
+    features_file: str,
+    output_file: str,
+    max_structures=None,
+    **filter_kwargs,
+) -> list:
+    """
+    Aggregates lists of hits (removing duplicates), filters the hits using their UniProt features,
+    and keeps the first `max_structures` hits, in the order in which the hits were first seen.
+
+    Args:
+        input_files (list): paths of the hit lists.
+        features_file (str): path of the uniprot_features.tsv file for the hits.
+        output_file (str): path of the output hit list.
+        max_structures (int): maximum number of hits to keep. If None, keeps all of the hits.
+        filter_kwargs: the values of the filters (see `filter_features`).
+    Returns:
+        the list of hits that were kept.
+    """
+    # note: this is imported here because it depends on pandas (see the note at the top)
+    from features_utils import read_features
+
+    hits = aggregate_id_lists(input_files)
+
+    # only the columns needed by the filters are read
+    features_df = read_features(
+        features_file, parse_lineage_column=False, columns=filter_columns(**filter_kwargs)
+    )
+    features_df = order_by_hits(filter_features(features_df, **filter_kwargs), hits)
+
+    selected_hits = features_df["protid"].tolist()[:max_structures]
+    write_id_list(selected_hits, output_file)
+    return selected_hits
+
+
+# run this if called from the interpreter
+def main():
+    args = parse_args()
+    run_hit_funnel(
+        args.input,
+        args.features,
+        args.output,
+        max_structures=args.max_structures,
+        min_length=args.min_length,
+        max_length=args.max_length,
+        excluded_protids=args.excluded_protids,
+        reviewed_only=args.reviewed_only,
+        min_annotation_score=args.min_annotation_score,
+        include_taxa=args.include_taxa,
+        exclude_taxa=args.exclude_taxa,
+    )
+
+
+# check if called from interpreter
+if __name__ == "__main__":
+    main()
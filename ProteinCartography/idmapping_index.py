@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+import argparse
+import gzip
+import os
+import sqlite3
+
+import pandas as pd
+
+# only import these functions when using import *
+__all__ = ["build_idmapping_index", "get_indexed_databases", "lookup_idmapping_index"]
+
+# the ID types in the UniProt idmapping.dat file that correspond to the databases
+# used by the UniProt ID mapping API (see `map_refseq_ids.DEFAULT_DBS`)
+IDMAPPING_ID_TYPES = {
+    "RefSeq_Protein": "RefSeq",
+    "EMBL-GenBank-DDBJ_CDS": "EMBL-CDS",
+}
+
+# the number of rows to insert into the index at a time
+INSERT_BATCH_SIZE = 100_000
+
+# the UniProt idmapping dump that the index is usually built from
+IDMAPPING_DAT_URL = (
+    "https://ftp.uniprot.org/pub/databases/uniprot/current_release/"
+    "knowledgebase/idmapping/idmapping.dat.gz"
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Build a local index of the RefSeq and EMBL-CDS to UniProt mappings "
+            f"from the UniProt idmapping.dat(.gz) file (available at {IDMAPPING_DAT_URL})."
+        )
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        required=True,
+        help="path to the idmapping.dat or idmapping.dat.gz file.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="path to the SQLite index file to create.",
+    )
+    parser.add_argument(
+        "-d",
+        "--databases",
+        nargs="+",
+        default=list(IDMAPPING_ID_TYPES.keys()),
+        help=f"which databases to include in the index. defaults to {list(IDMAPPING_ID_TYPES)}",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def _strip_version(accession: str) -> str:
+    """
+    Remove the version suffix from an accession (e.g. 'NP_001092.1' -> 'NP_001092')
+    """
+    return accession.split(".", 1)[0]
+
+
+def _iter_idmapping_rows(input_file: str, id_types: set):
+    """
+    Yield the (id_type, unversioned id, UniProt accession) tuples in the idmapping.dat file
+    for the given ID types
+    """
+    opener = gzip.open if input_file.endswith(".gz") else open
+    with opener(input_file, "rt") as file:
+        for line in file:
+            accession, id_type, id_ = line.rstrip("\n").split("\t")
+            if id_type in id_types:
+                yield id_type, _strip_version(id_), accession
+
+
+def build_idmapping_index(input_file: str, output_file: str, query_dbs: list):
+    """
+    Build a SQLite index of the mappings from the given databases to UniProt accessions
+    from the UniProt idmapping.dat(.gz) file.
+
+    The index is written to a temporary file and moved into place once it is complete,
+    so that an interrupted build never leaves behind a partial index.
+
+    Args:
+        input_file (str): path to the idmapping.dat or idmapping.dat.gz file.
+        output_file (str): path to the SQLite index file to create.
+        query_dbs (list): the ID mapping API names of the databases to include in the index
+            (e.g. 'RefSeq_Protein').
+    """
+    id_types = {IDMAPPING_ID_TYPES[db] for db in query_dbs}
+
+    temp_output_file = f"{output_file}.{os.getpid()}.temp"
+    if os.path.exists(temp_output_file):
+        os.remove(temp_output_file)
+
+    connection = sqlite3.connect(temp_output_file)
+    try:
+        connection.execute("CREATE TABLE mapping (id_type TEXT, id TEXT, accession TEXT)")
+        connection.execute("CREATE TABLE id_types (id_type TEXT PRIMARY KEY)")
+        connection.executemany("INSERT INTO id_types VALUES (?)", [(t,) for t in id_types])
+
+        batch = []
+        for row in _iter_idmapping_rows(input_file, id_types):
+            batch.append(row)
+            if len(batch) >= INSERT_BATCH_SIZE:
+                connection.executemany("INSERT INTO mapping VALUES (?, ?, ?)", batch)
+                batch = []
+        connection.executemany("INSERT INTO mapping VALUES (?, ?, ?)", batch)
+
+        # creating the index after inserting the rows is much faster than inserting into it
+        connection.execute("CREATE INDEX mapping_id ON mapping (id, id_type)")
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(temp_output_file, output_file)
+
+
+def get_indexed_databases(index_file: str) -> list:
+    """
+    Returns the ID mapping API names of the databases included in the index
+    """
+    connection = sqlite3.connect(f"file:{index_file}?mode=ro", uri=True)
+    try:
+        id_types = {row[0] for row in connection.execute("SELECT id_type FROM id_types")}
+    finally:
+        connection.close()
+    return [db for db, id_type in IDMAPPING_ID_TYPES.items() if id_type in id_types]
+
+
+def lookup_idmapping_index(index_file: str, ids: list, query_dbs: list) -> pd.DataFrame:
+    """
+    Map a list of accessions to UniProt accessions using the local index.
+    All of the accessions are looked up at once, using a join against a temporary table.
+
+    Args:
+        index_file (str): path to the SQLite index file.
+        ids (list): the accessions to map (with or without version suffixes).
+        query_dbs (list): the ID mapping API names of the databases to use for mapping.
+    Returns:
+        a pandas.DataFrame with the same 'from' and 'to' columns as the results
+        of the UniProt ID mapping API.
+    """
+    id_types = [IDMAPPING_ID_TYPES[db] for db in query_dbs]
+    if not ids or not id_types:
+        return pd.DataFrame(columns=["from", "to"])
+
+    connection = sqlite3.connect(f"file:{index_file}?mode=ro", uri=True)
+    try:
+        connection.execute("CREATE TEMP TABLE query (from_id TEXT, id TEXT)")
+        connection.executemany(
+            "INSERT INTO temp.query VALUES (?, ?)", [(id_, _strip_version(id_)) for id_ in ids]
+        )
+        placeholders = ",".join("?" * len(id_types))
+        results_df = pd.read_sql_query(
+            f"""
+            SELECT DISTINCT query.from_id AS "from", mapping.accession AS "to"
+            FROM temp.query AS query
+            JOIN mapping ON mapping.id = query.id
+            WHERE mapping.id_type IN ({placeholders})
+            """,
+            connection,
+            params=id_types,
+        )
+    finally:
+        connection.close()
+
+    return results_df
+
+
+# run this if called from the interpreter
+def main():
+    args = parse_args()
+    build_idmapping_index(args.input, args.output, args.databases)
+
+
+# check if called from interpreter
+if __name__ == "__main__":
+    main()
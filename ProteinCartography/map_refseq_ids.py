@@ -2,14 +2,17 @@
 import argparse
 import os
 import sys
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
 
+import idmapping_index
 import pandas as pd
 from api_utils import (
     UniProtWithExpBackoff,
+    poll_with_backoff,
     session_with_retry,
 )
 from constants import UniProtService
+from hit_funnel import unique_in_order
 from tests import mocks
 
 # if necessary, mock the `uniprot.mapping` method (used by `map_refseqids_bioservices`)
@@ -26,9 +29,24 @@ DEFAULT_DBS = ["EMBL-GenBank-DDBJ_CDS", "RefSeq_Protein"]
 # id mapping link
 UNIPROT_IDMAPPING_API = "https://rest.uniprot.org/idmapping"
 
-# requests constants
-REQUESTS_LIMIT = 10
-REQUESTS_SLEEP_TIME = 30
+# the maximum number of IDs that the ID mapping API accepts in a single job is 100,000;
+# larger lists of IDs are split into chunks of this size, each of which is mapped by its own job
+IDMAPPING_CHUNK_SIZE = 10_000
+
+# the maximum number of ID mapping jobs (one per database and chunk of IDs) to run concurrently
+MAX_CONCURRENT_JOBS = 8
+
+# the number of results to fetch per request (the maximum allowed by the API is 500)
+RESULTS_PAGE_SIZE = 500
+
+# polling constants (in seconds)
+INITIAL_POLL_INTERVAL = 1
+MAX_POLL_INTERVAL = 15
+POLL_TIMEOUT = 300
+
+# the job statuses that indicate that the job has not finished yet
+# (once the job is finished, the status endpoint redirects to the results)
+PENDING_JOB_STATUSES = {"NEW", "RUNNING"}
 
 
 # parse command line arguments
@@ -56,6 +74,25 @@ def parse_args():
     parser.add_argument(
         "-s", "--service", default=UniProtService.REST.value, help="how to fetch mapping"
     )
+    # note: this CLI option requires `nargs="?"` because it is passed without a value
+    # by the `map_refseq_ids` rule when no index is configured
+    parser.add_argument(
+        "--index",
+        nargs="?",
+        help=(
+            "path to a local ID mapping index built by `idmapping_index.py`. "
+            "If provided, the index is used first and the REST API is only used for misses."
+        ),
+    )
+    # note: this CLI option also requires `nargs="?"` (see above)
+    parser.add_argument(
+        "--mapping-output",
+        nargs="?",
+        help=(
+            "path to a .tsv file in which to write the mapping ('from' and 'to' columns) "
+            "from the input accessions to the UniProt accessions."
+        ),
+    )
     args = parser.parse_args()
     return args
 
@@ -63,7 +100,7 @@ def parse_args():
 # takes a list of IDs and maps them to Uniprot using bioservices
 # might make a more generalizable version of this and put it somewhere else
 def map_refseqids_bioservices(
-    input_file: str, output_file: str, query_dbs: list, return_full=False
+    input_file: str, output_file: str, query_dbs: list, return_full=False, mapping_file=None
 ):
     """
     Takes an input .txt file of accessions and maps to UniProt accessions.
@@ -74,6 +111,8 @@ def map_refseqids_bioservices(
         query_dbs (list): list of valid databases to query using the Uniprot ID mapping API.
             Each database will be queried individually.
             The results are compiled and unique results are printed to output_file.
+        mapping_file (str): optional path to a .tsv file in which to write the mapping
+            from the input accessions to the UniProt accessions.
     """
 
     # make object that references UniProt database
@@ -116,6 +155,11 @@ def map_refseqids_bioservices(
     with open(output_file, "w+") as f:
         f.writelines(hit + "\n" for hit in hits)
 
+    if mapping_file:
+        dummy_df.rename(columns={"to.primaryAccession": "to"}).reindex(
+            columns=["from", "to"]
+        ).to_csv(mapping_file, sep="\t", index=False)
+
     if return_full:
         return dummy_df
 
@@ -129,10 +173,97 @@ def map_refseqids_bioservices(
 # ```
 
 
-def map_refseqids_rest(input_file: str, output_file: str, query_dbs: list, return_full=False):
+def _run_idmapping_job(session, ids: list, db: str) -> pd.DataFrame:
+    """
+    Submit a single ID mapping job, poll until it is finished,
+    then fetch all of the results in pages of `RESULTS_PAGE_SIZE` results.
+
+    Args:
+        session (requests.Session): the session to use for all requests.
+        ids (list): the IDs to map (at most `IDMAPPING_CHUNK_SIZE`).
+        db (str): the database from which to map the IDs.
+    Returns:
+        a pandas.DataFrame with 'from' and 'to' columns.
+    """
+    ticket = session.post(
+        f"{UNIPROT_IDMAPPING_API}/run",
+        {"ids": ",".join(ids), "from": db, "to": "UniProtKB"},
+    ).json()
+    job_id = ticket["jobId"]
+
+    try:
+        status = poll_with_backoff(
+            lambda: session.get(f"{UNIPROT_IDMAPPING_API}/status/{job_id}").json(),
+            lambda status: status.get("jobStatus") not in PENDING_JOB_STATUSES,
+            initial_interval=INITIAL_POLL_INTERVAL,
+            max_interval=MAX_POLL_INTERVAL,
+            timeout=POLL_TIMEOUT,
+        )
+    except TimeoutError:
+        sys.exit(f"The ID mapping job for {db} failed to complete after {POLL_TIMEOUT} seconds.")
+
+    if status.get("jobStatus") is not None and status["jobStatus"] != "FINISHED":
+        sys.exit(f"The ID mapping job for {db} failed with status '{status['jobStatus']}'.")
+
+    # fetch the results one page at a time, following the 'next' links
+    results = []
+    url = f"{UNIPROT_IDMAPPING_API}/results/{job_id}"
+    params = {"size": RESULTS_PAGE_SIZE}
+    while url:
+        response = session.get(url, params=params)
+        results.extend(response.json().get("results", []))
+        url = response.links.get("next", {}).get("url")
+        # the 'next' link already includes the query parameters
+        params = None
+
+    return pd.DataFrame(results)
+
+
+def _map_ids_rest(input_ids: list, query_dbs: list) -> pd.DataFrame:
+    """
+    Map a list of accessions to UniProt accessions using the UniProt ID mapping API.
+
+    The IDs are split into chunks of at most `IDMAPPING_CHUNK_SIZE` IDs, and the jobs for all
+    of the databases and chunks are run concurrently using a single shared session.
+
+    Returns:
+        a pandas.DataFrame with 'from' and 'to' columns.
+    """
+    chunks = [
+        input_ids[ind : ind + IDMAPPING_CHUNK_SIZE]
+        for ind in range(0, len(input_ids), IDMAPPING_CHUNK_SIZE)
+    ]
+    jobs = [(chunk, db) for db in query_dbs for chunk in chunks]
+    if not jobs:
+        return pd.DataFrame()
+
+    session = session_with_retry()
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_JOBS, len(jobs))) as executor:
+        results_dfs = list(executor.map(lambda job: _run_idmapping_job(session, *job), jobs))
+
+    # if there are no results for a job, move on
+    results_dfs = [results_df for results_df in results_dfs if len(results_df)]
+    if not results_dfs:
+        return pd.DataFrame()
+
+    return pd.concat(results_dfs, axis=0)
+
+
+def map_refseqids_rest(
+    input_file: str,
+    output_file: str,
+    query_dbs: list,
+    return_full=False,
+    index_file=None,
+    mapping_file=None,
+):
     """
     Takes an input .txt file of accessions and maps to UniProt accessions.
 
+    If a local ID mapping index is provided, all of the accessions are first looked up in the index,
+    and only the accessions that are not found in the index are mapped using the REST API
+    (as are all of the accessions for any databases that are not included in the index).
+
     Args:
         input_file (str): path to input .txt file containing one accession per line.
         output_file (str): path to destination .txt file.
@@ -140,60 +271,40 @@ def map_refseqids_rest(input_file: str, output_file: str, query_dbs: list, retur
             Each database will be queried individually.
             The results are compiled and unique results are printed to output_file.
         return_full (bool): whether to return all of the results as a dataframe
+        index_file (str): optional path to a local ID mapping index built by `idmapping_index.py`.
+        mapping_file (str): optional path to a .tsv file in which to write the mapping
+            from the input accessions to the UniProt accessions.
     """
     # open the input file to extract ids
     with open(input_file) as f:
         input_lines = f.read().splitlines()
-        input_ids = list(set(input_lines))
-        input_string = ",".join(input_ids)
-
-    dummy_df = pd.DataFrame()
-
-    for i, db in enumerate(query_dbs):
-        ticket = (
-            session_with_retry()
-            .post(
-                f"{UNIPROT_IDMAPPING_API}/run",
-                {"ids": input_string, "from": db, "to": "UniProtKB"},
-            )
-            .json()
+        input_ids = unique_in_order(input_lines)
+
+    if index_file:
+        available_dbs = idmapping_index.get_indexed_databases(index_file)
+        indexed_dbs = [db for db in query_dbs if db in available_dbs]
+        index_df = idmapping_index.lookup_idmapping_index(index_file, input_ids, indexed_dbs)
+
+        mapped_ids = set(index_df["from"])
+        missed_ids = [input_id for input_id in input_ids if input_id not in mapped_ids]
+        print(
+            f"Mapped {len(mapped_ids)} of {len(input_ids)} accessions using the local index; "
+            f"{len(missed_ids)} will be mapped using the UniProt ID mapping API."
         )
 
-        # poll until the job was successful or failed
-        repeat = True
-        tries = 0
-        while repeat and tries < REQUESTS_LIMIT:
-            status = (
-                session_with_retry()
-                .get(
-                    f'{UNIPROT_IDMAPPING_API}/status/{ticket["jobId"]}',
-                )
-                .json()
-            )
-
-            # wait a short time between poll requests
-            sleep(REQUESTS_SLEEP_TIME)
-            tries += 1
-            repeat = "results" not in status
-
-        if tries == 10:
-            sys.exit(f"The ticket failed to complete after {tries * REQUESTS_SLEEP_TIME} seconds.")
-
-        results = (
-            session_with_retry().get(f'{UNIPROT_IDMAPPING_API}/stream/{ticket["jobId"]}').json()
-        )
-        results_df = pd.DataFrame(results["results"])
+        dfs = [index_df]
+        if indexed_dbs and missed_ids:
+            dfs.append(_map_ids_rest(missed_ids, indexed_dbs))
 
-        # if there are no results, move on
-        if len(results_df) == 0:
-            continue
+        unindexed_dbs = [db for db in query_dbs if db not in indexed_dbs]
+        if unindexed_dbs:
+            dfs.append(_map_ids_rest(input_ids, unindexed_dbs))
 
-        # if it's the first database, replace it with the dummy dataframe
-        if i == 0:
-            dummy_df = results_df
-        # otherwise append to the dataframe
-        else:
-            dummy_df = pd.concat([dummy_df, results_df], axis=0)
+        # note: the empty results are dropped, because they may not have 'from' and 'to' columns
+        dfs = [df for df in dfs if len(df)]
+        dummy_df = pd.concat(dfs, axis=0) if dfs else index_df
+    else:
+        dummy_df = _map_ids_rest(input_ids, query_dbs)
 
     # extract just the unique Uniprot accessions
     hits = dummy_df["to"].unique()
@@ -202,6 +313,9 @@ def map_refseqids_rest(input_file: str, output_file: str, query_dbs: list, retur
     with open(output_file, "w+") as f:
         f.writelines(hit + "\n" for hit in hits)
 
+    if mapping_file:
+        dummy_df.reindex(columns=["from", "to"]).to_csv(mapping_file, sep="\t", index=False)
+
     if return_full:
         return dummy_df
 
@@ -218,9 +332,17 @@ def main():
     service = UniProtService(args.service)
 
     if service == UniProtService.BIOSERVICES:
-        map_refseqids_bioservices(input_file, output_file, query_dbs)
+        map_refseqids_bioservices(
+            input_file, output_file, query_dbs, mapping_file=args.mapping_output
+        )
     elif service == UniProtService.REST:
-        map_refseqids_rest(input_file, output_file, query_dbs)
+        map_refseqids_rest(
+            input_file,
+            output_file,
+            query_dbs,
+            index_file=args.index,
+            mapping_file=args.mapping_output,
+        )
 
 
 # check if called from interpreter
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import argparse
+import ast
 import textwrap
 from typing import Optional, Union
 
@@ -21,6 +22,7 @@ from color_utils import (
     arcadia_poppies_r,
     arcadia_viridis,
 )
+from features_utils import read_features, write_features
 
 # only import these functions when using import *
 __all__ = [
@@ -156,7 +158,7 @@ def apply_coordinates(
         raise Exception(f'{features_file} does not end in ".tsv" as expected.')
 
     # Load the features data
-    agg_features_df = pd.read_csv(features_file, sep="\t")
+    agg_features_df = read_features(features_file)
 
     # Merge the two dataframes
     plot_features_df = reduced_dim_df.merge(agg_features_df, on="protid")
@@ -169,7 +171,7 @@ def apply_coordinates(
 
     # Save if needed
     if save:
-        plot_features_df.to_csv(savefile, sep="\t", index=None)
+        write_features(plot_features_df, savefile)
 
     # If prep_step, return the savefile path
     # Otherwise, return the results
@@ -278,9 +280,9 @@ def generate_plotting_rules(
         "Lineage": {
             "type": "taxonomic",
             "fillna": "[]",
-            "apply": lambda x: eval(
-                x
-            ),  # This converts the taxonomic groupings from a string-ified list to a real list
+            "apply": lambda x: (
+                x if isinstance(x, list) else ast.literal_eval(x)
+            ),  # The lineages are read as lists; this converts the filled-in NAs to real lists
             "taxon_order": taxon_color_dict.keys(),
             "color_order": taxon_color_dict.values(),
             "textlabel": "Broad taxon",
@@ -382,6 +384,15 @@ def preprocess_dataframe(
         if col not in df.columns:
             continue
 
+        # categorical columns can only be filled with one of their categories,
+        # and nullable integer columns cannot hold the values returned by 'apply'
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_extension_array_dtype(df[col]) and pd.api.types.is_numeric_dtype(
+            df[col]
+        ):
+            df[col] = df[col].astype(float if df[col].hasnans else df[col].dtype.numpy_dtype)
+
         # if the plotting rule 'fillna' is present, fills NAs with that value
         if "fillna" in plotting_rules[col].keys():
             df[col] = df[col].fillna(plotting_rules[col]["fillna"])
@@ -833,7 +844,7 @@ def plot_interactive(
     """
 
     # make a copy of the starting data
-    df = pd.read_csv(coordinates_file, sep="\t")
+    df = read_features(coordinates_file)
 
     dim1 = df.columns[1]
     dim2 = df.columns[2]
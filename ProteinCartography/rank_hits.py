@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+import argparse
+
+import constants
+import foldseek_utils
+import numpy as np
+import pandas as pd
+from features_utils import read_features
+from hit_funnel import read_id_list, write_id_list
+
+# only import these functions when using import *
+__all__ = ["read_blast_evalues", "read_foldseek_evalues", "score_hits", "rank_hits"]
+
+# the columns by which the hits are ranked, and whether each is sorted in ascending order;
+# the hits are ranked by their best e-value, then by the number of hit lists that include them,
+# then by their UniProt annotation score, and finally by the order in which they were found
+RANKING_COLUMNS = {
+    "best_evalue": True,
+    "source_count": False,
+    "annotation_score": False,
+    "position": True,
+}
+
+
+# parse command line arguments
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Ranks the filtered hits by their best BLAST or Foldseek e-value, "
+            "the number of searches that found them, and their annotation score, "
+            "and keeps the top hits."
+        )
+    )
+    parser.add_argument(
+        "-i", "--input", required=True, help="path of the filtered hits list (one protid per line)"
+    )
+    parser.add_argument("-o", "--output", required=True, help="path of the ranked hits list")
+    parser.add_argument(
+        "-f", "--features", required=True, help="path of the uniprot_features.tsv file"
+    )
+    parser.add_argument(
+        "--hit-files",
+        nargs="+",
+        required=True,
+        help="paths of the hit lists of each search (used to count the sources of each hit)",
+    )
+    parser.add_argument(
+        "--blast-results",
+        nargs="*",
+        default=[],
+        help="paths of the BLAST results files (.tsv)",
+    )
+    parser.add_argument(
+        "--blast-mappings",
+        nargs="*",
+        default=[],
+        help=(
+            "paths of the ID mapping files written by `map_refseq_ids.py`, "
+            "one per BLAST results file (in the same order)"
+        ),
+    )
+    parser.add_argument(
+        "--foldseek-results",
+        nargs="*",
+        default=[],
+        help="paths of the Foldseek results files (.m8)",
+    )
+    parser.add_argument(
+        "-M",
+        "--max-structures",
+        type=int,
+        help="maximum number of hits to keep. If not provided, all hits are kept.",
+    )
+    parser.add_argument(
+        "--scores-output", help="optional path of a TSV file in which to write the scores"
+    )
+    parser.add_argument(
+        "-B",
+        "--blast-format-string",
+        default=constants.BLAST_OUTFMT,
+        help=f"BLAST query format string.\n Defaults to '{constants.BLAST_OUTFMT}'",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def read_blast_evalues(
+    blast_results_files: list, mapping_files: list, column_names: list
+) -> pd.Series:
+    """
+    Reads the best e-value of the BLAST hits for each UniProt accession.
+
+    Args:
+        blast_results_files (list): paths of the BLAST results files.
+        mapping_files (list): paths of the ID mapping files ('from' and 'to' columns)
+            from the BLAST subject accessions to UniProt accessions, one per BLAST results file.
+        column_names (list): names of the columns of the BLAST results.
+    Returns:
+        a pandas.Series of e-values indexed by UniProt accession.
+    """
+    if len(blast_results_files) != len(mapping_files):
+        raise ValueError("There must be one ID mapping file per BLAST results file.")
+
+    evalues = []
+    for blast_results_file, mapping_file in zip(blast_results_files, mapping_files):
+        results_df = pd.read_csv(
+            blast_results_file,
+            sep="\t",
+            names=column_names,
+            usecols=["sacc", "evalue"],
+            dtype={"sacc": str},
+        )
+        mapping_df = pd.read_csv(mapping_file, sep="\t", dtype=str)
+        merged_df = results_df.merge(mapping_df, left_on="sacc", right_on="from")
+        evalues.append(merged_df.groupby("to")["evalue"].min())
+
+    if not evalues:
+        return pd.Series(dtype="float64")
+    return pd.concat(evalues).groupby(level=0).min()
+
+
+def read_foldseek_evalues(m8_files: list) -> pd.Series:
+    """
+    Reads the best e-value of the Foldseek hits for each UniProt accession.
+
+    Returns:
+        a pandas.Series of e-values indexed by UniProt accession.
+    """
+    hits_df = foldseek_utils.read_m8_files(m8_files)
+    return hits_df.groupby("protid")["evalue"].min()
+
+
+def score_hits(
+    hits: list, features_df: pd.DataFrame, hit_files: list, evalues: list
+) -> pd.DataFrame:
+    """
+    Scores each hit by its best e-value (across all of the searches), the number of hit lists
+    that include it, and its UniProt annotation score, and ranks the hits by these scores
+    (see `RANKING_COLUMNS`).
+
+    Args:
+        hits (list): the hits to score, in the order in which they were found.
+        features_df (pandas.DataFrame): the UniProt features of the hits.
+        hit_files (list): paths of the hit lists of each search.
+        evalues (list): pandas.Series of e-values indexed by protid (e.g. one for BLAST
+            and one for Foldseek).
+    Returns:
+        a pandas.DataFrame of the scores of the hits, sorted from best to worst.
+    """
+    scores_df = pd.DataFrame({"protid": hits, "position": np.arange(len(hits))})
+
+    # hits without an e-value (e.g. those that were not mapped from BLAST) are ranked last
+    best_evalues = (
+        pd.concat(evalues).groupby(level=0).min() if evalues else pd.Series(dtype="float64")
+    )
+    scores_df["best_evalue"] = scores_df["protid"].map(best_evalues).fillna(np.inf)
+
+    source_counts = pd.Series(
+        [hit for hit_file in hit_files for hit in set(read_id_list(hit_file))]
+    ).value_counts()
+    scores_df["source_count"] = scores_df["protid"].map(source_counts).fillna(0).astype(int)
+
+    annotation_scores = (
+        features_df.drop_duplicates("protid").set_index("protid")["Annotation"].astype("float64")
+    )
+    scores_df["annotation_score"] = scores_df["protid"].map(annotation_scores).fillna(0)
+
+    return scores_df.sort_values(
+        list(RANKING_COLUMNS), ascending=list(RANKING_COLUMNS.values()), ignore_index=True
+    )
+
+
+def rank_hits(
+    input_file: str,
+    output_file: str,
+    features_file: str,
+    hit_files: list,
+    blast_results_files=None,
+    blast_mapping_files=None,
+    foldseek_results_files=None,
+    max_structures=None,
+    scores_file=None,
+    blast_column_names=None,
+) -> pd.DataFrame:
+    """
+    Ranks the filtered hits (see `score_hits`) and writes the top `max_structures` hits.
+
+    Args:
+        input_file (str): path of the filtered hits list.
+        output_file (str): path of the ranked hits list.
+        features_file (str): path of the uniprot_features.tsv file.
+        hit_files (list): paths of the hit lists of each search.
+        blast_results_files (list): paths of the BLAST results files.
+        blast_mapping_files (list): paths of the ID mapping files for the BLAST hits,
+            one per BLAST results file.
+        foldseek_results_files (list): paths of the Foldseek results files (.m8).
+        max_structures (int): maximum number of hits to keep. If None, keeps all of the hits.
+        scores_file (str): optional path of a TSV file in which to write the scores of all hits.
+        blast_column_names (list): names of the columns of the BLAST results.
+    Returns:
+        a pandas.DataFrame of the scores of the hits that were kept.
+    """
+    if blast_column_names is None:
+        blast_column_names = constants.BLAST_OUTPUT_FIELDS
+
+    evalues = []
+    if blast_results_files:
+        evalues.append(
+            read_blast_evalues(blast_results_files, blast_mapping_files or [], blast_column_names)
+        )
+    if foldseek_results_files:
+        evalues.append(read_foldseek_evalues(foldseek_results_files))
+
+    features_df = read_features(
+        features_file, parse_lineage_column=False, columns=["protid", "Annotation"]
+    )
+    scores_df = score_hits(list(read_id_list(input_file)), features_df, hit_files, evalues)
+
+    if scores_file:
+        scores_df.to_csv(scores_file, sep="\t", index=False)
+
+    scores_df = scores_df.iloc[:max_structures]
+    write_id_list(scores_df["protid"], output_file)
+
+    return scores_df
+
+
+# run this if called from the interpreter
+def main():
+    args = parse_args()
+    blast_column_names = [name for name in args.blast_format_string.split(" ") if name != "6"]
+    rank_hits(
+        args.input,
+        args.output,
+        args.features,
+        args.hit_files,
+        blast_results_files=args.blast_results,
+        blast_mapping_files=args.blast_mappings,
+        foldseek_results_files=args.foldseek_results,
+        max_structures=args.max_structures,
+        scores_file=args.scores_output,
+        blast_column_names=blast_column_names,
+    )
+
+
+# check if called from interpreter
+if __name__ == "__main__":
+    main()
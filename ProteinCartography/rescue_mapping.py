@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import argparse
 
+from hit_funnel import read_id_list, unique_in_order, write_id_list
+
 # only import these functions when using import *
 __all__ = ["rescue_mapping"]
 
@@ -17,23 +19,14 @@ def parse_args():
 
 def rescue_mapping(input_file: str, output_file: str):
     """
-    Takes an input file with accessions that may not be unique, and makes them unique.
+    Takes an input file with accessions that may not be unique, and makes them unique,
+    keeping the first occurrence of each accession.
 
     Args:
         input_file (str): path of input text file with one accession per line
         output_file (str): path of destination file to write sanitized accessions
     """
-
-    # read the file
-    with open(input_file) as f:
-        text = [i.rstrip("\n") for i in f.readlines()]
-
-    # unique-ify it
-    unique = set(text)
-
-    # save that set
-    with open(output_file, "w+") as f:
-        f.writelines([i + "\n" for i in unique])
+    write_id_list(unique_in_order(read_id_list(input_file)), output_file)
 
 
 # run this if called from the interpreter
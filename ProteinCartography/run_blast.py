@@ -2,8 +2,10 @@
 import argparse
 import os
 import sys
+import tempfile
 
 import blast_utils
+import cache_utils
 import constants
 from tests import mocks
 
@@ -19,11 +21,20 @@ def parse_args():
     following the nomenclature of the `blastp` CLI
     """
     parser = argparse.ArgumentParser()
-    parser.add_argument("--query", required=True, help="path to the input peptide FASTA file.")
+    parser.add_argument(
+        "--query",
+        required=True,
+        nargs="+",
+        help=(
+            "path to the input peptide FASTA file. If more than one path is given, all of the "
+            "queries are searched with a single call to blastp."
+        ),
+    )
     parser.add_argument(
         "--out",
         required=True,
-        help="path to the blastresults.tsv file generated by blastp.",
+        nargs="+",
+        help="path to the blastresults.tsv file generated by blastp (one per query file).",
     )
     parser.add_argument(
         "--outfmt",
@@ -58,33 +69,86 @@ def parse_args():
         type=float,
         required=True,
     )
+    parser.add_argument(
+        "--backend",
+        default=blast_utils.REMOTE_BACKEND,
+        choices=[blast_utils.REMOTE_BACKEND, blast_utils.LOCAL_BACKEND],
+        help="whether to search the remote NCBI database or a local database.",
+    )
+    parser.add_argument(
+        "--db",
+        default=blast_utils.REMOTE_DATABASE,
+        help="the name of the remote database, or the path to the local database.",
+    )
+    parser.add_argument(
+        "--num_threads",
+        type=int,
+        default=1,
+        help="the number of threads to use (only used by the local backend).",
+    )
+    parser.add_argument(
+        "--aligner",
+        default=blast_utils.BLASTP_ALIGNER,
+        choices=[blast_utils.BLASTP_ALIGNER, blast_utils.DIAMOND_ALIGNER],
+        help="the aligner to use with the local backend.",
+    )
+    # note: this CLI option requires `nargs="?"` because it is passed without a value
+    # by the `run_blast` rule when caching is disabled
+    parser.add_argument(
+        "--cache-dir",
+        nargs="?",
+        help="Directory in which to cache the results. If not provided, caching is disabled.",
+    )
+    parser.add_argument(
+        "--cache-ttl-days",
+        type=float,
+        help="Maximum age of cached results in days. If not provided, results never expire.",
+    )
+    parser.add_argument(
+        "--cache-max-size-gb",
+        type=float,
+        help="Maximum size of the results cache in GB. If not provided, the size is unbounded.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore any cached results and re-run the search (the new results are still cached).",
+    )
     args = parser.parse_args()
 
     return args
 
 
-def main():
-    args = parse_args()
+def run_blast_with_backoff(query: str, out: str, args):
+    """
+    Call `blast_utils.run_blast`, retrying with the backoff word size if the first call fails
 
+    Returns:
+        the word size used by the successful call.
+    """
     num_tries = 0
     max_num_tries = args.num_attempts
     while num_tries < max_num_tries:
         word_size = args.word_size if num_tries == 0 else args.word_size_backoff
 
         print(
-            f"Attempt {num_tries + 1}/{max_num_tries} to call blastp "
+            f"Attempt {num_tries + 1}/{max_num_tries} to call {args.aligner} "
             f"(using word size of {word_size})"
         )
         result = blast_utils.run_blast(
-            query=args.query,
-            out=args.out,
+            query=query,
+            out=out,
             max_target_seqs=args.max_target_seqs,
             outfmt=args.outfmt,
             word_size=word_size,
             evalue=args.evalue,
+            backend=args.backend,
+            db=args.db,
+            num_threads=args.num_threads,
+            aligner=args.aligner,
         )
         if result.returncode == 0:
-            sys.exit(0)
+            return word_size
         else:
             num_tries += 1
 
@@ -94,5 +158,95 @@ def main():
         )
 
 
+def make_cache_key(cache: cache_utils.ResultCache, query: str, word_size: int, args):
+    """
+    Construct the cache key for the results of searching the sequence(s) in a query file.
+    The sequence IDs are part of the key because they are the qseqids in the cached results.
+    """
+    return cache.make_key(
+        cache_utils.hash_string(blast_utils.read_query_sequences(query)),
+        blast_utils.read_query_seqids(query),
+        args.db,
+        args.aligner,
+        args.evalue,
+        word_size,
+        args.max_target_seqs,
+        args.outfmt,
+    )
+
+
+def fetch_cached_results(cache: cache_utils.ResultCache, query: str, out: str, args) -> bool:
+    """
+    Copy the cached results for a query to `out`, if this search has been run before.
+    Results obtained with the backoff word size are also used, because they are what a new search
+    would return if the search with the initial word size failed.
+    """
+    for word_size in dict.fromkeys([args.word_size, args.word_size_backoff]):
+        if cache.fetch(make_cache_key(cache, query, word_size, args), out):
+            print(f"Using cached BLAST results for {query} (word size of {word_size}).")
+            return True
+    return False
+
+
+def main():
+    args = parse_args()
+
+    if len(args.query) != len(args.out):
+        sys.exit("The number of output files must match the number of query files.")
+
+    # note: only the results from the remote backend are cached,
+    # because a local database can be updated in place without changing its path
+    cache = None
+    if args.backend == blast_utils.REMOTE_BACKEND:
+        cache = cache_utils.make_result_cache(
+            args.cache_dir,
+            "blast",
+            suffix=".tsv",
+            ttl_days=args.cache_ttl_days,
+            max_size_gb=args.cache_max_size_gb,
+        )
+
+    queries, outs = [], []
+    for query, out in zip(args.query, args.out):
+        if cache is not None and not args.refresh and fetch_cached_results(cache, query, out, args):
+            continue
+        queries.append(query)
+        outs.append(out)
+
+    if not queries:
+        return
+
+    # the queries whose results are cached after the search
+    cached_queries = list(zip(queries, outs))
+
+    if len(queries) == 1:
+        word_size = run_blast_with_backoff(queries[0], outs[0], args)
+    else:
+        # search all of the queries with a single call to the aligner,
+        # then split the combined results into one results file per query
+        with tempfile.TemporaryDirectory() as temp_dirpath:
+            combined_query = os.path.join(temp_dirpath, "queries.fasta")
+            combined_out = os.path.join(temp_dirpath, "blast_results.tsv")
+
+            query_aliases = blast_utils.concatenate_queries(queries, combined_query)
+            word_size = run_blast_with_backoff(combined_query, combined_out, args)
+            blast_utils.split_results_by_query(combined_out, outs, query_aliases)
+
+            # the results are not cached if the sequence IDs had to be replaced,
+            # because their qseqids do not match the sequence IDs in the cache key
+            cached_queries = [
+                (query, out)
+                for ind, (query, out) in enumerate(cached_queries)
+                if all(
+                    query_aliases.get(seqid) == ind
+                    for seqid in blast_utils.read_query_seqids(query)
+                )
+            ]
+
+    if cache is not None:
+        for query, out in cached_queries:
+            cache.put(make_cache_key(cache, query, word_size, args), out)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+# only import these functions when using import *
+__all__ = ["read_request_traces", "summarize_request_traces"]
+
+# the percentiles of the latencies and queue waits to report
+PERCENTILES = [0.5, 0.95, 0.99]
+
+
+# parse command line arguments
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Summarize the request traces written by `api_utils` "
+            "(when the `trace_requests` option is set) by host and endpoint."
+        )
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        nargs="+",
+        required=True,
+        help="Paths to the trace files (.jsonl), or to directories of trace files.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Path of the output TSV file. If not provided, the summary is printed.",
+    )
+    parser.add_argument(
+        "--by-path",
+        action="store_true",
+        help="Summarize each endpoint (i.e. method and path template) of each host separately.",
+    )
+    args = parser.parse_args()
+    return args
+
+
+def read_request_traces(inputs: list) -> pd.DataFrame:
+    """
+    Reads the request traces from a list of trace files and/or directories of trace files.
+
+    Returns:
+        a pandas.DataFrame with one row per request.
+    """
+    filepaths = []
+    for input_path in map(Path, inputs):
+        if input_path.is_dir():
+            filepaths.extend(sorted(input_path.glob("*.jsonl")))
+        else:
+            filepaths.append(input_path)
+
+    dfs = [pd.read_json(filepath, lines=True) for filepath in filepaths]
+    dfs = [df for df in dfs if not df.empty]
+    if not dfs:
+        return pd.DataFrame()
+
+    return pd.concat(dfs, ignore_index=True)
+
+
+def summarize_request_traces(inputs: list, output_file=None, by_path=False) -> pd.DataFrame:
+    """
+    Summarizes the request traces by host (and, optionally, by endpoint):
+    the number of requests, failures and retries, the number of bytes received,
+    and the percentiles of the latencies and of the time spent waiting for the rate limiter.
+
+    Args:
+        inputs (list): paths to the trace files (.jsonl), or to directories of trace files.
+        output_file (str): path of the output TSV file.
+        by_path (bool): whether to summarize each endpoint of each host separately.
+    Returns:
+        a pandas.DataFrame of the summary, sorted by the total latency (slowest first).
+    """
+    traces_df = read_request_traces(inputs)
+    if traces_df.empty:
+        print("No requests were traced.")
+        return traces_df
+
+    traces_df["failed"] = traces_df["status"].isna() | (traces_df["status"] >= 400)
+    group_columns = ["host", "method", "path"] if by_path else ["host"]
+    grouped = traces_df.groupby(group_columns)
+
+    summary_df = grouped.agg(
+        requests=("latency", "size"),
+        failures=("failed", "sum"),
+        retries=("retries", "sum"),
+        bytes=("bytes", "sum"),
+        latency_total=("latency", "sum"),
+    )
+    for column in ["latency", "queue_wait"]:
+        percentiles_df = grouped[column].quantile(PERCENTILES).unstack()
+        percentiles_df.columns = [f"{column}_p{round(p * 100)}" for p in PERCENTILES]
+        summary_df = summary_df.join(percentiles_df)
+
+    summary_df = summary_df.sort_values("latency_total", ascending=False).reset_index()
+
+    if output_file is not None:
+        summary_df.to_csv(output_file, sep="\t", index=None, float_format="%.3f")
+    else:
+        print(summary_df.to_string(index=False, float_format="%.3f"))
+
+    return summary_df
+
+
+# run this if called from the interpreter
+def main():
+    args = parse_args()
+    summarize_request_traces(args.input, args.output, by_path=args.by_path)
+
+
+# check if called from interpreter
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,26 @@ ARTIFACTS_DIRPATH = (
 
 API_RESPONSE_ARTIFACTS_DIRPATH = ARTIFACTS_DIRPATH / "api_response_content"
 
+# the results of the UniProt ID mapping API for the BLAST hits in the test artifacts
+# note: these results are manually aggregated from the results of real API calls
+# to both of the default databases ["EMBL-GenBank-DDBJ_CDS", "RefSeq_Protein"]
+ID_MAPPING_RESULTS = [
+    {"from": "XP_007129366", "to": "A0A2Y9FRR4"},
+    {"from": "NP_001009784", "to": "P60713"},
+    {"from": "NP_001009784", "to": "D7RIF5"},
+    {"from": "XP_026547382", "to": "A0A6J1VWC1"},
+    {"from": "KAF0882893", "to": "A0A6G1B5T4"},
+    {"from": "NWI03924", "to": "A0A850ZFV5"},
+    {"from": "TEA41296", "to": "A0A484H1H1"},
+    {"from": "AAS55927", "to": "Q6QAQ1"},
+    {"from": "KAF6447643", "to": "A0A7J8FIQ0"},
+    {"from": "KAF6447654", "to": "A0A7J8FIS9"},
+    {"from": "RLW01512", "to": "A0A3L8SFX2"},
+    {"from": "KAF6480625", "to": "A0A7J8I8Z0"},
+    {"from": "BAD96645", "to": "Q53GK6"},
+    {"from": "KAF6081813", "to": "A0A833YM98"},
+]
+
 
 def mock_run_blast():
     """
@@ -94,7 +114,12 @@ def mock_response(method, url, **_):
         return mock_foldseek_api_responses(method, url)
 
     # requests to the UniProtKB REST API
-    elif url.startswith("https://rest.uniprot.org/uniprotkb/search"):
+    elif url.startswith(
+        (
+            "https://rest.uniprot.org/uniprotkb/search",
+            "https://rest.uniprot.org/uniprotkb/accessions",
+        )
+    ):
         return mock_uniprotkb_rest_api_responses()
 
     # requests to the alphafold API
@@ -113,6 +138,9 @@ def mock_uniprot_id_mapping_api_responses(method, url):
     mock_response = mock.Mock(spec=requests.Response)
     mock_response.status_code = 200
 
+    # there is only ever one page of results
+    mock_response.links = {}
+
     job_id = "0"
     payload = {}
 
@@ -121,32 +149,14 @@ def mock_uniprot_id_mapping_api_responses(method, url):
         payload = {"jobId": job_id}
 
     # the polling request
-    # ('success' is defined by the presence of a 'results' key in the response)
+    # (when the job is finished, the real API redirects to the results,
+    # so 'success' is defined by the absence of a pending 'jobStatus' in the response)
     elif url.endswith(f"status/{job_id}"):
         payload = {"results": None}
 
-    # the request to get the results
-    # note: this payload is manually aggregated from the results of real API calls
-    # to both of the default databases ["EMBL-GenBank-DDBJ_CDS", "RefSeq_Protein"]
-    elif url.endswith(f"stream/{job_id}"):
-        payload = {
-            "results": [
-                {"from": "XP_007129366", "to": "A0A2Y9FRR4"},
-                {"from": "NP_001009784", "to": "P60713"},
-                {"from": "NP_001009784", "to": "D7RIF5"},
-                {"from": "XP_026547382", "to": "A0A6J1VWC1"},
-                {"from": "KAF0882893", "to": "A0A6G1B5T4"},
-                {"from": "NWI03924", "to": "A0A850ZFV5"},
-                {"from": "TEA41296", "to": "A0A484H1H1"},
-                {"from": "AAS55927", "to": "Q6QAQ1"},
-                {"from": "KAF6447643", "to": "A0A7J8FIQ0"},
-                {"from": "KAF6447654", "to": "A0A7J8FIS9"},
-                {"from": "RLW01512", "to": "A0A3L8SFX2"},
-                {"from": "KAF6480625", "to": "A0A7J8I8Z0"},
-                {"from": "BAD96645", "to": "Q53GK6"},
-                {"from": "KAF6081813", "to": "A0A833YM98"},
-            ]
-        }
+    # the request to get the results (either all at once or one page at a time)
+    elif url.endswith(f"stream/{job_id}") or url.endswith(f"results/{job_id}"):
+        payload = {"results": ID_MAPPING_RESULTS}
 
     else:
         raise ValueError(f"Unexpected url: {url}")
@@ -172,7 +182,7 @@ def mock_foldseek_api_responses(method, url):
         mock_response.json.return_value = {"id": job_id, "status": "COMPLETE"}
 
     # the polling request
-    # (this request is made even if the response to the initial POST request is "COMPLETE")
+    # (this request is not made if the response to the initial POST request is "COMPLETE")
     elif url.endswith(f"api/ticket/{job_id}"):
         mock_response.json.return_value = {"id": job_id, "status": "COMPLETE"}
 
@@ -205,7 +215,7 @@ def mock_uniprotkb_rest_api_responses():
     mock_response.status_code = 200
 
     # define an empty header, specifically one without a 'Link' key
-    # to prevent `fetch_uniprot_metadata.query_uniprot` from requesting a second batch of results
+    # to prevent `fetch_uniprot_metadata.query_uniprot` from requesting a second page of results
     mock_response.headers = {}
 
     with open(
@@ -0,0 +1,264 @@
+"""
+A local HTTP server that stands in for the web APIs used by the pipeline
+(AlphaFold, UniProtKB, UniProt ID mapping and Foldseek), for benchmarking the network layer
+without making real API calls.
+
+Unlike the mocks in `tests.mocks`, which patch `requests.Session.request`,
+the requests made to the stand-in server go through the real sessions, connection pools,
+retries and rate limiters in `api_utils`, so concurrency and retry behavior can be measured.
+The responses are replayed from the artifacts in `mocks.API_RESPONSE_ARTIFACTS_DIRPATH`.
+
+The server can optionally add latency to every response and inject errors
+(e.g. 429 or 503 responses with a 'Retry-After' header) at a given rate.
+
+The requests to each stand-in host are distinguished by the first segment of the path,
+so the base URL of each host is `{server.url}/{host}` (see `StandinServer.host_overrides`):
+
+    with StandinServer(latency=0.05, error_rate=0.1) as server:
+        api_utils.set_host_overrides(server.host_overrides())
+        ...
+"""
+
+import collections
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from tests.mocks import API_RESPONSE_ARTIFACTS_DIRPATH, ID_MAPPING_RESULTS
+
+ALPHAFOLD_HOST = "alphafold.ebi.ac.uk"
+UNIPROT_HOST = "rest.uniprot.org"
+FOLDSEEK_HOST = "search.foldseek.com"
+STANDIN_HOSTS = [ALPHAFOLD_HOST, UNIPROT_HOST, FOLDSEEK_HOST]
+
+ALPHAFOLD_FILES_PATH_REGEX = re.compile(r"^/files/AF-[A-Z0-9]+-F1-model_v4\.pdb$")
+
+UNIPROTKB_ARTIFACT_FILENAME = "rest.uniprot.org_uniprotkb_search"
+FOLDSEEK_RESULTS_ARTIFACT_FILENAME = "search.foldseek.com_api_result_download"
+
+
+def _make_foldseek_results_archive() -> bytes:
+    """
+    Returns a minimal Foldseek results archive (a .tar.gz file with one empty .m8 file),
+    for use when there is no artifact of a real results archive.
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        tarinfo = tarfile.TarInfo("alis_afdb50.m8")
+        tarinfo.size = 0
+        tar.addfile(tarinfo, io.BytesIO(b""))
+    return buffer.getvalue()
+
+
+class StandinServer:
+    """
+    A threaded local HTTP server that replays the API response artifacts.
+
+    Args:
+        latency (float): seconds to wait before sending each response.
+        error_rate (float): fraction of requests (between 0 and 1) that receive an error response.
+        error_statuses (tuple): the status codes of the error responses
+            (chosen at random for each injected error).
+        retry_after (int): the value, in seconds, of the 'Retry-After' header
+            of the error responses. If None, the header is omitted.
+        seed (int): seed of the random number generator used to inject errors.
+    """
+
+    def __init__(
+        self, latency=0.0, error_rate=0.0, error_statuses=(503,), retry_after=1, seed=None
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._idmapping_jobs = {}
+        self.request_counts = collections.Counter()
+        self.error_counts = collections.Counter()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def host_overrides(self) -> dict:
+        """
+        Returns the base URL of the stand-in for each host, for `api_utils.set_host_overrides`.
+        """
+        return {host: f"{self.url}/{host}" for host in STANDIN_HOSTS}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+        return False
+
+    def inject_error(self, host: str):
+        """
+        Returns the status code of the error to inject in the response, or None.
+        """
+        with self._lock:
+            self.request_counts[host] += 1
+            if self._random.random() >= self.error_rate:
+                return None
+            self.error_counts[host] += 1
+            return self._random.choice(self.error_statuses)
+
+    def respond(self, method: str, host: str, path: str, query: dict, form: dict):
+        """
+        Returns the status code, content type and content of the response to a request.
+        """
+        if host == ALPHAFOLD_HOST:
+            return self._respond_alphafold(path)
+        elif host == UNIPROT_HOST and path.startswith("/idmapping"):
+            return self._respond_idmapping(method, path, form)
+        elif host == UNIPROT_HOST and path.startswith(
+            ("/uniprotkb/search", "/uniprotkb/accessions")
+        ):
+            return self._respond_uniprotkb(query)
+        elif host == FOLDSEEK_HOST:
+            return self._respond_foldseek(method, path)
+        return 404, "text/plain", b"Not found"
+
+    def _respond_alphafold(self, path: str):
+        # the artifacts are named by the host and the path of the request
+        artifact_filepath = API_RESPONSE_ARTIFACTS_DIRPATH / (
+            ALPHAFOLD_HOST + path.replace("/", "_")
+        )
+        if not ALPHAFOLD_FILES_PATH_REGEX.match(path) or not artifact_filepath.exists():
+            return 404, "text/plain", b"Not found"
+        return 200, "chemical/x-pdb", artifact_filepath.read_bytes()
+
+    def _respond_uniprotkb(self, query: dict):
+        """
+        Returns the entries for the requested accessions (or all of the entries, for a search).
+        """
+        lines = (
+            (API_RESPONSE_ARTIFACTS_DIRPATH / UNIPROTKB_ARTIFACT_FILENAME)
+            .read_text(encoding="utf-8")
+            .splitlines()
+        )
+        if "accessions" in query:
+            accessions = set(query["accessions"][0].split(","))
+            lines = lines[:1] + [line for line in lines[1:] if line.split("\t")[0] in accessions]
+        return 200, "text/plain; format=tsv", ("\n".join(lines) + "\n").encode()
+
+    def _respond_idmapping(self, method: str, path: str, form: dict):
+        """
+        The jobs finish immediately, and their results are the `ID_MAPPING_RESULTS`
+        for the submitted IDs.
+        """
+        if method == "POST" and path == "/idmapping/run":
+            job_id = uuid.uuid4().hex
+            with self._lock:
+                self._idmapping_jobs[job_id] = set(form.get("ids", [""])[0].split(","))
+            return 200, "application/json", json.dumps({"jobId": job_id}).encode()
+
+        endpoint, _, job_id = path.removeprefix("/idmapping/").partition("/")
+        with self._lock:
+            ids = self._idmapping_jobs.get(job_id)
+        if ids is None:
+            return 404, "application/json", json.dumps({"messages": ["Unknown job"]}).encode()
+
+        if endpoint == "status":
+            payload = {"jobStatus": "FINISHED"}
+        elif endpoint in ("results", "stream"):
+            results = [result for result in ID_MAPPING_RESULTS if result["from"] in ids]
+            payload = {"results": results}
+        else:
+            return 404, "text/plain", b"Not found"
+        return 200, "application/json", json.dumps(payload).encode()
+
+    def _respond_foldseek(self, method: str, path: str):
+        """
+        The tickets are complete as soon as they are submitted.
+        """
+        if method == "POST" and path == "/api/ticket":
+            payload = {"id": uuid.uuid4().hex, "status": "COMPLETE"}
+            return 200, "application/json", json.dumps(payload).encode()
+        elif path.startswith("/api/ticket/"):
+            payload = {"id": path.rsplit("/", 1)[-1], "status": "COMPLETE"}
+            return 200, "application/json", json.dumps(payload).encode()
+        elif path.startswith("/api/result/download/"):
+            artifact_filepath = API_RESPONSE_ARTIFACTS_DIRPATH / FOLDSEEK_RESULTS_ARTIFACT_FILENAME
+            content = (
+                artifact_filepath.read_bytes()
+                if artifact_filepath.exists()
+                else _make_foldseek_results_archive()
+            )
+            return 200, "application/octet-stream", content
+        return 404, "text/plain", b"Not found"
+
+
+def _make_handler(standin_server: StandinServer):
+    class StandinRequestHandler(BaseHTTPRequestHandler):
+        # keep the connections alive, so that connection pooling can be measured
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self, method: str):
+            url = urlparse(self.path)
+            _, host, path = url.path.split("/", 2) if url.path.count("/") >= 2 else ("", "", "")
+            path = "/" + path
+
+            body = b""
+            if "Content-Length" in self.headers:
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+            form = parse_qs(body.decode(errors="replace"))
+
+            if standin_server.latency:
+                time.sleep(standin_server.latency)
+
+            error_status = standin_server.inject_error(host)
+            if error_status is not None:
+                headers = {}
+                if standin_server.retry_after is not None:
+                    headers["Retry-After"] = str(standin_server.retry_after)
+                self._send(error_status, "text/plain", b"Injected error", headers)
+                return
+
+            status, content_type, content = standin_server.respond(
+                method, host, path, parse_qs(url.query), form
+            )
+            self._send(status, content_type, content)
+
+        def _send(self, status: int, content_type: str, content: bytes, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(content)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def log_message(self, *_):
+            pass
+
+    return StandinRequestHandler
@@ -0,0 +1,51 @@
+import aggregate_features
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_join_features():
+    dfs = [
+        pd.DataFrame({"protid": ["B", "A", "B"], "Length": [200, 100, 200]}),
+        pd.DataFrame({"protid": ["C", "A"], "LeidenCluster": ["LC01", "LC02"]}),
+    ]
+
+    df = aggregate_features.join_features(dfs)
+    assert df["protid"].tolist() == ["A", "B", "C"]
+    assert df["Length"].tolist()[:2] == [100, 200]
+    assert pd.isna(df["Length"].iloc[2])
+    assert df["LeidenCluster"].fillna("").tolist() == ["LC02", "", "LC01"]
+
+    dfs.append(pd.DataFrame({"protid": ["A"], "Length": [101]}))
+    with pytest.raises(ValueError, match="'Length' is in both a.tsv and c.tsv"):
+        aggregate_features.join_features(dfs, sources=["a.tsv", "b.tsv", "c.tsv"])
+
+
+def test_apply_features_override():
+    agg_df = pd.DataFrame(
+        {
+            "protid": ["A", "B", "C"],
+            "Protein names": ["a", "b", "c"],
+            "Organism": pd.Categorical(["Homo sapiens", "Mus musculus", "Homo sapiens"]),
+            "Length": pd.array([100, 200, 300], dtype="Int64"),
+        }
+    )
+    features_override_df = pd.DataFrame(
+        {
+            "protid": ["C", "D", "A", "C"],
+            "Protein names": ["c2", "d", np.nan, "c3"],
+            "Organism": ["Danio rerio", "Danio rerio", np.nan, np.nan],
+            "Unknown": [1, 2, 3, 4],
+        }
+    )
+
+    df = aggregate_features.apply_features_override(agg_df, features_override_df)
+
+    # the matching rows are updated (the first entry of each protid is used, and missing values
+    # are ignored), the new rows are appended, and the unknown columns are ignored
+    assert df["protid"].tolist() == ["A", "B", "C", "D"]
+    assert df["Protein names"].tolist() == ["a", "b", "c2", "d"]
+    assert df["Organism"].tolist() == ["Homo sapiens", "Mus musculus", "Danio rerio", "Danio rerio"]
+    assert df["Length"].tolist()[:3] == [100, 200, 300]
+    assert pd.isna(df["Length"].iloc[3])
+    assert "Unknown" not in df.columns
@@ -0,0 +1,144 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# `api_utils` depends on bioservices
+pytest.importorskip("bioservices")
+
+import api_utils  # noqa: E402
+import summarize_request_traces  # noqa: E402
+
+
+class Handler(BaseHTTPRequestHandler):
+    # the paths of the requests that have already been throttled
+    throttled_paths = set()
+
+    def do_GET(self):
+        # throttle the first request to each '/throttled' path
+        if self.path.startswith("/throttled") and self.path not in self.throttled_paths:
+            self.throttled_paths.add(self.path)
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        found = self.path == "/ok" or self.path.startswith("/throttled")
+        body = b"ok" if found else b"missing"
+        self.send_response(200 if found else 404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_token_bucket():
+    rate_limiter = api_utils.TokenBucket(rate=20, capacity=1)
+    start_time = time.monotonic()
+    for _ in range(5):
+        with rate_limiter:
+            pass
+    # the first token is available immediately, and the others are added every 0.05 seconds
+    assert time.monotonic() - start_time >= 0.19
+
+
+def test_adaptive_rate_limiter():
+    rate_limiter = api_utils.AdaptiveRateLimiter(max_rate=100)
+    rate_limiter.throttle()
+    assert rate_limiter.rate == 50
+
+    for _ in range(10):
+        with rate_limiter:
+            pass
+    assert rate_limiter.rate == 60
+
+    # all requests are paused until the end of the 'Retry-After' time
+    rate_limiter.throttle(retry_after=1)
+    assert rate_limiter.rate == 30
+    start_time = time.monotonic()
+    rate_limiter.acquire()
+    assert time.monotonic() - start_time >= 0.95
+
+
+def test_throttled_requests_are_retried(server_url, monkeypatch):
+    monkeypatch.setattr(api_utils, "_request_metrics", api_utils.RequestMetrics())
+    rate_limiter = api_utils.AdaptiveRateLimiter(max_rate=100)
+    session = api_utils.make_session()
+    session.mount(
+        server_url,
+        api_utils.HTTPAdapterWithMetrics(
+            max_retries=api_utils.DefaultExpBackoffRetry(rate_limiter=rate_limiter)
+        ),
+    )
+
+    start_time = time.monotonic()
+    response = session.get(f"{server_url}/throttled/1")
+    assert response.status_code == 200
+    assert time.monotonic() - start_time >= 0.95
+    assert rate_limiter.rate == 50
+
+
+def test_session_is_shared_and_records_metrics(server_url):
+    session = api_utils.session_with_retry()
+    assert api_utils.session_with_retry() is session
+
+    session.get(f"{server_url}/ok")
+    session.get(f"{server_url}/missing")
+
+    metrics = api_utils.get_request_metrics().as_dict()["127.0.0.1"]
+    assert metrics["requests"] == 2
+    assert metrics["failures"] == 1
+    assert metrics["bytes"] == len(b"ok") + len(b"missing")
+    assert sum(metrics["latency_histogram"].values()) == 2
+
+
+def test_path_template():
+    assert api_utils.path_template("/idmapping/status/3b1e5a8f0c") == "/idmapping/status/{id}"
+    assert api_utils.path_template("/files/AF-P60713-F1-model_v4.pdb") == "/files/{id}"
+    assert api_utils.path_template("/foldSequence/v1/pdb/") == "/foldSequence/v1/pdb/"
+
+
+def test_summarize_request_traces(tmp_path):
+    tracer = api_utils.RequestTracer(str(tmp_path))
+    for latency in [0.1, 0.2, 0.3, 0.4]:
+        tracer.trace(
+            method="GET",
+            host="rest.uniprot.org",
+            path="/uniprotkb/accessions",
+            status=200,
+            retries=0,
+            bytes=10,
+            queue_wait=0.0,
+            latency=latency,
+        )
+    tracer.trace(
+        method="GET",
+        host="alphafold.ebi.ac.uk",
+        path="/files/{id}",
+        status=404,
+        retries=1,
+        bytes=0,
+        queue_wait=0.5,
+        latency=2.0,
+    )
+
+    summary_df = summarize_request_traces.summarize_request_traces([str(tmp_path)])
+    summary = summary_df.set_index("host")
+    assert list(summary.index) == ["alphafold.ebi.ac.uk", "rest.uniprot.org"]
+    assert summary.loc["rest.uniprot.org", "requests"] == 4
+    assert summary.loc["rest.uniprot.org", "latency_p50"] == pytest.approx(0.25)
+    assert summary.loc["alphafold.ebi.ac.uk", "failures"] == 1
+    assert summary.loc["alphafold.ebi.ac.uk", "queue_wait_p99"] == pytest.approx(0.5)
@@ -0,0 +1,186 @@
+import subprocess
+from unittest import mock
+
+import blast_utils
+import constants
+import pytest
+
+
+@pytest.fixture
+def mock_subprocess_run():
+    result = mock.Mock(spec=subprocess.CompletedProcess)
+    result.returncode = 0
+    with mock.patch("subprocess.run", return_value=result) as patched:
+        yield patched
+
+
+def test_run_blast_remote(mock_subprocess_run):
+    blast_utils.run_blast(
+        query="P60709.fasta",
+        out="P60709.blast_results.tsv",
+        max_target_seqs=3000,
+        outfmt=constants.BLAST_OUTFMT,
+        word_size=5,
+        evalue=1.0,
+    )
+    args = mock_subprocess_run.call_args.args[0]
+    assert args[0] == "blastp"
+    assert "-remote" in args
+    assert "-num_threads" not in args
+    assert args[args.index("-db") + 1] == "nr"
+    # the outfmt is passed as a single argument, without any shell quoting
+    assert args[args.index("-outfmt") + 1] == constants.BLAST_OUTFMT
+
+
+def test_run_blast_local(mock_subprocess_run):
+    blast_utils.run_blast(
+        query="P60709.fasta",
+        out="P60709.blast_results.tsv",
+        max_target_seqs=3000,
+        outfmt=constants.BLAST_OUTFMT,
+        word_size=5,
+        evalue=1.0,
+        backend="local",
+        db="/data/blast/nr",
+        num_threads=8,
+    )
+    args = mock_subprocess_run.call_args.args[0]
+    assert "-remote" not in args
+    assert args[args.index("-db") + 1] == "/data/blast/nr"
+    assert args[args.index("-num_threads") + 1] == "8"
+
+
+def test_run_blast_diamond_output_has_blast_columns(tmp_path, mock_subprocess_run):
+    out = tmp_path / "P60709.blast_results.tsv"
+
+    def write_diamond_output(args, **_):
+        out.write_text(
+            "\t".join(
+                [
+                    "sp|P60709|ACTB_HUMAN",
+                    "XP_052610122.1",
+                    "100.0",
+                    "375",
+                    "0",
+                    "0",
+                    "1",
+                    "375",
+                    "46",
+                    "420",
+                    "0.0",
+                    "787",
+                ]
+            )
+            + "\n"
+        )
+        return mock_subprocess_run.return_value
+
+    mock_subprocess_run.side_effect = write_diamond_output
+    blast_utils.run_blast(
+        query="P60709.fasta",
+        out=str(out),
+        max_target_seqs=3000,
+        outfmt=constants.BLAST_OUTFMT,
+        word_size=5,
+        evalue=1.0,
+        backend="local",
+        db="/data/diamond/nr.dmnd",
+        num_threads=8,
+        aligner="diamond",
+    )
+
+    args = mock_subprocess_run.call_args.args[0]
+    assert args[:2] == ["diamond", "blastp"]
+    # the accession and taxonomy fields are not requested from DIAMOND
+    assert not {"sacc", "sgi", "staxids", "scomnames", "sscinames"} & set(args)
+
+    row = dict(zip(constants.BLAST_OUTPUT_FIELDS, out.read_text().strip().split("\t")))
+    assert row["sacc"] == "XP_052610122"
+    assert row["saccver"] == "XP_052610122.1"
+    assert row["sgi"] == "0"
+    assert row["staxids"] == "0"
+    assert row["scomnames"] == "N/A"
+
+
+@pytest.mark.parametrize(
+    "sseqid, expected",
+    [
+        ("XP_052610122.1", ("XP_052610122", "XP_052610122.1", "0")),
+        ("P60709", ("P60709", "P60709", "0")),
+        ("sp|P60709|ACTB_HUMAN", ("P60709", "P60709", "0")),
+        ("sp|P60709.1|ACTB_HUMAN", ("P60709", "P60709.1", "0")),
+        ("ref|XP_052610122.1|", ("XP_052610122", "XP_052610122.1", "0")),
+        ("gi|1234|ref|XP_052610122.1|", ("XP_052610122", "XP_052610122.1", "1234")),
+    ],
+)
+def test_parse_sseqid(sseqid, expected):
+    assert blast_utils._parse_sseqid(sseqid) == expected
+
+
+def test_run_blast_diamond_requires_local_backend(mock_subprocess_run):
+    with pytest.raises(ValueError):
+        blast_utils.run_blast(
+            query="P60709.fasta",
+            out="P60709.blast_results.tsv",
+            max_target_seqs=3000,
+            outfmt=constants.BLAST_OUTFMT,
+            word_size=5,
+            evalue=1.0,
+            aligner="diamond",
+        )
+
+
+def test_concatenate_queries_and_split_results(tmp_path):
+    query_files = []
+    for protid, defline in [("P60709", "sp|P60709|ACTB_HUMAN Actin"), ("Q9Y6W5", "Q9Y6W5")]:
+        query_file = tmp_path / f"{protid}.fasta"
+        query_file.write_text(f">{defline}\nMDDDIAALVV\nDNGSGMCKAG\n")
+        query_files.append(str(query_file))
+
+    combined_query = tmp_path / "queries.fasta"
+    query_aliases = blast_utils.concatenate_queries(query_files, str(combined_query))
+
+    # the deflines are unique, so they should be left unchanged
+    assert combined_query.read_text().count(">") == 2
+    assert ">sp|P60709|ACTB_HUMAN Actin\n" in combined_query.read_text()
+
+    combined_out = tmp_path / "blast_results.tsv"
+    combined_out.write_text(
+        "sp|P60709|ACTB_HUMAN\tref|XP_052610122.1|\n"
+        "Query_2\tref|XP_050640040.1|\n"
+        "sp|P60709|ACTB_HUMAN\temb|CAI5791831.1|\n"
+    )
+    out_files = [str(tmp_path / "P60709.blast_results.tsv"), str(tmp_path / "Q9Y6W5.tsv")]
+    blast_utils.split_results_by_query(str(combined_out), out_files, query_aliases)
+
+    with open(out_files[0]) as file:
+        assert len(file.readlines()) == 2
+    with open(out_files[1]) as file:
+        assert file.read() == "Query_2\tref|XP_050640040.1|\n"
+
+
+def test_concatenate_queries_with_duplicate_ids(tmp_path):
+    query_files = []
+    for protid in ["P60709", "P60710"]:
+        query_file = tmp_path / f"{protid}.fasta"
+        query_file.write_text(">query\nMDDDIAALVV\n")
+        query_files.append(str(query_file))
+
+    combined_query = tmp_path / "queries.fasta"
+    query_aliases = blast_utils.concatenate_queries(query_files, str(combined_query))
+
+    # duplicate IDs should be replaced by the query filenames
+    assert query_aliases["P60709"] == 0
+    assert query_aliases["P60710"] == 1
+
+
+def test_read_query_sequences_ignores_deflines(tmp_path):
+    query_file = tmp_path / "P60709.fasta"
+    query_file.write_text(">sp|P60709|ACTB_HUMAN\nMDDDIAALVV\ndngsgmckag\n")
+    other_query_file = tmp_path / "other.fasta"
+    other_query_file.write_text(">query\nMDDDIAALVVDNGSGMCKAG\n")
+
+    assert blast_utils.read_query_sequences(str(query_file)) == "MDDDIAALVVDNGSGMCKAG"
+    assert blast_utils.read_query_sequences(str(query_file)) == blast_utils.read_query_sequences(
+        str(other_query_file)
+    )
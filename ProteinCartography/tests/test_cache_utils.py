@@ -0,0 +1,57 @@
+import os
+import time
+
+import cache_utils
+import pytest
+
+
+@pytest.fixture
+def result_file(tmp_path):
+    filepath = tmp_path / "result.tar.gz"
+    filepath.write_bytes(b"0" * 100)
+    return filepath
+
+
+def test_result_cache_hit_and_miss(tmp_path, result_file):
+    cache = cache_utils.ResultCache(tmp_path / "cache", suffix=".tar.gz")
+    key = cache.make_key("pdb-hash", ["afdb50", "afdb-swissprot"], "3diaa", "server")
+
+    output_file = tmp_path / "output" / "result.tar.gz"
+    assert not cache.fetch(key, str(output_file))
+
+    cache.put(key, str(result_file))
+    assert cache.fetch(key, str(output_file))
+    assert output_file.read_bytes() == result_file.read_bytes()
+
+    # a different set of parameters should miss
+    other_key = cache.make_key("pdb-hash", ["afdb50"], "3diaa", "server")
+    assert cache.get(other_key) is None
+
+
+def test_result_cache_expires_old_entries(tmp_path, result_file):
+    cache = cache_utils.ResultCache(tmp_path / "cache", ttl_seconds=60)
+    cache.put("key", str(result_file))
+
+    # backdate the entry so that it is older than the ttl
+    path = cache.get("key")
+    old_time = time.time() - 120
+    os.utime(path, (old_time, old_time))
+
+    assert cache.get("key") is None
+    assert not path.exists()
+
+
+def test_result_cache_evicts_least_recently_used_entries(tmp_path, result_file):
+    cache = cache_utils.ResultCache(tmp_path / "cache", max_size_bytes=250)
+    for ind, key in enumerate(["first", "second"]):
+        cache.put(key, str(result_file))
+        # set distinct access times so that the eviction order is deterministic
+        os.utime(cache.get(key), (ind, time.time()))
+
+    # accessing the first entry makes the second entry the least-recently-used one
+    cache.get("first")
+    cache.put("third", str(result_file))
+
+    assert cache.get("first") is not None
+    assert cache.get("second") is None
+    assert cache.get("third") is not None
@@ -0,0 +1,58 @@
+import pytest
+
+# `esmfold_apiquery` depends on bioservices (via `api_utils`)
+pytest.importorskip("bioservices")
+
+import esmfold_apiquery  # noqa: E402
+
+
+@pytest.fixture
+def fasta_filepath(tmp_path):
+    filepath = tmp_path / "inputs.fasta"
+    filepath.write_text(">P60713\nMDDDIAAL\n>Q6QAQ1\nMDDDIAAL\n>P68135\nMCDEEVAA\n")
+    return filepath
+
+
+def test_esmfold_batch_precomputed(tmp_path, fasta_filepath):
+    precomputed_dirpath = tmp_path / "precomputed"
+    precomputed_dirpath.mkdir()
+    (precomputed_dirpath / "P60713.pdb").write_text("P60713")
+
+    records = esmfold_apiquery.read_fasta_records(
+        [str(fasta_filepath)], output_dir=str(tmp_path / "pdbs")
+    )
+    esmfold_apiquery.esmfold_batch(
+        records,
+        predictor=esmfold_apiquery.PRECOMPUTED_PREDICTOR,
+        precomputed_dir=str(precomputed_dirpath),
+    )
+
+    # the identical sequences share a structure, and the missing structure is skipped
+    assert (tmp_path / "pdbs" / "P60713.pdb").read_text() == "P60713"
+    assert (tmp_path / "pdbs" / "Q6QAQ1.pdb").read_text() == "P60713"
+    assert not (tmp_path / "pdbs" / "P68135.pdb").exists()
+
+
+def test_esmfold_batch_uses_cache(tmp_path, fasta_filepath, monkeypatch):
+    predicted_sequences = []
+
+    def post_esmfold_apiquery(sequence, **_):
+        predicted_sequences.append(sequence)
+        return sequence
+
+    monkeypatch.setattr(esmfold_apiquery, "post_esmfold_apiquery", post_esmfold_apiquery)
+
+    for output_dirname in ["first", "second"]:
+        records = esmfold_apiquery.read_fasta_records(
+            [str(fasta_filepath)], output_dir=str(tmp_path / output_dirname)
+        )
+        esmfold_apiquery.esmfold_batch(
+            records,
+            predictor=esmfold_apiquery.LOCAL_PREDICTOR,
+            cache_dir=str(tmp_path / "cache"),
+        )
+        assert (tmp_path / output_dirname / "Q6QAQ1.pdb").read_text() == "MDDDIAAL"
+        assert (tmp_path / output_dirname / "P68135.pdb").read_text() == "MCDEEVAA"
+
+    # each distinct sequence is only predicted once
+    assert sorted(predicted_sequences) == ["MCDEEVAA", "MDDDIAAL"]
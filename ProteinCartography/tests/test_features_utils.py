@@ -0,0 +1,80 @@
+import features_utils
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def features_df():
+    return pd.DataFrame(
+        {
+            "protid": ["P60713", "Q6QAQ1", "A0A2Y9FRR4"],
+            "Organism": ["Ovis aries", "Sus scrofa", None],
+            "Annotation": [5.0, 5.0, 1.0],
+            "Length": [375, 375, 376],
+            "Lineage": [["Eukaryota", "Metazoa"], ["Eukaryota", "Metazoa"], None],
+        }
+    )
+
+
+def test_read_features_from_tsv(tmp_path, features_df):
+    filepath = tmp_path / "features.tsv"
+    features_df.to_csv(filepath, sep="\t", index=None)
+
+    df = features_utils.read_features(str(filepath))
+    assert isinstance(df["Organism"].dtype, pd.CategoricalDtype)
+    assert isinstance(df["Annotation"].dtype, pd.CategoricalDtype)
+    assert df["Length"].dtype == "Int64"
+    assert df["Lineage"].iloc[0] == ["Eukaryota", "Metazoa"]
+    assert df["Lineage"].isna().iloc[2]
+
+    df = features_utils.read_features(str(filepath), parse_lineage_column=False)
+    assert df["Lineage"].iloc[0] == "['Eukaryota', 'Metazoa']"
+
+
+def test_write_features_round_trip(tmp_path, features_df):
+    pytest.importorskip("pyarrow")
+
+    filepath = tmp_path / "features.tsv"
+    features_utils.write_features(features_df, str(filepath))
+    assert (tmp_path / "features.tsv.parquet").exists()
+
+    # the TSV file is unchanged, and the typed file is read instead of it
+    assert pd.read_csv(filepath, sep="\t")["Lineage"].iloc[0] == "['Eukaryota', 'Metazoa']"
+    df = features_utils.read_features(str(filepath))
+    assert isinstance(df["Organism"].dtype, pd.CategoricalDtype)
+    assert df["Length"].dtype == "Int64"
+    assert df["Lineage"].iloc[0] == ["Eukaryota", "Metazoa"]
+    assert df["Lineage"].isna().iloc[2]
+
+    df = features_utils.read_features(str(filepath), parse_lineage_column=False)
+    assert df["Lineage"].iloc[1] == "['Eukaryota', 'Metazoa']"
+
+    df = features_utils.read_features(str(filepath), columns=["protid", "Length", "Missing"])
+    assert list(df.columns) == ["protid", "Length"]
+
+
+def test_read_features_columns_from_tsv(tmp_path, features_df):
+    filepath = tmp_path / "features.tsv"
+    features_df.to_csv(filepath, sep="\t", index=None)
+
+    df = features_utils.read_features(str(filepath), columns=["Length", "protid", "Missing"])
+    assert list(df.columns) == ["protid", "Length"]
+    assert df["Length"].dtype == "Int64"
+
+
+def test_write_features_in_chunks(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    chunks = [
+        pd.DataFrame({"protid": ["P60713"], "Length": ["375"], "Lineage": [["Eukaryota"]]}),
+        pd.DataFrame({"protid": ["Q6QAQ1"], "Length": [""], "Lineage": [None]}),
+    ]
+    filepath = tmp_path / "features.tsv"
+    features_utils.write_features_in_chunks(iter(chunks), str(filepath))
+
+    assert filepath.read_text() == (
+        "protid\tLength\tLineage\nP60713\t375\t['Eukaryota']\nQ6QAQ1\t\t\n"
+    )
+    df = features_utils.read_features(str(filepath))
+    assert df["Length"].tolist() == [375, pd.NA]
+    assert df["Lineage"].iloc[0] == ["Eukaryota"]
@@ -0,0 +1,129 @@
+import os
+
+import pandas as pd
+import pytest
+
+# `api_utils` depends on bioservices, and the metadata store depends on pyarrow
+pytest.importorskip("bioservices")
+pytest.importorskip("pyarrow")
+
+import api_utils  # noqa: E402
+import fetch_uniprot_metadata  # noqa: E402
+from tests.mocks import ID_MAPPING_RESULTS  # noqa: E402
+from tests.standin_server import UNIPROT_HOST, StandinServer  # noqa: E402
+
+ACCESSIONS = sorted({result["to"] for result in ID_MAPPING_RESULTS})
+
+
+class StandinServerWithFunctions(StandinServer):
+    """
+    A stand-in server whose UniProtKB entries include the 'Function [CC]' column
+    (the column of the additional 'cc_function' field).
+    """
+
+    def _respond_uniprotkb(self, query: dict):
+        status, content_type, content = super()._respond_uniprotkb(query)
+        header, *lines = content.decode().splitlines()
+        lines = [line + "\tFunction of " + line.split("\t")[0] for line in lines]
+        return (
+            status,
+            content_type,
+            ("\n".join([f"{header}\tFunction [CC]", *lines]) + "\n").encode(),
+        )
+
+
+@pytest.fixture
+def standin_server(monkeypatch):
+    monkeypatch.setattr(api_utils, "_session", None)
+    monkeypatch.setattr(api_utils, "_rate_limiters", {})
+    monkeypatch.setattr(api_utils, "_request_metrics", api_utils.RequestMetrics())
+    monkeypatch.setattr(api_utils, "_host_overrides", {})
+    with StandinServerWithFunctions() as server:
+        api_utils.set_host_overrides(server.host_overrides())
+        yield server
+
+
+def read_sorted_features(filepath):
+    return (
+        pd.read_csv(filepath, sep="\t", dtype=str, keep_default_na=False)
+        .sort_values("protid")
+        .reset_index(drop=True)
+    )
+
+
+def test_query_uniprot_with_metadata_store_and_additional_fields(tmp_path, standin_server):
+    input_filepath = tmp_path / "accessions.txt"
+    input_filepath.write_text("\n".join(ACCESSIONS) + "\n")
+    store_dirpath = tmp_path / "store"
+    fields = fetch_uniprot_metadata.DEFAULT_FIELDS + ["cc_function"]
+
+    fetch_uniprot_metadata.query_uniprot(
+        str(input_filepath),
+        str(tmp_path / "features_1.tsv"),
+        fields=fields,
+        metadata_store=str(store_dirpath),
+        batch_size=4,
+    )
+    num_requests = standin_server.request_counts[UNIPROT_HOST]
+    assert num_requests > 0
+    assert len(os.listdir(store_dirpath)) == 1
+
+    # the second run loads all of the entries (including the additional field) from the store
+    fetch_uniprot_metadata.query_uniprot(
+        str(input_filepath),
+        str(tmp_path / "features_2.tsv"),
+        fields=fields,
+        metadata_store=str(store_dirpath),
+        batch_size=4,
+    )
+    assert standin_server.request_counts[UNIPROT_HOST] == num_requests
+    assert len(os.listdir(store_dirpath)) == 1
+
+    features_df = read_sorted_features(tmp_path / "features_2.tsv")
+    assert features_df["Function [CC]"].tolist() == [
+        f"Function of {protid}" for protid in features_df["protid"]
+    ]
+    pd.testing.assert_frame_equal(features_df, read_sorted_features(tmp_path / "features_1.tsv"))
+
+
+def test_query_uniprot_resumes_completed_batches(tmp_path, standin_server):
+    input_filepath = tmp_path / "accessions.txt"
+    input_filepath.write_text("\n".join(ACCESSIONS) + "\n")
+    output_filepath = tmp_path / "features.tsv"
+
+    batch_size = 4
+    batches = [ACCESSIONS[i : i + batch_size] for i in range(0, len(ACCESSIONS), batch_size)]
+    batch_keys = [fetch_uniprot_metadata.cache_utils.hash_string(",".join(b)) for b in batches]
+    assert len(batches) >= 3
+
+    # simulate a previous run that completed the first two batches, and was interrupted
+    # after recording the third batch in the manifest but before writing its part file
+    # (the entries of the completed batches are marked to check that they are not re-fetched)
+    parts_dirpath = tmp_path / "features.tsv.parts"
+    parts_dirpath.mkdir()
+    for batch, batch_key in zip(batches[:2], batch_keys[:2]):
+        _, _, content = standin_server._respond_uniprotkb({"accessions": [",".join(batch)]})
+        header, *lines = content.decode().splitlines()
+        lines = [line.replace("\t", "\tprevious run ", 1) for line in lines]
+        (parts_dirpath / f"part_{batch_key}.tsv").write_text("\n".join([header, *lines]) + "\n")
+    (parts_dirpath / fetch_uniprot_metadata.MANIFEST_FILENAME).write_text(
+        "".join(f"{batch_key}\t{batch_size}\n" for batch_key in batch_keys[:3])
+    )
+
+    fetch_uniprot_metadata.query_uniprot(
+        str(input_filepath), str(output_filepath), batch_size=batch_size
+    )
+
+    # only the batches without a part file are fetched (one request per batch)
+    assert standin_server.request_counts[UNIPROT_HOST] == len(batches) - 2
+    assert not parts_dirpath.exists()
+
+    features_df = pd.read_csv(output_filepath, sep="\t", dtype=str, keep_default_na=False)
+    assert not features_df["protid"].duplicated().any()
+    previous_run_protids = set(
+        features_df.loc[features_df["Entry Name"].str.startswith("previous run "), "protid"]
+    )
+    assert previous_run_protids == set(features_df["protid"]) & {
+        accession for batch in batches[:2] for accession in batch
+    }
+    assert previous_run_protids
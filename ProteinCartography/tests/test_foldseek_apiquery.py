@@ -0,0 +1,178 @@
+import json
+import subprocess
+import tarfile
+import threading
+
+import pytest
+
+# `api_utils` depends on bioservices
+pytest.importorskip("bioservices")
+
+import api_utils  # noqa: E402
+import constants  # noqa: E402
+import foldseek_apiquery  # noqa: E402
+from tests.mocks import API_RESPONSE_ARTIFACTS_DIRPATH  # noqa: E402
+from tests.standin_server import FOLDSEEK_HOST, StandinServer  # noqa: E402
+
+ALPHAFOLD_PDB_FILEPATHS = sorted(
+    API_RESPONSE_ARTIFACTS_DIRPATH.glob("alphafold.ebi.ac.uk_files_AF-*-F1-model_v4.pdb")
+)[:2]
+
+# queries containing this marker fail on the stand-in server
+FAILING_QUERY_MARKER = "FAILING QUERY"
+
+
+class StandinServerWithFailures(StandinServer):
+    """
+    A stand-in server that counts the submitted tickets, and on which the tickets
+    for queries containing `FAILING_QUERY_MARKER` are pending when they are submitted
+    and then fail when their status is polled.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.submitted_tickets = 0
+        self._failing_ticket_ids = set()
+        self._ticket_lock = threading.Lock()
+
+    def respond(self, method: str, host: str, path: str, query: dict, form: dict):
+        status, content_type, content = super().respond(method, host, path, query, form)
+        if host != FOLDSEEK_HOST:
+            return status, content_type, content
+
+        if method == "POST" and path == "/api/ticket":
+            ticket = json.loads(content)
+            with self._ticket_lock:
+                self.submitted_tickets += 1
+                if FAILING_QUERY_MARKER in form.get("q", [""])[0]:
+                    self._failing_ticket_ids.add(ticket["id"])
+                    ticket["status"] = "PENDING"
+            return status, content_type, json.dumps(ticket).encode()
+        elif path.startswith("/api/ticket/"):
+            ticket = json.loads(content)
+            with self._ticket_lock:
+                if ticket["id"] in self._failing_ticket_ids:
+                    ticket["status"] = "ERROR"
+            return status, content_type, json.dumps(ticket).encode()
+        return status, content_type, content
+
+
+@pytest.fixture
+def standin_server(monkeypatch):
+    monkeypatch.setattr(api_utils, "_session", None)
+    monkeypatch.setattr(api_utils, "_rate_limiters", {})
+    monkeypatch.setattr(api_utils, "_request_metrics", api_utils.RequestMetrics())
+    monkeypatch.setattr(api_utils, "_host_overrides", {})
+    with StandinServerWithFailures() as server:
+        api_utils.set_host_overrides(server.host_overrides())
+        yield server
+
+
+def test_foldseek_apiquery_batch_caches_results_when_a_search_fails(tmp_path, standin_server):
+    input_files = [str(filepath) for filepath in ALPHAFOLD_PDB_FILEPATHS]
+    output_files = [str(tmp_path / f"query_{ind}.tar.gz") for ind in range(len(input_files))]
+    cache_dirpath = tmp_path / "cache"
+
+    failing_input_filepath = tmp_path / "failing_query.pdb"
+    failing_input_filepath.write_text(
+        ALPHAFOLD_PDB_FILEPATHS[0].read_text() + f"REMARK {FAILING_QUERY_MARKER}\n"
+    )
+
+    with pytest.raises(SystemExit):
+        foldseek_apiquery.foldseek_apiquery_batch(
+            input_files + [str(failing_input_filepath)],
+            output_files + [str(tmp_path / "failing_query.tar.gz")],
+            mode="3diaa",
+            database=foldseek_apiquery.DEFAULT_DATABASES,
+            server=foldseek_apiquery.PUBLIC_FOLDSEEK_SERVER,
+            cache_dir=str(cache_dirpath),
+        )
+    assert standin_server.submitted_tickets == len(input_files) + 1
+
+    # the searches that completed before the failure should have been cached
+    rerun_output_files = [str(tmp_path / "rerun" / f"query_{ind}.tar.gz") for ind in range(2)]
+    foldseek_apiquery.foldseek_apiquery_batch(
+        input_files,
+        rerun_output_files,
+        mode="3diaa",
+        database=foldseek_apiquery.DEFAULT_DATABASES,
+        server=foldseek_apiquery.PUBLIC_FOLDSEEK_SERVER,
+        cache_dir=str(cache_dirpath),
+    )
+    assert standin_server.submitted_tickets == len(input_files) + 1
+    for output_file, rerun_output_file in zip(output_files, rerun_output_files):
+        with open(output_file, "rb") as file, open(rerun_output_file, "rb") as rerun_file:
+            assert file.read() == rerun_file.read()
+
+
+def test_foldseek_apiquery_uses_cache(tmp_path, standin_server):
+    input_file = str(ALPHAFOLD_PDB_FILEPATHS[0])
+    cache_dir = str(tmp_path / "cache")
+
+    def run_query(output_filename, **kwargs):
+        foldseek_apiquery.foldseek_apiquery(
+            input_file,
+            str(tmp_path / output_filename),
+            server=foldseek_apiquery.PUBLIC_FOLDSEEK_SERVER,
+            cache_dir=cache_dir,
+            **(dict(mode="3diaa", database=foldseek_apiquery.DEFAULT_DATABASES) | kwargs),
+        )
+
+    run_query("first.tar.gz")
+    assert standin_server.submitted_tickets == 1
+
+    # the same search should be served from the cache without submitting a ticket
+    run_query("second.tar.gz")
+    assert standin_server.submitted_tickets == 1
+    assert (tmp_path / "second.tar.gz").read_bytes() == (tmp_path / "first.tar.gz").read_bytes()
+
+    # searches with different databases or a different mode should miss the cache
+    run_query("other_databases.tar.gz", database=["pdb100"])
+    assert standin_server.submitted_tickets == 2
+    run_query("other_mode.tar.gz", mode="tmalign")
+    assert standin_server.submitted_tickets == 3
+
+
+def test_foldseek_local_search_fills_missing_taxonomy(tmp_path, monkeypatch):
+    """
+    The taxonomy columns should only be requested from `foldseek easy-search`
+    for databases with taxonomy, and filled with placeholders for the other databases.
+    """
+    format_outputs = {}
+
+    def fake_easy_search(args, **kwargs):
+        # write one row with the requested columns, like `foldseek easy-search` would
+        database_path, m8_filepath = args[3], args[4]
+        format_output = args[args.index("--format-output") + 1].split(",")
+        format_outputs[database_path] = format_output
+        with open(m8_filepath, "w") as file:
+            file.write("\t".join(f"{column}_value" for column in format_output) + "\n")
+        return subprocess.CompletedProcess(args, 0, b"", b"")
+
+    monkeypatch.setattr(foldseek_apiquery.subprocess, "run", fake_easy_search)
+
+    database_paths = {"afdb50": tmp_path / "afdb50", "custom": tmp_path / "custom"}
+    for database_path in database_paths.values():
+        (tmp_path / f"{database_path.name}.dbtype").touch()
+    (tmp_path / "afdb50_taxonomy").touch()
+
+    output_filepath = tmp_path / "query.tar.gz"
+    foldseek_apiquery.foldseek_local_search(
+        [str(ALPHAFOLD_PDB_FILEPATHS[0])],
+        [str(output_filepath)],
+        mode="3diaa",
+        database_paths={db: str(database_path) for db, database_path in database_paths.items()},
+    )
+
+    assert "taxid" in format_outputs[str(database_paths["afdb50"])]
+    assert "taxid" not in format_outputs[str(database_paths["custom"])]
+
+    with tarfile.open(output_filepath) as tar:
+        rows = {
+            member.name: tar.extractfile(member).read().decode().rstrip("\n").split("\t")
+            for member in tar.getmembers()
+        }
+    for row in rows.values():
+        assert len(row) == len(constants.FOLDSEEK_COLUMN_NAMES)
+    assert rows["alis_afdb50.m8"][-2:] == ["taxid_value", "taxname_value"]
+    assert rows["alis_custom.m8"][-2:] == list(foldseek_apiquery.LOCAL_TAXONOMY_FIELDS.values())
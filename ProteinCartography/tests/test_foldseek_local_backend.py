@@ -0,0 +1,60 @@
+import shutil
+import subprocess
+import tarfile
+
+import pytest
+
+# the local backend requires the foldseek binary, and `foldseek_apiquery` depends on bioservices
+# (via `api_utils`), so these tests only run in environments in which both are installed
+pytest.importorskip("bioservices")
+pytestmark = pytest.mark.skipif(shutil.which("foldseek") is None, reason="foldseek not installed")
+
+import extract_foldseek_hits  # noqa: E402
+import foldseek_apiquery  # noqa: E402
+
+
+@pytest.fixture
+def local_database(tmp_path, integration_test_artifacts_dirpath):
+    """
+    Build a tiny Foldseek database from the AlphaFold PDB files in the test artifacts,
+    named as they would be in the AlphaFold databases (e.g. 'AF-P60713-F1-model_v4')
+    """
+    api_response_dirpath = (
+        integration_test_artifacts_dirpath / "search-mode" / "actin" / "api_response_content"
+    )
+    structures_dirpath = tmp_path / "structures"
+    structures_dirpath.mkdir()
+    for filepath in api_response_dirpath.glob("alphafold.ebi.ac.uk_files_AF-*.pdb"):
+        shutil.copy(filepath, structures_dirpath / filepath.name.split("_files_")[1])
+
+    database_path = tmp_path / "database" / "afdb50"
+    database_path.parent.mkdir()
+    subprocess.run(["foldseek", "createdb", structures_dirpath, database_path], check=True)
+    return database_path
+
+
+def test_foldseek_local_search(tmp_path, integration_test_artifacts_dirpath, local_database):
+    query_filepath = integration_test_artifacts_dirpath / "search-mode" / "actin" / "input"
+    output_filepath = tmp_path / "P60709.fsresults.tar.gz"
+
+    foldseek_apiquery.foldseek_local_search(
+        [str(query_filepath / "P60709.pdb")],
+        [str(output_filepath)],
+        mode="3diaa",
+        database_paths={"afdb50": str(local_database)},
+        threads=1,
+    )
+
+    # the archive should have the same layout as the archives returned by the web API
+    m8_dirpath = tmp_path / "P60709"
+    with tarfile.open(output_filepath) as tar:
+        tar.extractall(m8_dirpath)
+    m8_filepath = m8_dirpath / "alis_afdb50.m8"
+    assert m8_filepath.exists()
+
+    hits_filepath = tmp_path / "P60709.foldseek_hits.txt"
+    extract_foldseek_hits.extract_foldseekhits([str(m8_filepath)], str(hits_filepath))
+    hits = hits_filepath.read_text().splitlines()
+
+    # the query (human beta-actin) should hit its close homolog P60713 (sheep beta-actin)
+    assert "P60713" in hits
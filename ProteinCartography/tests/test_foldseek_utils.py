@@ -0,0 +1,100 @@
+import os
+import re
+
+import constants
+import foldseek_utils
+import pandas as pd
+import pytest
+
+TARGETS = [
+    "AF-P60709-F1-model_v4 Actin, cytoplasmic 1",
+    "AF-A0A2Y9FRR4-F1-model_v4",
+    "1abc-assembly1.cif.gz_A Actin",
+    "AF-Q6QAQ1-F2-model_v4 Actin",
+    "prefix_AF-P60713-F1-model_v4 AF-X00000-F1-model_v4",
+    "AF-A-F1-model_v4-AF-B-F1-model_v4 Actin",
+    "GMGC10.000_000_000.UNKNOWN AF-P12345-F1-model_v4",
+]
+
+
+def write_m8(filepath, targets):
+    rows = []
+    for ind, target in enumerate(targets):
+        values = {name: "0" for name in constants.FOLDSEEK_COLUMN_NAMES}
+        values.update(
+            query="P60709.pdb", target=target, fident=f"0.{ind}", prob="1", evalue=f"1e-{ind}"
+        )
+        rows.append("\t".join(values[name] for name in constants.FOLDSEEK_COLUMN_NAMES))
+    filepath.write_text("".join(row + "\n" for row in rows))
+    return str(filepath)
+
+
+def baseline_protids(targets):
+    """
+    The protids extracted by the original implementation of `extract_foldseek_hits`
+    """
+    protids = []
+    for target in targets:
+        model_id = target.split(" ")[0]
+        if "-F1-model_v4" in model_id and re.findall("AF-(.*)-F1-model_v4", model_id):
+            protids.append(re.findall("AF-(.*)-F1-model_v4", model_id)[0])
+    return protids
+
+
+def test_read_m8_matches_baseline_extraction(tmp_path):
+    df = foldseek_utils.read_m8(write_m8(tmp_path / "results.m8", TARGETS), use_cache=False)
+
+    # the hits that are not AlphaFold models are dropped
+    assert df["protid"].tolist() == baseline_protids(TARGETS)
+    assert df["protid"].tolist() == ["P60709", "A0A2Y9FRR4", "P60713", "A-F1-model_v4-AF-B"]
+    assert list(df.columns) == constants.FOLDSEEK_OUT_COLUMN_NAMES
+    assert df["evalue"].tolist() == [1.0, 1e-1, 1e-4, 1e-5]
+
+
+def test_read_m8_empty_file(tmp_path):
+    filepath = tmp_path / "results.m8"
+    filepath.write_text("")
+
+    df = foldseek_utils.read_m8(str(filepath))
+    assert df.empty
+    assert list(df.columns) == constants.FOLDSEEK_OUT_COLUMN_NAMES
+    assert df["evalue"].dtype == "float64"
+    assert not os.path.exists(str(filepath) + foldseek_utils.PARQUET_SIDECAR_SUFFIX)
+
+
+def test_read_m8_chunks(tmp_path):
+    input_file = write_m8(tmp_path / "results.m8", TARGETS * 3)
+
+    expected_df = foldseek_utils.read_m8(input_file, use_cache=False)
+    for chunksize in [1, 2, 5]:
+        df = foldseek_utils.read_m8(input_file, chunksize=chunksize, use_cache=False)
+        pd.testing.assert_frame_equal(df, expected_df)
+
+
+def test_read_m8_sidecar(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    input_file = write_m8(tmp_path / "results.m8", TARGETS)
+    sidecar_filepath = input_file + foldseek_utils.PARQUET_SIDECAR_SUFFIX
+
+    df = foldseek_utils.read_m8(input_file)
+    assert os.path.exists(sidecar_filepath)
+
+    # the sidecar is reused as long as the .m8 file is unchanged
+    sidecar_mtime_ns = os.stat(sidecar_filepath).st_mtime_ns
+    pd.testing.assert_frame_equal(foldseek_utils.read_m8(input_file), df)
+    assert os.stat(sidecar_filepath).st_mtime_ns == sidecar_mtime_ns
+
+    # the sidecar is rebuilt if the .m8 file is replaced by a file with an older mtime
+    # (as when results are re-extracted with `tar -x`)
+    write_m8(tmp_path / "results.m8", TARGETS[:2])
+    os.utime(input_file, ns=(1_000_000_000, 1_000_000_000))
+    df = foldseek_utils.read_m8(input_file)
+    assert df["protid"].tolist() == ["P60709", "A0A2Y9FRR4"]
+    pd.testing.assert_frame_equal(foldseek_utils.read_m8(input_file), df)
+
+    # the sidecar is rebuilt if it is corrupt
+    with open(sidecar_filepath, "w") as file:
+        file.write("not a parquet file")
+    pd.testing.assert_frame_equal(foldseek_utils.read_m8(input_file), df)
+    pd.testing.assert_frame_equal(pd.read_parquet(sidecar_filepath), df)
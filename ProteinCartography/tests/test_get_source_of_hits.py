@@ -0,0 +1,39 @@
+import get_source_of_hits
+import pandas as pd
+
+
+def test_get_source(tmp_path):
+    input_filepath = tmp_path / "all_by_all_tmscore_pivoted.tsv"
+    pd.DataFrame(
+        {"protid": ["A", "B", "C", "D"], "A": [1.0, 0.5, 0.4, 0.3], "B": [0.5, 1.0, 0.2, 0.1]}
+    ).to_csv(input_filepath, sep="\t", index=False)
+
+    hit_files = []
+    for filename, hits in [
+        ("P1.blasthits.txt", ["A", "B"]),
+        ("P1.foldseekhits.txt", ["B", "C"]),
+        ("P2.foldseekhits.txt", ["D", "E"]),
+    ]:
+        (tmp_path / filename).write_text("\n".join(hits) + "\n")
+        hit_files.append(str(tmp_path / filename))
+
+    df = get_source_of_hits.get_source(str(input_filepath), hit_files, keyids=["P1", "P2"])
+
+    assert list(df.columns) == [
+        "protid",
+        "P1.blast",
+        "P1.foldseek",
+        "P2.foldseek",
+        "blast",
+        "foldseek",
+        "blast+foldseek",
+        "source.method",
+        "P1.hit",
+        "P2.hit",
+    ]
+    assert df["P1.blast"].tolist() == [1, 1, 0, 0]
+    assert df["foldseek"].tolist() == [0, 1, 1, 1]
+    assert df["blast+foldseek"].tolist() == [0, 2, 0, 0]
+    assert df["source.method"].tolist() == ["blast", "blast+foldseek", "foldseek", "foldseek"]
+    assert df["P1.hit"].tolist() == [1, 1, 1, 0]
+    assert df["P2.hit"].tolist() == [0, 0, 0, 1]
@@ -0,0 +1,92 @@
+import hit_funnel
+import pandas as pd
+import pytest
+
+
+def write_lines(filepath, lines):
+    filepath.write_text("".join(line + "\n" for line in lines))
+    return str(filepath)
+
+
+def test_aggregate_id_lists_keeps_first_seen_order(tmp_path):
+    input_files = [
+        write_lines(tmp_path / "a.txt", ["C", "A", "C"]),
+        write_lines(tmp_path / "b.txt", ["B", "A", "", "D"]),
+    ]
+    assert hit_funnel.aggregate_id_lists(input_files) == ["C", "A", "B", "D"]
+
+
+def test_run_hit_funnel(tmp_path):
+    input_files = [
+        write_lines(tmp_path / "blast_hits.txt", ["E", "D", "C"]),
+        write_lines(tmp_path / "foldseek_hits.txt", ["A", "B", "C"]),
+    ]
+    features_filepath = tmp_path / "uniprot_features.tsv"
+    pd.DataFrame(
+        {
+            "protid": ["A", "B", "C", "D", "E"],
+            "Protein names": ["a", "b", "c", "deleted", "e"],
+            "Annotation": [1.0, 2.0, 3.0, None, 5.0],
+            "Fragment": ["", "fragment", "", "", ""],
+            "Length": [100, 200, 300, None, 500],
+        }
+    ).to_csv(features_filepath, sep="\t", index=False)
+    output_filepath = tmp_path / "filtered_hits.txt"
+
+    hits = hit_funnel.run_hit_funnel(
+        input_files, str(features_filepath), str(output_filepath), max_length=400
+    )
+    assert hits == ["C", "A"]
+    assert output_filepath.read_text() == "C\nA\n"
+
+    # the first hits are kept
+    hits = hit_funnel.run_hit_funnel(
+        input_files, str(features_filepath), str(output_filepath), max_structures=2
+    )
+    assert hits == ["E", "C"]
+
+
+def test_filter_features_combines_predicates():
+    features_df = pd.DataFrame(
+        {
+            "protid": ["A", "B", "C", "D", "E"],
+            "Protein names": ["a", "b", "c", "d", "deleted"],
+            "Annotation": [5.0, 1.0, 3.0, 4.0, None],
+            "Fragment": ["", "", "fragment", "", ""],
+            "Reviewed": ["reviewed", "unreviewed", "reviewed", "reviewed", "unreviewed"],
+            "Organism": ["Homo sapiens (Human)", "Mus musculus (Mouse)", "", "Danio rerio", ""],
+            "Lineage": [
+                "['Eukaryota', 'Metazoa', 'Homo']",
+                "['Eukaryota', 'Metazoa', 'Mus']",
+                "['Eukaryota', 'Metazoa', 'Homo']",
+                "['Eukaryota', 'Metazoa', 'Danio']",
+                None,
+            ],
+            "Length": [100, 200, 300, 400, None],
+        }
+    )
+
+    filtered_df = hit_funnel.filter_features(features_df, include_taxa=["Metazoa"])
+    assert filtered_df["protid"].tolist() == ["A", "B", "D"]
+
+    filtered_df = hit_funnel.filter_features(
+        features_df, exclude_taxa=["Homo sapiens", "Danio"], min_length=50
+    )
+    assert filtered_df["protid"].tolist() == ["B"]
+
+    filtered_df = hit_funnel.filter_features(
+        features_df, reviewed_only=True, min_annotation_score=4, filter_fragment=False
+    )
+    assert filtered_df["protid"].tolist() == ["A", "D"]
+
+    with pytest.raises(ValueError, match="Unknown filters"):
+        hit_funnel.filter_features(features_df, min_lenght=50)
+    with pytest.raises(ValueError, match="Reviewed"):
+        hit_funnel.filter_features(features_df.drop(columns="Reviewed"), reviewed_only=True)
+
+
+def test_filter_columns():
+    assert hit_funnel.filter_columns() == ["protid", "Protein names", "Annotation", "Fragment"]
+    assert hit_funnel.filter_columns(
+        filter_inactive=False, filter_fragment=False, exclude_taxa=["Homo"], max_length=500
+    ) == ["protid", "Lineage", "Organism", "Length"]
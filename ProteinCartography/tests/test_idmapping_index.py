@@ -0,0 +1,54 @@
+import gzip
+
+import idmapping_index
+import pytest
+
+
+@pytest.fixture
+def index_filepath(tmp_path):
+    """
+    Build an index from a small excerpt of the UniProt idmapping.dat file
+    """
+    dat_filepath = tmp_path / "idmapping.dat.gz"
+    with gzip.open(dat_filepath, "wt") as file:
+        file.write(
+            "P60713\tRefSeq\tNP_001009784.1\n"
+            "P60713\tGeneID\t443040\n"
+            "D7RIF5\tRefSeq\tNP_001009784.1\n"
+            "Q6QAQ1\tEMBL-CDS\tAAS55927.1\n"
+            "Q6QAQ1\tEMBL\tAY555725\n"
+        )
+
+    filepath = tmp_path / "idmapping.sqlite"
+    idmapping_index.build_idmapping_index(
+        str(dat_filepath), str(filepath), list(idmapping_index.IDMAPPING_ID_TYPES.keys())
+    )
+    return filepath
+
+
+def test_lookup_idmapping_index(index_filepath):
+    assert set(idmapping_index.get_indexed_databases(str(index_filepath))) == {
+        "RefSeq_Protein",
+        "EMBL-GenBank-DDBJ_CDS",
+    }
+
+    results_df = idmapping_index.lookup_idmapping_index(
+        str(index_filepath),
+        ["NP_001009784", "AAS55927.1", "XP_007129366"],
+        ["RefSeq_Protein", "EMBL-GenBank-DDBJ_CDS"],
+    )
+    results = set(zip(results_df["from"], results_df["to"]))
+
+    # the versions are ignored, and the input IDs are returned unchanged
+    assert results == {
+        ("NP_001009784", "P60713"),
+        ("NP_001009784", "D7RIF5"),
+        ("AAS55927.1", "Q6QAQ1"),
+    }
+
+
+def test_lookup_idmapping_index_restricts_databases(index_filepath):
+    results_df = idmapping_index.lookup_idmapping_index(
+        str(index_filepath), ["NP_001009784", "AAS55927"], ["EMBL-GenBank-DDBJ_CDS"]
+    )
+    assert list(results_df["to"]) == ["Q6QAQ1"]
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+# `api_utils` depends on bioservices
+pytest.importorskip("bioservices")
+
+import api_utils  # noqa: E402
+import map_refseq_ids  # noqa: E402
+from tests.mocks import ID_MAPPING_RESULTS  # noqa: E402
+
+
+def test_map_refseqids_bioservices_writes_mapping(tmp_path, monkeypatch):
+    # `uniprot.mapping` returns the UniProt accessions as 'to.primaryAccession'
+    results = [
+        {"from": result["from"], "to": {"primaryAccession": result["to"]}}
+        for result in ID_MAPPING_RESULTS
+    ]
+    monkeypatch.setattr(
+        api_utils.UniProtWithExpBackoff,
+        "mapping",
+        lambda self, *args, **kwargs: {"results": results},
+    )
+
+    input_filepath = tmp_path / "refseq_ids.txt"
+    input_filepath.write_text("\n".join(result["from"] for result in ID_MAPPING_RESULTS) + "\n")
+    output_filepath = tmp_path / "uniprot_ids.txt"
+    mapping_filepath = tmp_path / "mapping.tsv"
+
+    map_refseq_ids.map_refseqids_bioservices(
+        str(input_filepath),
+        str(output_filepath),
+        ["RefSeq_Protein"],
+        mapping_file=str(mapping_filepath),
+    )
+
+    mapping_df = pd.read_csv(mapping_filepath, sep="\t")
+    assert list(mapping_df.columns) == ["from", "to"]
+    assert mapping_df.to_dict("records") == ID_MAPPING_RESULTS
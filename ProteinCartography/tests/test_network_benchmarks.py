@@ -0,0 +1,122 @@
+"""
+Offline benchmarks of the scripts that make API requests, run against the local stand-in server
+(see `tests/standin_server.py`) rather than the real APIs.
+
+Each benchmark is run without faults, and with added latency and injected 503 or 429 errors,
+and prints its duration and the request metrics for each host (use `pytest -s` to see them).
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+# `api_utils` depends on bioservices
+pytest.importorskip("bioservices")
+
+import api_utils  # noqa: E402
+import download_pdbs  # noqa: E402
+import foldseek_apiquery  # noqa: E402
+import map_refseq_ids  # noqa: E402
+from tests.mocks import API_RESPONSE_ARTIFACTS_DIRPATH, ID_MAPPING_RESULTS  # noqa: E402
+from tests.standin_server import StandinServer  # noqa: E402
+
+ALPHAFOLD_PDB_FILEPATHS = sorted(
+    API_RESPONSE_ARTIFACTS_DIRPATH.glob("alphafold.ebi.ac.uk_files_AF-*-F1-model_v4.pdb")
+)
+ALPHAFOLD_ACCESSIONS = [filepath.name.split("-")[1] for filepath in ALPHAFOLD_PDB_FILEPATHS]
+
+SERVER_PROFILES = {
+    "clean": dict(),
+    "faulty": dict(latency=0.01, error_rate=0.1, error_statuses=(503,), retry_after=1, seed=1),
+    "throttled": dict(latency=0.01, error_rate=0.1, error_statuses=(429,), retry_after=1, seed=1),
+}
+
+
+@pytest.fixture(params=list(SERVER_PROFILES))
+def standin_server(request, monkeypatch):
+    # start each benchmark with a new session, rate limiters and metrics,
+    # and restore the host overrides after each benchmark
+    monkeypatch.setattr(api_utils, "_session", None)
+    monkeypatch.setattr(api_utils, "_rate_limiters", {})
+    monkeypatch.setattr(api_utils, "_request_metrics", api_utils.RequestMetrics())
+    monkeypatch.setattr(api_utils, "_host_overrides", {})
+    with StandinServer(**SERVER_PROFILES[request.param]) as server:
+        api_utils.set_host_overrides(server.host_overrides())
+        yield server
+
+
+def report(name: str, server: StandinServer, start_time: float):
+    print(
+        f"\n{name}: {time.monotonic() - start_time:.2f}s, "
+        f"{sum(server.request_counts.values())} requests, "
+        f"{sum(server.error_counts.values())} injected errors"
+    )
+    print(json.dumps(api_utils.get_request_metrics().as_dict(), indent=2))
+
+
+def test_benchmark_download_pdbs(tmp_path, standin_server):
+    input_filepath = tmp_path / "accessions.txt"
+    input_filepath.write_text("\n".join(ALPHAFOLD_ACCESSIONS) + "\n")
+
+    # download the structures several times (to separate directories) to reuse the connections
+    start_time = time.monotonic()
+    for ind in range(5):
+        download_pdbs.download_pdbs(str(input_filepath), str(tmp_path / f"pdbs_{ind}"))
+    report("download_pdbs", standin_server, start_time)
+
+    for accession in ALPHAFOLD_ACCESSIONS:
+        assert (tmp_path / "pdbs_0" / f"{accession}.pdb").read_text().startswith("HEADER")
+
+
+def test_benchmark_fetch_uniprot_metadata(tmp_path, standin_server):
+    pytest.importorskip("pyarrow")
+    import fetch_uniprot_metadata
+
+    accessions = sorted({result["to"] for result in ID_MAPPING_RESULTS})
+    input_filepath = tmp_path / "accessions.txt"
+    input_filepath.write_text("\n".join(accessions) + "\n")
+    output_filepath = tmp_path / "features.tsv"
+
+    start_time = time.monotonic()
+    fetch_uniprot_metadata.query_uniprot(
+        str(input_filepath), str(output_filepath), batch_size=2, max_concurrent_batches=4
+    )
+    report("fetch_uniprot_metadata", standin_server, start_time)
+
+    assert "P60713" in output_filepath.read_text()
+
+
+def test_benchmark_map_refseq_ids(tmp_path, standin_server):
+    input_filepath = tmp_path / "refseq_ids.txt"
+    input_filepath.write_text("\n".join(result["from"] for result in ID_MAPPING_RESULTS) + "\n")
+    output_filepath = tmp_path / "uniprot_ids.txt"
+
+    start_time = time.monotonic()
+    map_refseq_ids.map_refseqids_rest(
+        str(input_filepath), str(output_filepath), map_refseq_ids.DEFAULT_DBS
+    )
+    report("map_refseq_ids", standin_server, start_time)
+
+    assert set(output_filepath.read_text().splitlines()) == {
+        result["to"] for result in ID_MAPPING_RESULTS
+    }
+
+
+def test_benchmark_foldseek_apiquery(tmp_path, standin_server):
+    input_files = [str(filepath) for filepath in ALPHAFOLD_PDB_FILEPATHS]
+    output_files = [str(tmp_path / f"{accession}.tar.gz") for accession in ALPHAFOLD_ACCESSIONS]
+
+    start_time = time.monotonic()
+    foldseek_apiquery.foldseek_apiquery_batch(
+        input_files,
+        output_files,
+        mode="3diaa",
+        database=foldseek_apiquery.DEFAULT_DATABASES,
+        server=foldseek_apiquery.PUBLIC_FOLDSEEK_SERVER,
+    )
+    report("foldseek_apiquery", standin_server, start_time)
+
+    for output_file in output_files:
+        assert os.path.getsize(output_file) > 0
@@ -0,0 +1,42 @@
+import constants
+import pandas as pd
+import pytest
+import rank_hits
+
+
+def test_read_blast_evalues(tmp_path):
+    blast_results_filepath = tmp_path / "P60709.blast_results.tsv"
+    pd.DataFrame(
+        {
+            column: ["XP_1", "XP_1", "XP_2", "XP_3"] if column == "sacc" else 0
+            for column in constants.BLAST_OUTPUT_FIELDS
+        }
+    ).assign(evalue=[1e-10, 1e-50, 1e-20, 1e-5]).to_csv(
+        blast_results_filepath, sep="\t", header=False, index=False
+    )
+    mapping_filepath = tmp_path / "P60709.blast_hits.mapping.tsv"
+    mapping_filepath.write_text("from\tto\nXP_1\tA\nXP_2\tA\nXP_3\tB\n")
+
+    evalues = rank_hits.read_blast_evalues(
+        [str(blast_results_filepath)], [str(mapping_filepath)], constants.BLAST_OUTPUT_FIELDS
+    )
+    assert evalues.to_dict() == pytest.approx({"A": 1e-50, "B": 1e-5})
+
+
+def test_score_hits(tmp_path):
+    hit_files = []
+    for filename, hits in [("blast_hits.txt", ["A", "B"]), ("foldseek_hits.txt", ["B", "C", "D"])]:
+        (tmp_path / filename).write_text("\n".join(hits) + "\n")
+        hit_files.append(str(tmp_path / filename))
+
+    features_df = pd.DataFrame(
+        {"protid": ["A", "B", "C", "D", "E"], "Annotation": [1.0, 2.0, 5.0, 3.0, 1.0]}
+    )
+    evalues = [pd.Series({"A": 1e-10, "B": 0.0}), pd.Series({"B": 1e-3, "C": 0.0, "D": 0.0})]
+
+    scores_df = rank_hits.score_hits(["E", "D", "C", "B", "A"], features_df, hit_files, evalues)
+
+    # 'B' has the best e-value and was found by both searches, 'C' has a higher annotation score
+    # than 'D', and 'E' has no e-value
+    assert scores_df["protid"].tolist() == ["B", "C", "D", "A", "E"]
+    assert scores_df["source_count"].tolist() == [2, 1, 1, 1, 0]
@@ -0,0 +1,104 @@
+import subprocess
+import sys
+
+import blast_utils
+import pytest
+import run_blast
+
+SEQUENCE = "MDDDIAALVVDNGSGMCKAG"
+
+
+@pytest.fixture
+def blast_calls(monkeypatch):
+    """
+    Mock `blast_utils.run_blast` to write one hit per query record (with the qseqid of the record),
+    and record the queries with which it is called
+    """
+    calls = []
+
+    def fake_run_blast(query=None, out=None, **_):
+        calls.append(query)
+        with open(out, "w") as file:
+            for seqid in blast_utils.read_query_seqids(query):
+                file.write(f"{seqid}\tXP_000001.1\t99.0\n")
+        return subprocess.CompletedProcess([], 0, "", "")
+
+    monkeypatch.setattr(blast_utils, "run_blast", fake_run_blast)
+    return calls
+
+
+def run_main(monkeypatch, queries, outs, cache_dir, *extra_args):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "run_blast.py",
+            "--query",
+            *map(str, queries),
+            "--out",
+            *map(str, outs),
+            "--max_target_seqs",
+            "10",
+            "--word_size",
+            "5",
+            "--word_size_backoff",
+            "6",
+            "--num_attempts",
+            "1",
+            "--evalue",
+            "1.0",
+            "--cache-dir",
+            str(cache_dir),
+            *extra_args,
+        ],
+    )
+    run_blast.main()
+
+
+def test_cached_results_match_the_query_seqids(tmp_path, monkeypatch, blast_calls):
+    query = tmp_path / "P60709.fasta"
+    query.write_text(f">P60709 actin\n{SEQUENCE}\n")
+    renamed_query = tmp_path / "renamed.fasta"
+    renamed_query.write_text(f">renamed actin\n{SEQUENCE}\n")
+    cache_dir = tmp_path / "cache"
+
+    run_main(monkeypatch, [query], [tmp_path / "first.tsv"], cache_dir)
+    run_main(monkeypatch, [query], [tmp_path / "second.tsv"], cache_dir)
+    assert len(blast_calls) == 1
+    assert (tmp_path / "second.tsv").read_text().startswith("P60709\t")
+
+    # the same sequence with a different sequence ID should not be served the cached qseqids
+    run_main(monkeypatch, [renamed_query], [tmp_path / "renamed.tsv"], cache_dir)
+    assert len(blast_calls) == 2
+    assert (tmp_path / "renamed.tsv").read_text().startswith("renamed\t")
+
+
+def test_refresh_ignores_cached_results(tmp_path, monkeypatch, blast_calls):
+    query = tmp_path / "P60709.fasta"
+    query.write_text(f">P60709\n{SEQUENCE}\n")
+    cache_dir = tmp_path / "cache"
+
+    run_main(monkeypatch, [query], [tmp_path / "first.tsv"], cache_dir)
+    run_main(monkeypatch, [query], [tmp_path / "second.tsv"], cache_dir, "--refresh")
+    assert len(blast_calls) == 2
+
+    # the refreshed results should still be cached
+    run_main(monkeypatch, [query], [tmp_path / "third.tsv"], cache_dir)
+    assert len(blast_calls) == 2
+
+
+def test_batch_results_are_not_cached_when_the_seqids_are_replaced(
+    tmp_path, monkeypatch, blast_calls
+):
+    # both queries have the same sequence ID, so it is replaced by the filenames in batch mode
+    queries = [tmp_path / "P60709.fasta", tmp_path / "P60710.fasta"]
+    for query in queries:
+        query.write_text(f">actin\n{SEQUENCE}\n")
+    cache_dir = tmp_path / "cache"
+
+    run_main(monkeypatch, queries, [tmp_path / "P60709.tsv", tmp_path / "P60710.tsv"], cache_dir)
+    assert (tmp_path / "P60710.tsv").read_text().startswith("P60710\t")
+
+    run_main(monkeypatch, queries[1:], [tmp_path / "single.tsv"], cache_dir)
+    assert len(blast_calls) == 2
+    assert (tmp_path / "single.tsv").read_text().startswith("actin\t")
@@ -0,0 +1,122 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import uniprot_metadata_store  # noqa: E402
+
+TEN_DAYS_AGO = time.time() - 10 * uniprot_metadata_store.SECONDS_PER_DAY
+
+
+@pytest.fixture
+def store_dirpath(tmp_path):
+    tsv_filepath = tmp_path / "uniprot.tsv"
+    tsv_filepath.write_text(
+        "Entry\tEntry Name\tLength\tFragment\n"
+        "Q6QAQ1\tACTB_PIG\t375\t\n"
+        "P60713\tACTB_SHEEP\t375\t\n"
+        "A0A2Y9FRR4\tA0A2Y9FRR4_TRIMA\t376\tfragment\n"
+    )
+    # the entries in the store are 10 days old
+    dirpath = tmp_path / "store"
+    uniprot_metadata_store.build_metadata_store(
+        [str(tsv_filepath)], str(dirpath), retrieved_at=TEN_DAYS_AGO
+    )
+    return dirpath
+
+
+def test_lookup_metadata_store(store_dirpath):
+    df = uniprot_metadata_store.lookup_metadata_store(
+        str(store_dirpath), ["P60713", "A0A2Y9FRR4", "P60709"], ["Entry", "Length", "Fragment"]
+    )
+    assert list(df.columns) == ["Entry", "Length", "Fragment"]
+    assert set(df["Entry"]) == {"P60713", "A0A2Y9FRR4"}
+
+    # the values are returned exactly as they appear in the TSV file
+    row = df.set_index("Entry").loc["P60713"]
+    assert row["Length"] == "375"
+    assert row["Fragment"] == ""
+
+
+def test_lookup_metadata_store_missing_columns(store_dirpath):
+    df = uniprot_metadata_store.lookup_metadata_store(
+        str(store_dirpath), ["P60713"], ["Entry", "Sequence"]
+    )
+    assert df.empty
+
+
+def test_metadata_store_staleness_and_update(store_dirpath):
+    columns = ["Entry", "Entry Name", "Length", "Fragment"]
+    stale_df = uniprot_metadata_store.lookup_metadata_store(
+        str(store_dirpath), ["Q6QAQ1", "P60713"], columns, max_age_days=7
+    )
+    assert stale_df.empty
+
+    # refreshing an entry should make it available again
+    df = uniprot_metadata_store.lookup_metadata_store(
+        str(store_dirpath), ["Q6QAQ1", "P60713"], columns
+    )
+    uniprot_metadata_store.update_metadata_store(
+        str(store_dirpath), df.loc[df["Entry"] == "Q6QAQ1"].assign(Length="374")
+    )
+    fresh_df = uniprot_metadata_store.lookup_metadata_store(
+        str(store_dirpath), ["Q6QAQ1", "P60713"], columns, max_age_days=7
+    )
+    assert list(fresh_df["Entry"]) == ["Q6QAQ1"]
+    assert list(fresh_df["Length"]) == ["374"]
+    assert not [name for name in os.listdir(store_dirpath) if name.endswith(".temp")]
+
+
+def test_metadata_store_concurrent_updates_and_compaction(store_dirpath):
+    columns = ["Entry", "Entry Name", "Length", "Fragment"]
+    df = uniprot_metadata_store.lookup_metadata_store(
+        str(store_dirpath), ["Q6QAQ1", "P60713"], columns
+    )
+
+    # jobs that add entries to the same store all keep their entries
+    # (but an entry written last is not used if it was retrieved before another entry)
+    for entry, length, retrieved_at in [
+        ("P60713", "1", TEN_DAYS_AGO + 2),
+        ("Q6QAQ1", "2", TEN_DAYS_AGO + 1),
+        ("P60713", "3", TEN_DAYS_AGO + 1),
+    ]:
+        uniprot_metadata_store.update_metadata_store(
+            str(store_dirpath),
+            df.loc[df["Entry"] == entry].assign(Length=length),
+            retrieved_at=retrieved_at,
+        )
+    assert len(os.listdir(store_dirpath)) == 4
+
+    # the newest entry of each accession is used, and compaction does not change the results
+    accessions = ["A0A2Y9FRR4", "P60713", "Q6QAQ1"]
+    expected_df = uniprot_metadata_store.lookup_metadata_store(
+        str(store_dirpath), accessions, columns
+    )
+    assert list(expected_df["Length"]) == ["376", "1", "2"]
+
+    uniprot_metadata_store.compact_metadata_store(str(store_dirpath))
+    assert len(os.listdir(store_dirpath)) == 1
+    df = uniprot_metadata_store.lookup_metadata_store(str(store_dirpath), accessions, columns)
+    assert df.equals(expected_df)
+
+
+def test_update_metadata_store_in_chunks(tmp_path):
+    chunks = [
+        pd.DataFrame({"Entry": ["P60713", "A0A2Y9FRR4"], "Length": ["375", "376"]}, dtype="string"),
+        pd.DataFrame({"Entry": [], "Length": []}, dtype="string"),
+        pd.DataFrame({"Entry": ["Q6QAQ1"], "Length": ["375"]}, dtype="string"),
+    ]
+    uniprot_metadata_store.update_metadata_store(str(tmp_path / "store"), iter(chunks))
+
+    df = uniprot_metadata_store.lookup_metadata_store(
+        str(tmp_path / "store"), ["Q6QAQ1", "P60713", "A0A2Y9FRR4"], ["Entry", "Length"]
+    )
+    assert df["Entry"].tolist() == ["A0A2Y9FRR4", "P60713", "Q6QAQ1"]
+    assert len(os.listdir(tmp_path / "store")) == 1
+
+    # no part file is written if there are no entries
+    uniprot_metadata_store.update_metadata_store(str(tmp_path / "store"), iter(chunks[1:2]))
+    assert len(os.listdir(tmp_path / "store")) == 1
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# only import these functions when using import *
+__all__ = [
+    "build_metadata_store",
+    "compact_metadata_store",
+    "read_field_columns",
+    "lookup_metadata_store",
+    "update_metadata_store",
+]
+
+# the column that identifies each entry in the UniProt TSV files
+ACCESSION_COLUMN = "Entry"
+
+# the column in which the time (in seconds since the epoch) at which each entry was retrieved
+# is recorded; this is used to decide whether an entry is stale
+RETRIEVED_AT_COLUMN = "retrieved_at"
+
+# the store is a directory of Parquet part files: each run of `fetch_uniprot_metadata.py`
+# adds a new part file with the entries it downloaded (so that concurrent runs never
+# overwrite each other's entries), and `compact_metadata_store` merges the part files
+PART_FILE_PREFIX = "part-"
+
+# the key of the Parquet metadata in which the names of the UniProt fields (e.g. 'cc_function')
+# and of the corresponding TSV columns (e.g. 'Function [CC]') are recorded for each part file;
+# the entries are stored with the TSV column names, so the fields requested from UniProt
+# must be mapped to these names to look them up in the store
+FIELD_COLUMNS_METADATA_KEY = b"proteincartography.field_columns"
+
+# the number of rows per Parquet row group; because each part file is sorted by accession,
+# lookups only need to read the row groups whose range of accessions includes a query accession
+ROW_GROUP_SIZE = 100_000
+
+SECONDS_PER_DAY = 60 * 60 * 24
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Build a local store of UniProt metadata from one or more TSV files "
+            "downloaded from UniProt (e.g. using the 'stream' endpoint with format=tsv), "
+            "and/or compact an existing store."
+        )
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        nargs="*",
+        default=[],
+        help="path(s) to the UniProt TSV file(s) (optionally gzipped) to add to the store.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="path to the directory of Parquet files in which the metadata is stored.",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help=(
+            "merge the part files of the store into a single part file, "
+            "keeping only the newest entry for each accession."
+        ),
+    )
+    args = parser.parse_args()
+    return args
+
+
+def _read_tsv(input_file: str) -> pd.DataFrame:
+    """
+    Read a UniProt TSV file, keeping all of the values as strings
+    so that they can be written back to a TSV file exactly as they were downloaded
+    """
+    return pd.read_csv(input_file, sep="\t", dtype="string", keep_default_na=False)
+
+
+def _list_part_files(store_dir: str) -> list:
+    """
+    List the part files of the store, in the order in which they were written
+    """
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(
+        os.path.join(store_dir, filename)
+        for filename in os.listdir(store_dir)
+        if filename.startswith(PART_FILE_PREFIX) and filename.endswith(".parquet")
+    )
+
+
+def _write_part_file(chunks, store_dir: str, field_columns=None):
+    """
+    Write chunks of entries (all with the same columns) to a new part file in the store,
+    recording the map from UniProt fields to TSV columns (if any) in the Parquet metadata.
+    Each chunk is sorted by accession and written as its own row group(s), so that
+    only one chunk is held in memory at a time. Nothing is written if there are no entries.
+
+    Each part file has a unique name (so that concurrent jobs never overwrite each other's entries),
+    and is written to a temporary path and then moved into place, so that concurrent readers
+    never see a partially-written part file.
+
+    Returns:
+        the path to the part file, or None if there were no entries.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    part_filepath = os.path.join(
+        store_dir, f"{PART_FILE_PREFIX}{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex}.parquet"
+    )
+    temp_filepath = f"{part_filepath}.temp"
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            chunk = chunk.sort_values(ACCESSION_COLUMN, ignore_index=True)
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                if field_columns:
+                    schema = schema.with_metadata(
+                        (schema.metadata or {})
+                        | {FIELD_COLUMNS_METADATA_KEY: json.dumps(field_columns).encode()}
+                    )
+                writer = pq.ParquetWriter(temp_filepath, schema)
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False),
+                row_group_size=ROW_GROUP_SIZE,
+            )
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(temp_filepath)
+        raise
+
+    if writer is None:
+        return None
+    writer.close()
+    os.replace(temp_filepath, part_filepath)
+    return part_filepath
+
+
+def read_field_columns(store_dir: str) -> dict:
+    """
+    Returns the map from the UniProt fields (e.g. 'cc_function') to the TSV columns
+    (e.g. 'Function [CC]') of the entries added to the store by `update_metadata_store`.
+    """
+    field_columns = {}
+    for part_filepath in _list_part_files(store_dir):
+        try:
+            metadata = pq.read_schema(part_filepath).metadata or {}
+        except FileNotFoundError:
+            # the part file was removed by `compact_metadata_store` after it was listed
+            continue
+        if FIELD_COLUMNS_METADATA_KEY in metadata:
+            field_columns.update(json.loads(metadata[FIELD_COLUMNS_METADATA_KEY]))
+    return field_columns
+
+
+def _keep_newest_entries(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keep only the most recently retrieved entry for each accession
+    """
+    return df.sort_values(RETRIEVED_AT_COLUMN, kind="stable").drop_duplicates(
+        ACCESSION_COLUMN, keep="last"
+    )
+
+
+def build_metadata_store(input_files: list, output_dir: str, retrieved_at=None):
+    """
+    Add the entries of TSV files downloaded from UniProt to a local store of UniProt metadata
+    (as a new part file; the store is created if it does not exist).
+
+    Args:
+        input_files (list): paths to the UniProt TSV files (all with the same columns).
+        output_dir (str): path to the directory of Parquet files in which the metadata is stored.
+        retrieved_at (float): the time at which the TSV files were downloaded
+            (in seconds since the epoch). If None, the modification times of the files are used.
+    """
+    dfs = []
+    for input_file in input_files:
+        df = _read_tsv(input_file)
+        df[RETRIEVED_AT_COLUMN] = (
+            retrieved_at if retrieved_at is not None else os.path.getmtime(input_file)
+        )
+        dfs.append(df)
+
+    _write_part_file([_keep_newest_entries(pd.concat(dfs, ignore_index=True))], output_dir)
+
+
+def compact_metadata_store(store_dir: str):
+    """
+    Merge the part files of the store into a single part file,
+    keeping only the newest entry for each accession.
+
+    The merged part file is written before the merged part files are removed,
+    so concurrent lookups never miss an entry, and the part files added while the store
+    is being compacted are left as they are. If the part files do not all have the same columns,
+    the columns that some of them are missing are filled with empty strings.
+    """
+    part_filepaths = _list_part_files(store_dir)
+    if len(part_filepaths) < 2:
+        return
+    field_columns = read_field_columns(store_dir)
+
+    df = pd.concat(
+        [pd.read_parquet(part_filepath) for part_filepath in part_filepaths], ignore_index=True
+    )
+    df = _keep_newest_entries(df)
+    string_columns = [column for column in df.columns if column != RETRIEVED_AT_COLUMN]
+    df[string_columns] = df[string_columns].fillna("")
+    _write_part_file([df], store_dir, field_columns=field_columns)
+
+    for part_filepath in part_filepaths:
+        os.remove(part_filepath)
+
+
+def lookup_metadata_store(
+    store_dir: str, accessions: list, columns: list, max_age_days=None
+) -> pd.DataFrame:
+    """
+    Look up the metadata for a list of accessions in the local store.
+
+    If an accession is in more than one part file of the store, its most recently retrieved entry
+    is used. The part files that do not include all of the requested columns are skipped.
+
+    Args:
+        store_dir (str): path to the directory of Parquet files built by `build_metadata_store`.
+        accessions (list): the UniProt accessions to look up.
+        columns (list): the names of the columns to return (as in the UniProt TSV files).
+        max_age_days (float): entries retrieved more than this many days ago are treated as missing.
+            If None or 0, entries never become stale.
+    Returns:
+        a pandas.DataFrame with the requested columns (in order) for each accession that is in the
+        store and is not stale. If the store does not exist or no part file includes all of the
+        requested columns, the dataframe is empty.
+    """
+    empty_df = pd.DataFrame(columns=columns)
+    if not accessions:
+        return empty_df
+
+    read_columns = list(dict.fromkeys([*columns, ACCESSION_COLUMN, RETRIEVED_AT_COLUMN]))
+    filters = [(ACCESSION_COLUMN, "in", list(set(accessions)))]
+
+    dfs = []
+    for part_filepath in _list_part_files(store_dir):
+        try:
+            part_columns = pq.read_schema(part_filepath).names
+            missing_columns = [column for column in columns if column not in part_columns]
+            if missing_columns:
+                print(
+                    f"The metadata store part file {os.path.basename(part_filepath)} "
+                    f"does not include the columns {missing_columns}."
+                )
+                continue
+            dfs.append(pd.read_parquet(part_filepath, columns=read_columns, filters=filters))
+        except FileNotFoundError:
+            # the part file was removed by `compact_metadata_store` after it was listed
+            continue
+
+    if not dfs:
+        return empty_df
+
+    df = _keep_newest_entries(pd.concat(dfs, ignore_index=True))
+
+    if max_age_days:
+        df = df.loc[df[RETRIEVED_AT_COLUMN] >= time.time() - max_age_days * SECONDS_PER_DAY]
+
+    return df[columns].sort_values(ACCESSION_COLUMN).reset_index(drop=True)
+
+
+def update_metadata_store(store_dir: str, df, retrieved_at=None, field_columns=None):
+    """
+    Add new or refreshed entries to the local store as a new part file
+    (the store is created if it does not exist). The existing part files are not read
+    or rewritten, so the cost depends only on the number of new entries;
+    use `compact_metadata_store` to merge the part files.
+
+    Args:
+        store_dir (str): path to the directory of Parquet files built by `build_metadata_store`.
+        df (pandas.DataFrame or iterable): the entries to add (or chunks of them,
+            e.g. as returned by `pd.read_csv` with a `chunksize`, which are written one at a time),
+            with the same columns as the UniProt TSV files (the values should be strings,
+            as returned by `pd.read_csv` with `dtype="string"`).
+        retrieved_at (float): the time at which the entries were retrieved.
+            If None, the current time is used.
+        field_columns (dict): optional map from the UniProt fields that were requested
+            to the TSV columns of the entries (see `read_field_columns`).
+    """
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    retrieved_at = retrieved_at or time.time()
+    _write_part_file(
+        (chunk.assign(**{RETRIEVED_AT_COLUMN: retrieved_at}) for chunk in chunks),
+        store_dir,
+        field_columns=field_columns,
+    )
+
+
+# run this if called from the interpreter
+def main():
+    args = parse_args()
+    if args.input:
+        build_metadata_store(args.input, args.output)
+    if args.compact:
+        compact_metadata_store(args.output)
+
+
+# check if called from interpreter
+if __name__ == "__main__":
+    main()
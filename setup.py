@@ -21,9 +21,11 @@ setup(
         "ProteinCartography/foldseek_apiquery.py",
         "ProteinCartography/foldseek_clustering.py",
         "ProteinCartography/get_source_of_hits.py",
+        "ProteinCartography/hit_funnel.py",
         "ProteinCartography/leiden_clustering.py",
         "ProteinCartography/map_refseq_ids.py",
         "ProteinCartography/plot_interactive.py",
+        "ProteinCartography/rank_hits.py",
         "ProteinCartography/fetch_uniprot_metadata.py",
         "ProteinCartography/rescue_mapping.py",
     ],